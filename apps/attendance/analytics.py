@@ -0,0 +1,208 @@
+"""
+Attendance analytics: present / total counts grouped by any mix of dimensions and a time grain,
+computed with one grouped query.
+
+The planner reads the daily rollup (AttendanceDailyStat) whenever it can answer the request, which keeps
+the cost independent of the history, and falls back to the raw Attendance rows only for what the rollup
+does not keep (per-student figures, hourly grain).
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Attendance, AttendanceDailyStat
+from .rollup import day_bounds
+
+# Dimension -> lookup path on each source (None when the source cannot group by it) and label field
+DIMENSIONS = {
+    'class': {'raw': 'subject__section_promo', 'rollup': 'section_promo', 'label': 'name'},
+    'subject': {'raw': 'subject', 'rollup': 'subject', 'label': 'name'},
+    'teacher': {'raw': 'subject__teacher', 'rollup': 'teacher', 'label': None},
+    'department': {'raw': 'subject__teacher__department', 'rollup': 'department', 'label': 'name'},
+    'student': {'raw': 'student', 'rollup': None, 'label': None},
+}
+GRAINS = ('hour', 'day', 'week', 'month', 'total')
+RAW_ONLY_GRAINS = ('hour',)
+SOURCES = ('raw', 'rollup')
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def _int_list(name, value):
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise AnalyticsError(f"{name} must be a comma separated list of ids")
+
+
+def _date(name, value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise AnalyticsError(f"Invalid {name} date '{value}', use YYYY-MM-DD")
+
+
+def parse_analytics_params(query_params):
+    """
+    Validates the query parameters of the analytics endpoint:
+    group_by (comma separated dimensions), grain, from / to (inclusive days, last 30 days by default),
+    one filter per dimension (comma separated ids) and an optional forced source.
+    """
+    group_by = [name.strip() for name in query_params.get('group_by', '').split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown:
+        raise AnalyticsError(
+            f"Unknown dimension(s): {', '.join(unknown)}. Available: {', '.join(DIMENSIONS)}"
+        )
+
+    grain = query_params.get('grain', 'day')
+    if grain not in GRAINS:
+        raise AnalyticsError(f"Invalid grain '{grain}'. Available: {', '.join(GRAINS)}")
+
+    date_to = _date('to', query_params['to']) if query_params.get('to') else timezone.localdate()
+    date_from = (
+        _date('from', query_params['from']) if query_params.get('from') else date_to - datetime.timedelta(days=29)
+    )
+    if date_from > date_to:
+        raise AnalyticsError("'from' must not be after 'to'")
+
+    filters = {
+        name: _int_list(name, query_params[name]) for name in DIMENSIONS if query_params.get(name)
+    }
+
+    source = query_params.get('source')
+    if source is not None and source not in SOURCES:
+        raise AnalyticsError(f"Invalid source '{source}'. Available: {', '.join(SOURCES)}")
+
+    return {
+        'group_by': group_by,
+        'grain': grain,
+        'date_from': date_from,
+        'date_to': date_to,
+        'filters': filters,
+        'source': source,
+    }
+
+
+def plan_source(group_by, grain, filters, source=None):
+    """
+    Picks the cheapest source able to answer: the rollup unless a dimension, filter or grain needs the
+    raw rows. A forced `source` is checked for feasibility.
+    """
+    needs_raw = grain in RAW_ONLY_GRAINS or any(
+        DIMENSIONS[name]['rollup'] is None for name in set(group_by) | set(filters)
+    )
+    if source == 'rollup' and needs_raw:
+        raise AnalyticsError("The rollup cannot answer this query (per-student or hourly figures)")
+    if source:
+        return source
+    return 'raw' if needs_raw else 'rollup'
+
+
+def _period(source, grain):
+    tzinfo = timezone.get_current_timezone()
+    if source == 'raw':
+        return {
+            'hour': TruncHour('date', tzinfo=tzinfo),
+            'day': TruncDate('date', tzinfo=tzinfo),
+            'week': TruncWeek('date', tzinfo=tzinfo),
+            'month': TruncMonth('date', tzinfo=tzinfo),
+        }[grain]
+    return {
+        'day': F('date'),
+        'week': TruncWeek('date'),
+        'month': TruncMonth('date'),
+    }[grain]
+
+
+def _period_value(value, grain):
+    """
+    Raw truncations return aware datetimes: local datetime for hours, local date for the other grains.
+    """
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value) if grain == 'hour' else timezone.localtime(value).date()
+    return value
+
+
+def run_analytics(group_by, grain, date_from, date_to, filters=None, source=None):
+    """
+    Runs one grouped query and returns:
+    {"source": "rollup", "grain": "day", "group_by": [...], "truncated": false,
+     "results": [{"period": date(2025, 6, 2), "class": 1, "class_name": "L3", "present": 40, "total": 48,
+                  "attendance": 83.3}, ...]}
+    `results` is capped at ANALYTICS_MAX_ROWS rows.
+    """
+    filters = filters or {}
+    source = plan_source(group_by, grain, filters, source)
+
+    if source == 'raw':
+        start, _ = day_bounds(date_from)
+        _, end = day_bounds(date_to)
+        queryset = Attendance.objects.filter(date__gte=start, date__lt=end)
+        metrics = {'present_count': Count('id', filter=Q(status='present')), 'total_count': Count('id')}
+    else:
+        queryset = AttendanceDailyStat.objects.filter(date__gte=date_from, date__lte=date_to)
+        metrics = {'present_count': Sum('present'), 'total_count': Sum('total')}
+
+    for name, ids in filters.items():
+        queryset = queryset.filter(**{f"{DIMENSIONS[name][source]}__in": ids})
+
+    # Grouping columns, aliased so they cannot clash with the model fields: output name -> alias
+    columns = {}
+    if grain != 'total':
+        columns['period'] = 'group_period'
+        queryset = queryset.annotate(group_period=_period(source, grain))
+    for name in group_by:
+        path = DIMENSIONS[name][source]
+        columns[name] = f"group_{name}"
+        queryset = queryset.annotate(**{columns[name]: F(path)})
+        if DIMENSIONS[name]['label']:
+            columns[f"{name}_name"] = f"group_{name}_name"
+            queryset = queryset.annotate(
+                **{columns[f"{name}_name"]: F(f"{path}__{DIMENSIONS[name]['label']}")}
+            )
+
+    if columns:
+        aliases = list(columns.values())
+        rows = queryset.values(*aliases).annotate(**metrics).order_by(*aliases)
+    else:
+        rows = [queryset.aggregate(**metrics)]
+
+    max_rows = settings.ANALYTICS_MAX_ROWS
+    rows = list(rows[: max_rows + 1])
+    results = []
+    for row in rows[:max_rows]:
+        if not row['total_count']:
+            continue
+        result = {name: row[alias] for name, alias in columns.items()}
+        if 'period' in result:
+            result['period'] = _period_value(result['period'], grain)
+        result['present'] = row['present_count']
+        result['total'] = row['total_count']
+        result['attendance'] = round(row['present_count'] / row['total_count'] * 100, 1)
+        results.append(result)
+
+    return {
+        'source': source,
+        'grain': grain,
+        'group_by': group_by,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'truncated': len(rows) > max_rows,
+        'results': results,
+    }
+
+
+def daily_attendance_rates(first_day, last_day, teacher_id=None):
+    """
+    Returns {day: present / total} for the days between first_day and last_day (inclusive) having records,
+    optionally restricted to the subjects of a teacher.
+    """
+    filters = {'teacher': [teacher_id]} if teacher_id is not None else {}
+    results = run_analytics([], 'day', first_day, last_day, filters)['results']
+    return {row['period']: row['present'] / row['total'] for row in results}
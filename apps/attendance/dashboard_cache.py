@@ -0,0 +1,134 @@
+"""
+Cache of the attendance dashboard responses (Django cache framework, see CACHES).
+
+Entries are keyed by endpoint, scope (every teacher, or one teacher), date window and parameters, plus the
+generation counters the result depends on:
+- one counter per scope and day, for windows of at most DASHBOARD_CACHE_MAX_DAYS days,
+- one counter per scope, for longer windows and all-time figures,
+- a global epoch, bumped when past attendance moves between scopes (subject reassigned, rollup rebuilt).
+Writing attendance bumps the counters of its day for the global scope and the scope of the subject's
+teacher once the transaction commits, so only the entries covering that day and scope stop being read.
+
+A miss takes a short lock so concurrent viewers of the same dashboard wait for one computation instead of
+all running the query (stampede); a viewer waiting longer than DASHBOARD_CACHE_WAIT computes it itself.
+"""
+import datetime
+import hashlib
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from classroom_absence_management import metrics
+
+GLOBAL_SCOPE = 'all'
+EPOCH_KEY = 'dashboard:epoch'
+POLL_INTERVAL = 0.05
+
+
+def teacher_scope(teacher_id):
+    return f"teacher:{teacher_id}"
+
+
+def _day_key(scope, day):
+    return f"dashboard:gen:{scope}:{day.isoformat()}"
+
+
+def _scope_key(scope):
+    return f"dashboard:gen:{scope}"
+
+
+def _generation_keys(scope, window):
+    keys = [EPOCH_KEY, _scope_key(scope)]
+    if window is not None:
+        first_day, last_day = window
+        days = (last_day - first_day).days + 1
+        if days <= settings.DASHBOARD_CACHE_MAX_DAYS:
+            # Depend on the days of the window only, not on every write of the scope
+            keys = [EPOCH_KEY] + [_day_key(scope, first_day + datetime.timedelta(days=i)) for i in range(days)]
+    return keys
+
+
+def _entry_key(endpoint, scope, window, params):
+    generations = cache.get_many(_generation_keys(scope, window))
+    signature = repr((endpoint, scope, window, sorted((params or {}).items()), sorted(generations.items())))
+    return f"dashboard:entry:{endpoint}:{hashlib.sha1(signature.encode()).hexdigest()}"
+
+
+def _record(endpoint, result):
+    try:
+        metrics.increment('dashboard_cache_requests_total', labels={'endpoint': endpoint, 'result': result})
+    except redis.RedisError as e:
+        print(f"Could not record the dashboard cache {result}: {e}")
+
+
+def get_or_compute(endpoint, scope, window, compute, params=None):
+    """
+    Returns the cached data of a dashboard, or computes, caches and returns it.
+    Args:
+        endpoint: Name of the dashboard.
+        scope: GLOBAL_SCOPE or teacher_scope(id).
+        window: (first_day, last_day) the data covers, or None for all-time data.
+        compute: Callable returning the (picklable) data.
+        params: Other parameters the data depends on.
+    """
+    key = _entry_key(endpoint, scope, window, params)
+    data = cache.get(key)
+    if data is not None:
+        _record(endpoint, 'hit')
+        return data
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=settings.DASHBOARD_CACHE_WAIT * 2):
+        # Someone else is computing it: wait for their result
+        deadline = time.monotonic() + settings.DASHBOARD_CACHE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            data = cache.get(key)
+            if data is not None:
+                _record(endpoint, 'wait_hit')
+                return data
+        lock_key = None
+
+    try:
+        _record(endpoint, 'miss')
+        data = compute()
+        cache.set(key, data, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+        return data
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+
+
+def _bump(keys):
+    for key in keys:
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add and incr
+                cache.add(key, 1, timeout=None)
+
+
+def invalidate_days(days_by_teacher):
+    """
+    Invalidates, once the current transaction commits, the entries covering the given days in the global
+    scope and in the scope of each teacher. `days_by_teacher` is an iterable of (teacher id or None, day).
+    """
+    keys = set()
+    for teacher_id, day in days_by_teacher:
+        scopes = [GLOBAL_SCOPE] + ([teacher_scope(teacher_id)] if teacher_id is not None else [])
+        for scope in scopes:
+            keys.add(_day_key(scope, day))
+            keys.add(_scope_key(scope))
+    if keys:
+        transaction.on_commit(lambda: _bump(sorted(keys)))
+
+
+def invalidate_all():
+    """
+    Invalidates every entry once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _bump([EPOCH_KEY]))
@@ -0,0 +1,76 @@
+"""
+Removal of duplicate attendance rows (same student, subject and date), which update_or_create could insert
+under concurrency before the table had a unique constraint.
+
+The functions take the Attendance / AttendanceDailyStat models as arguments so the migration adding the
+constraint can run them with its historical models.
+"""
+import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+
+def duplicate_groups(attendance_model):
+    """
+    One row per duplicated (student, subject, date) with the number of copies and the id kept (the newest).
+    """
+    return (
+        attendance_model.objects.values('student_id', 'subject_id', 'date')
+        .annotate(copies=Count('id'), keep_id=Max('id'))
+        .filter(copies__gt=1)
+        .order_by()
+    )
+
+
+def delete_duplicate_attendance(attendance_model, batch_size=500, dry_run=False, on_batch=None):
+    """
+    Deletes every copy but the newest of each duplicated attendance, `batch_size` groups per transaction,
+    so a large table is never locked for long and an interrupted run can simply be restarted.
+    The duplicate groups are aggregated once and streamed in (student, subject, date) order, instead of
+    running the aggregate over the whole table again for each batch.
+    Args:
+        on_batch: Optional callable, called in the transaction of each batch with the set of
+            (subject id, date) the deleted rows belonged to.
+    Returns the number of rows deleted (or that would be deleted when dry_run).
+    """
+    groups = (
+        duplicate_groups(attendance_model)
+        .order_by('student_id', 'subject_id', 'date')
+        .iterator(chunk_size=batch_size)
+    )
+    if dry_run:
+        return sum(group['copies'] - 1 for group in groups)
+
+    deleted = 0
+    while True:
+        batch = list(islice(groups, batch_size))
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            for group in batch:
+                deleted += (
+                    attendance_model.objects.filter(
+                        student_id=group['student_id'], subject_id=group['subject_id'], date=group['date']
+                    )
+                    .exclude(id=group['keep_id'])
+                    .delete()[0]
+                )
+            if on_batch:
+                on_batch({(group['subject_id'], group['date']) for group in batch})
+
+
+def recount_daily_stats(attendance_model, stat_model, cells):
+    """
+    Updates the counts of existing rollup rows for the given (subject id, date) cells.
+    Only used by migrations, which cannot lock and recreate rows like rollup.refresh_daily_stats.
+    """
+    for subject_id, day in {(subject_id, timezone.localdate(date)) for subject_id, date in cells}:
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+        counts = attendance_model.objects.filter(subject_id=subject_id, date__gte=start, date__lt=end).aggregate(
+            total=Count('id'), present=Count('id', filter=Q(status='present'))
+        )
+        stat_model.objects.filter(subject_id=subject_id, date=day).update(**counts)
@@ -0,0 +1,63 @@
+"""
+Weekly attendance heatmap: attendance rate per day and hour range, computed with one grouped query.
+Hour ranges come from ATTENDANCE_HEATMAP_HOUR_RANGES and are evaluated in the current time zone.
+"""
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from .analytics import run_analytics
+
+
+def week_bounds(week_offset=0):
+    """
+    Returns the first and last local days (Monday, Sunday) of the week `week_offset` weeks from the
+    current one (0 = this week, -1 = last week).
+    """
+    today = timezone.localdate()
+    monday = today - datetime.timedelta(days=today.weekday()) + datetime.timedelta(weeks=week_offset)
+    return monday, monday + datetime.timedelta(days=6)
+
+
+def hourly_week_heatmap(week_offset=0, teacher_id=None, hour_ranges=None):
+    """
+    Buckets the attendance records of a week by local date and hour range, from the hourly analytics of
+    the week (one query) folded into the configured ranges.
+    Args:
+        week_offset: Week to report, relative to the current one.
+        teacher_id: Only count the subjects of this teacher.
+        hour_ranges: [{"start": 8, "end": 10, "label": "..."}, ...], ATTENDANCE_HEATMAP_HOUR_RANGES by default.
+    Returns:
+        [{"day": "Mon", "date": "2025-06-02", "hourly_data": [{"hour_range": "...", "attendance": 85.5}, ...]}, ...]
+    """
+    hour_ranges = hour_ranges or settings.ATTENDANCE_HEATMAP_HOUR_RANGES
+    first_day, last_day = week_bounds(week_offset)
+    filters = {'teacher': [teacher_id]} if teacher_id is not None else {}
+    hours = run_analytics([], 'hour', first_day, last_day, filters)['results']
+
+    present, total = Counter(), Counter()
+    for row in hours:
+        for index, hour_range in enumerate(hour_ranges):
+            if hour_range["start"] <= row['period'].hour < hour_range["end"]:
+                present[(row['period'].date(), index)] += row['present']
+                total[(row['period'].date(), index)] += row['total']
+
+    week_data = []
+    for day_offset in range(7):
+        current_day = first_day + datetime.timedelta(days=day_offset)
+        hourly_data = []
+        for index, hour_range in enumerate(hour_ranges):
+            attendance_rate = 0
+            if total[(current_day, index)] > 0:
+                attendance_rate = (present[(current_day, index)] / total[(current_day, index)]) * 100
+            hourly_data.append({"hour_range": hour_range["label"], "attendance": round(attendance_rate, 1)})
+        week_data.append(
+            {
+                "day": current_day.strftime("%a"),  # Abbreviated day name (Mon, Tue, etc.)
+                "date": current_day.strftime("%Y-%m-%d"),
+                "hourly_data": hourly_data,
+            }
+        )
+    return week_data
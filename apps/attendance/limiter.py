@@ -0,0 +1,132 @@
+"""
+Node-wide concurrency limiter for the CPU-heavy recognition endpoints.
+
+Slots are lock files held with flock, so the limit applies across every web process of the node and a slot
+is released by the kernel if its process dies. A request first takes a place in the bounded wait queue
+(also lock files), then waits for a run slot. When the queue is full, or the wait is too long, the request
+is turned away with an estimated wait time based on the recent recognition latencies.
+"""
+import fcntl
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+from classroom_absence_management import metrics
+
+
+class RecognitionBusy(Exception):
+    def __init__(self, estimated_wait):
+        super().__init__(f"Recognition is saturated, retry in about {estimated_wait} seconds")
+        self.estimated_wait = estimated_wait
+
+
+class RecognitionLimiter:
+    poll_interval = 0.05
+
+    def __init__(self, name, slots, queue_size, max_wait):
+        self.name = name
+        self.slots = slots
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.directory = os.path.join(settings.LOCK_FILE_DIR, name)
+
+    def _path(self, kind, index):
+        return os.path.join(self.directory, f"{kind}-{index}.lock")
+
+    def _try_lock(self, kind, count):
+        """
+        Returns the open file of the first free `kind` lock file, or None when all `count` are held.
+        A free file being probed by _held looks held for an instant, so a second pass is made shortly
+        after before giving up.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for attempt in range(2):
+            if attempt:
+                time.sleep(self.poll_interval / 10)
+            for index in range(count):
+                lock_file = open(self._path(kind, index), 'a')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return lock_file
+                except BlockingIOError:
+                    lock_file.close()
+        return None
+
+    def _held(self, kind, count):
+        """
+        Number of `kind` lock files currently held by some process. Each file is probed with a shared
+        lock released right away, so counting never makes the free files look taken to other requests.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        held = 0
+        for index in range(count):
+            with open(self._path(kind, index), 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    held += 1
+                else:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return held
+
+    def recent_latency(self):
+        """
+        Median of the recent recognition durations, RECOGNITION_DEFAULT_SECONDS when none is known.
+        """
+        try:
+            latency = metrics.percentile(metrics.get_samples(f"{self.name}_seconds"), 50)
+        except redis.RedisError:
+            latency = None
+        return latency or settings.RECOGNITION_DEFAULT_SECONDS
+
+    def estimated_wait(self):
+        """
+        Seconds before a new request would get a slot: each batch of `slots` requests ahead of it
+        takes about one recent recognition duration.
+        """
+        waiting = self._held('queue', self.queue_size)
+        return math.ceil(math.ceil((waiting + 1) / self.slots) * self.recent_latency())
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a recognition slot for the duration of the block. Raises RecognitionBusy when the wait queue
+        is full or no slot frees up within `max_wait` seconds. The time spent in the block is recorded
+        to estimate the next waits.
+        """
+        queue_file = self._try_lock('queue', self.queue_size)
+        if queue_file is None:
+            raise RecognitionBusy(self.estimated_wait())
+
+        try:
+            deadline = time.monotonic() + self.max_wait
+            slot_file = self._try_lock('slot', self.slots)
+            while slot_file is None:
+                if time.monotonic() >= deadline:
+                    raise RecognitionBusy(self.estimated_wait())
+                time.sleep(self.poll_interval)
+                slot_file = self._try_lock('slot', self.slots)
+        finally:
+            queue_file.close()
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            slot_file.close()
+            try:
+                metrics.record_sample(f"{self.name}_seconds", round(time.monotonic() - started_at, 3))
+            except redis.RedisError as e:
+                print(f"Could not record the {self.name} duration: {e}")
+
+
+recognition_limiter = RecognitionLimiter(
+    'recognition',
+    slots=settings.RECOGNITION_SLOTS,
+    queue_size=settings.RECOGNITION_QUEUE_SIZE,
+    max_wait=settings.RECOGNITION_MAX_WAIT,
+)
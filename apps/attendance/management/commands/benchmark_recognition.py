@@ -0,0 +1,280 @@
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import face_recognition
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.studentimages.quality import face_recognition_lock
+from classroom_absence_management.metrics import StageTimer, summarize
+from detector import FaceRecognitionHandler, imageException
+from gen_mock_data.gen_class_imgs import create_classroom_picture
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DEFAULT_BACKGROUND = Path('gen_mock_data', 'classroom_bg.jpeg')
+# The benchmark gallery lives in a temporary encodings directory, under an id no class can have
+BENCHMARK_CLASS = 0
+COMPARED_STAGES = ('total', 'decode', 'detect', 'encode', 'gallery_load', 'match')
+
+
+def _float_list(value):
+    try:
+        return [float(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise CommandError(f"Expected a comma separated list of numbers, got '{value}'")
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _delta(new, old):
+    if new is None or old is None:
+        return None
+    return round(new - old, 4)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic classroom pictures from a labelled dataset (<dataset>/<student_id>/<photos>) with "
+        "gen_mock_data, runs them through the recognition pipeline and reports precision, recall and per-stage "
+        "latency percentiles as JSON. With --baseline, the report also holds the difference with a previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', help="Directory with one folder of photos per student")
+        parser.add_argument('--scenes', type=int, default=5, help="Pictures generated per size and density")
+        parser.add_argument(
+            '--sizes', type=_float_list, default=[0.5, 1.0, 2.0],
+            help="Comma separated scales of the 880x523 classroom picture",
+        )
+        parser.add_argument(
+            '--densities', type=_float_list, default=[0.4, 0.8, 1.0],
+            help="Comma separated probabilities of each seat being taken",
+        )
+        parser.add_argument(
+            '--enroll-images', type=int, default=1,
+            help="Photos per student used to build the gallery, the others are placed in the pictures",
+        )
+        parser.add_argument('--background', default=str(DEFAULT_BACKGROUND), help="Classroom background image")
+        parser.add_argument('--tolerance', type=float, default=None, help="Match tolerance (handler default if unset)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, keep it to compare runs")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+        parser.add_argument('--baseline', help="JSON report of a previous run to compare with")
+
+    def handle(self, *args, **options):
+        dataset = self.load_dataset(options['dataset'], options['enroll_images'])
+        if not os.path.isfile(options['background']):
+            raise CommandError(f"Background image {options['background']} not found")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read the baseline report: {e}")
+
+        random.seed(options['seed'])
+        with tempfile.TemporaryDirectory(prefix='benchmark_') as work_dir:
+            face_handler = FaceRecognitionHandler(encodings_location=Path(work_dir, 'encoding'))
+            if options['tolerance'] is not None:
+                face_handler.tolerance = options['tolerance']
+            gallery = self.build_gallery(face_handler, dataset)
+
+            scenarios = []
+            for output_scale in options['sizes']:
+                for presence_prob in options['densities']:
+                    scenarios.append(
+                        self.run_scenario(
+                            face_handler, dataset, work_dir, options['background'],
+                            output_scale, presence_prob, options['scenes'],
+                        )
+                    )
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "config": {
+                "dataset": options['dataset'],
+                "scenes": options['scenes'],
+                "sizes": options['sizes'],
+                "densities": options['densities'],
+                "enroll_images": options['enroll_images'],
+                "tolerance": face_handler.tolerance,
+                "model": face_handler.model,
+                "seed": options['seed'],
+            },
+            "gallery": gallery,
+            "scenarios": [scenario.pop('report') for scenario in scenarios],
+            "overall": self.summarize_results(scenarios),
+        }
+        if baseline:
+            report["comparison"] = self.compare(report, baseline)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.print_summary(report)
+        else:
+            self.stdout.write(output)
+
+    def load_dataset(self, path, enroll_images):
+        """
+        Returns {student_id: {"enroll": [paths], "scene": [paths]}}. Students with a single photo use it
+        for both, which overestimates the accuracy: add more photos per student for meaningful numbers.
+        """
+        if not os.path.isdir(path):
+            raise CommandError(f"Dataset directory {path} not found")
+        dataset = {}
+        for student_dir in sorted(Path(path).iterdir()):
+            if not student_dir.is_dir():
+                continue
+            photos = sorted(str(photo) for photo in student_dir.iterdir() if photo.suffix.lower() in IMAGE_EXTENSIONS)
+            if not photos:
+                continue
+            enroll = photos[:enroll_images]
+            dataset[student_dir.name] = {"enroll": enroll, "scene": photos[enroll_images:] or enroll}
+        if not dataset:
+            raise CommandError(f"No student photos found in {path}")
+        shared = [student_id for student_id, photos in dataset.items() if photos["scene"] == photos["enroll"]]
+        if shared:
+            self.stderr.write(
+                self.style.WARNING(f"{len(shared)} student(s) have no photo left for the pictures, reusing enrollment photos")
+            )
+        return dataset
+
+    def build_gallery(self, face_handler, dataset):
+        started_at = time.perf_counter()
+        encodings_count = 0
+        for student_id, photos in dataset.items():
+            encodings = []
+            for photo in photos["enroll"]:
+                image = face_recognition.load_image_file(photo)
+                with face_recognition_lock:
+                    encodings += face_recognition.face_encodings(image, face_recognition.face_locations(image)[:1])
+            if not encodings:
+                self.stderr.write(self.style.WARNING(f"No face found in the enrollment photos of {student_id}"))
+                continue
+            encodings_count += face_handler.append_encodings(BENCHMARK_CLASS, student_id, encodings)
+        return {
+            "students": len(dataset),
+            "encodings": encodings_count,
+            "seconds": round(time.perf_counter() - started_at, 3),
+        }
+
+    def run_scenario(self, face_handler, dataset, work_dir, background, output_scale, presence_prob, scenes):
+        name = f"size={output_scale:g},density={presence_prob:g}"
+        true_positives = false_positives = false_negatives = 0
+        latencies = defaultdict(list)
+        for scene in range(scenes):
+            student_data = [
+                {"id": student_id, "path": random.choice(photos["scene"])} for student_id, photos in dataset.items()
+            ]
+            picture_path = os.path.join(work_dir, f"scene_{scene}.png")
+            expected = set(
+                create_classroom_picture(
+                    None, background, picture_path,
+                    presence_prob=presence_prob, output_scale=output_scale, student_data=student_data,
+                )
+            )
+
+            face_handler.timer = StageTimer(export=False)
+            started_at = time.perf_counter()
+            try:
+                recognized = set(face_handler.recognize_faces(picture_path, BENCHMARK_CLASS))
+            except imageException:
+                recognized = set()
+            latencies['total'].append(round(time.perf_counter() - started_at, 4))
+            for stage, seconds in face_handler.timer.durations.items():
+                latencies[stage].append(round(seconds, 4))
+
+            true_positives += len(recognized & expected)
+            false_positives += len(recognized - expected)
+            false_negatives += len(expected - recognized)
+
+        counts = {
+            "true_positives": true_positives,
+            "false_positives": false_positives,
+            "false_negatives": false_negatives,
+        }
+        report = {
+            "name": name,
+            "size": output_scale,
+            "density": presence_prob,
+            "scenes": scenes,
+            **counts,
+            "precision": _ratio(true_positives, true_positives + false_positives),
+            "recall": _ratio(true_positives, true_positives + false_negatives),
+            "latency": {stage: summarize(values) for stage, values in latencies.items()},
+        }
+        return {"report": report, "counts": counts, "latencies": latencies}
+
+    def summarize_results(self, scenarios):
+        counts = defaultdict(int)
+        latencies = defaultdict(list)
+        for scenario in scenarios:
+            for key, value in scenario['counts'].items():
+                counts[key] += value
+            for stage, values in scenario['latencies'].items():
+                latencies[stage] += values
+        true_positives = counts['true_positives']
+        return {
+            **counts,
+            "precision": _ratio(true_positives, true_positives + counts['false_positives']),
+            "recall": _ratio(true_positives, true_positives + counts['false_negatives']),
+            "latency": {stage: summarize(values) for stage, values in latencies.items()},
+        }
+
+    def compare(self, report, baseline):
+        """
+        Differences (this run - baseline) of the accuracy and latency percentiles, overall and for every
+        scenario found in both runs. Negative latency deltas mean faster.
+        """
+
+        def diff(new, old):
+            result = {
+                "precision": _delta(new.get('precision'), old.get('precision')),
+                "recall": _delta(new.get('recall'), old.get('recall')),
+            }
+            for stage in COMPARED_STAGES:
+                new_latency = new.get('latency', {}).get(stage, {})
+                old_latency = old.get('latency', {}).get(stage, {})
+                for pct in ('p50', 'p95'):
+                    result[f"{stage}_{pct}"] = _delta(new_latency.get(pct), old_latency.get(pct))
+            return result
+
+        baseline_scenarios = {scenario['name']: scenario for scenario in baseline.get('scenarios', [])}
+        if baseline.get('config', {}).get('seed') != report['config']['seed']:
+            self.stderr.write(self.style.WARNING("The baseline used another seed, the pictures differ"))
+        return {
+            "baseline_created_at": baseline.get('created_at'),
+            "overall": diff(report['overall'], baseline.get('overall', {})),
+            "scenarios": {
+                scenario['name']: diff(scenario, baseline_scenarios[scenario['name']])
+                for scenario in report['scenarios']
+                if scenario['name'] in baseline_scenarios
+            },
+        }
+
+    def print_summary(self, report):
+        for scenario in report['scenarios'] + [dict(report['overall'], name='overall')]:
+            total = scenario['latency'].get('total', {})
+            line = (
+                f"{scenario['name']:<28} precision={scenario['precision']} recall={scenario['recall']} "
+                f"p50={total.get('p50') or 0:.3f}s p95={total.get('p95') or 0:.3f}s"
+            )
+            comparison = report.get('comparison', {})
+            delta = comparison.get('scenarios', {}).get(scenario['name'])
+            if scenario['name'] == 'overall':
+                delta = comparison.get('overall')
+            if delta:
+                line += (
+                    f" | Δprecision={delta['precision']} Δrecall={delta['recall']} "
+                    f"Δp50={delta['total_p50']} Δp95={delta['total_p95']}"
+                )
+            self.stdout.write(line)
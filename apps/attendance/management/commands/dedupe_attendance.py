@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.attendance.dedupe import delete_duplicate_attendance
+from apps.attendance.models import Attendance
+from apps.attendance.rollup import attendance_cell, refresh_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes duplicate attendance rows (same student, subject and date), keeping the newest, in small "
+        "transactions, and refreshes the daily rollup of the affected days. Safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Duplicate groups deleted per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be deleted")
+
+    def handle(self, *args, **options):
+        deleted = delete_duplicate_attendance(
+            Attendance,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            on_batch=lambda cells: refresh_daily_stats(
+                attendance_cell(subject_id, date) for subject_id, date in cells
+            ),
+        )
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} duplicate attendance row(s)."))
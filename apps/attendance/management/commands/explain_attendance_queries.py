@@ -0,0 +1,77 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.attendance.models import Attendance
+
+
+def hot_queries(student_id, subject_id, teacher_id):
+    """
+    (description, queryset, index names any of which the plan should mention) of the hot attendance queries.
+    """
+    end = timezone.now()
+    start = end - datetime.timedelta(days=30)
+    return [
+        (
+            "Dashboard window by status",
+            Attendance.objects.filter(date__gte=start, date__lt=end, status='present'),
+            ['attendance_date_status_idx'],
+        ),
+        (
+            "Subject day (rollup refresh, analytics by subject)",
+            Attendance.objects.filter(subject_id=subject_id, date__gte=start, date__lt=end),
+            ['attendance_subject_date_idx'],
+        ),
+        (
+            "Teacher window (analytics by teacher)",
+            Attendance.objects.filter(subject__teacher_id=teacher_id, date__gte=start, date__lt=end),
+            ['attendance_subject_date_idx'],
+        ),
+        (
+            "Student history",
+            Attendance.objects.filter(student_id=student_id).order_by('-date'),
+            ['attendance_student_date_idx'],
+        ),
+        (
+            "Check-in upsert lookup",
+            Attendance.objects.filter(student_id=student_id, subject_id=subject_id, date=end),
+            # SQLite names the index backing a unique constraint itself
+            ['attendance_student_subject_date_uniq', 'sqlite_autoindex_attendance'],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the hot attendance queries and checks that their plans use the composite indexes. "
+        "Planners may prefer a full scan on small tables: run it against a realistic amount of data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, help="Student id used in the queries (first student by default)")
+        parser.add_argument('--subject', type=int, help="Subject id used in the queries (first subject by default)")
+        parser.add_argument('--teacher', type=int, help="Teacher id used in the queries (first teacher by default)")
+        parser.add_argument('--show-plans', action='store_true', help="Print the full plans")
+        parser.add_argument('--strict', action='store_true', help="Fail when a query does not use its index")
+
+    def handle(self, *args, **options):
+        sample = Attendance.objects.select_related('subject').order_by('id').first()
+        student_id = options['student'] or (sample.student_id if sample else 1)
+        subject_id = options['subject'] or (sample.subject_id if sample else 1)
+        teacher_id = options['teacher'] or (sample.subject.teacher_id if sample and sample.subject.teacher_id else 1)
+
+        missing = []
+        for description, queryset, index_names in hot_queries(student_id, subject_id, teacher_id):
+            plan = queryset.explain()
+            used = next((name for name in index_names if name in plan), None)
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"OK    {description}: uses {used}"))
+            else:
+                missing.append(description)
+                self.stdout.write(self.style.WARNING(f"SCAN  {description}: none of {', '.join(index_names)} used"))
+            if options['show_plans'] or not used:
+                self.stdout.write(f"      {plan}".replace('\n', '\n      '))
+
+        if missing and options['strict']:
+            raise CommandError(f"{len(missing)} hot query(ies) do not use their index")
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.attendance.rollup import rebuild_daily_stats, rebuild_sessions
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the daily attendance rollup (AttendanceDailyStat) and the attendance sessions "
+        "(AttendanceSession) from the raw attendance records, "
+        "for the whole history or a range of days."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=_date, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', type=_date, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from must not be after --to")
+
+        rows = rebuild_daily_stats(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily attendance stat row(s)."))
+        rebuild_sessions(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS("Rebuilt the attendance sessions."))
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceDailyStat = apps.get_model('attendance', 'AttendanceDailyStat')
+    rows = (
+        Attendance.objects.annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'subject_id', 'subject__section_promo_id', 'subject__teacher_id', 'subject__teacher__department_id')
+        .annotate(total=Count('id'), present=Count('id', filter=Q(status='present')))
+        .order_by()
+    )
+    AttendanceDailyStat.objects.bulk_create(
+        (
+            AttendanceDailyStat(
+                date=row['day'],
+                subject_id=row['subject_id'],
+                section_promo_id=row['subject__section_promo_id'],
+                teacher_id=row['subject__teacher_id'],
+                department_id=row['subject__teacher__department_id'],
+                present=row['present'],
+                total=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_alter_attendance_date'),
+        ('classes', '0003_class_gallery_version'),
+        ('departments', '0001_initial'),
+        ('subjects', '0002_subject_section_promo'),
+        ('teachers', '0002_alter_teacher_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('department', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_daily_stats', to='departments.department')),
+                ('section_promo', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_daily_stats', to='classes.class')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_daily_stats', to='subjects.subject')),
+                ('teacher', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_daily_stats', to='teachers.teacher')),
+            ],
+            options={
+                'db_table': 'attendance_daily_stat',
+                'indexes': [models.Index(fields=['date', 'teacher'], name='attendance_daily_stat_teacher')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'subject'), name='attendance_daily_stat_date_subject')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+from apps.attendance.dedupe import delete_duplicate_attendance, recount_daily_stats
+
+
+def delete_duplicates(apps, schema_editor):
+    """
+    The unique constraint cannot be added while duplicates remain. On large tables, run
+    `manage.py dedupe_attendance` before migrating: this step then finds nothing to do.
+    """
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceDailyStat = apps.get_model('attendance', 'AttendanceDailyStat')
+    delete_duplicate_attendance(
+        Attendance, on_batch=lambda cells: recount_daily_stats(Attendance, AttendanceDailyStat, cells)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_attendancedailystat'),
+        ('students', '0004_delete_studentimage'),
+        ('subjects', '0002_subject_section_promo'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['subject', 'date'], name='attendance_subject_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'subject', 'date'), name='attendance_student_subject_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.attendance.sessions import sync_sessions
+
+
+def backfill_sessions(apps, schema_editor):
+    """
+    One subject at a time, so only the absentees of a single subject are held in memory.
+    """
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceSession = apps.get_model('attendance', 'AttendanceSession')
+    Subject = apps.get_model('subjects', 'Subject')
+    for subject_id in Subject.objects.order_by('id').values_list('id', flat=True).iterator():
+        sync_sessions(Attendance, AttendanceSession, subject_id=subject_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendance_indexes_unique'),
+        ('subjects', '0002_subject_section_promo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('absent_students', models.JSONField(default=list)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_sessions', to='subjects.subject')),
+            ],
+            options={
+                'db_table': 'attendance_session',
+            },
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='attendance.attendancesession'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(fields=['start'], name='attendance_session_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendancesession',
+            constraint=models.UniqueConstraint(fields=('subject', 'start'), name='attendance_session_subject_start'),
+        ),
+        migrations.RunPython(backfill_sessions, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,85 @@
 from django.db import models
+from apps.classes.models import Class
+from apps.departments.models import Department
 from apps.students.models import Student
 from apps.subjects.models import Subject
+from apps.teachers.models import Teacher
 from django.utils import timezone
 
+class AttendanceSession(models.Model):
+    """
+    One attendance session of a subject, starting at the date of its attendance records, with the counts
+    and absentees of its records. Kept in sync with the records by apps.attendance.sessions.
+    """
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="attendance_sessions")
+    start = models.DateTimeField()
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    absent_students = models.JSONField(default=list)  # Student ids, ascending
+
+    class Meta:
+        db_table = 'attendance_session'
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'start'], name='attendance_session_subject_start'),
+        ]
+        indexes = [
+            models.Index(fields=['start'], name='attendance_session_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {self.start}: {self.present_count}/{self.present_count + self.absent_count}"
+
+
 class Attendance(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="attendance_records")
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="attendance_records")
     date = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=[("present", "Present"), ("absent", "Absent")])
+    # Set by apps.attendance.sessions when the rollup refreshes the record's day
+    session = models.ForeignKey(
+        AttendanceSession, on_delete=models.SET_NULL, null=True, blank=True, related_name="records"
+    )
     class Meta:
         db_table = 'attendance'  # Custom table name
+        constraints = [
+            # Backs update_or_create(student, subject, date): concurrent check-ins cannot insert twice
+            models.UniqueConstraint(fields=['student', 'subject', 'date'], name='attendance_student_subject_date_uniq'),
+        ]
+        indexes = [
+            # Dashboards and analytics: date ranges, overall or by status
+            models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+            # Rollup refresh, analytics by subject / teacher (teacher filters resolve to subjects)
+            models.Index(fields=['subject', 'date'], name='attendance_subject_date_idx'),
+            # Attendance history of a student, newest first
+            models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ]
+    def __str__(self):
+        return f"{self.student.user.firstName} {self.student.user.lastName}  - {self.subject.name} - {self.date} ({self.status})"
+
+class AttendanceDailyStat(models.Model):
+    """
+    Present / total attendance counts of one subject on one day (in TIME_ZONE), kept up to date by
+    apps.attendance.rollup on every attendance write so the dashboards never scan the raw records.
+    The class, teacher and department of the subject are copied to filter without joins.
+    """
+    date = models.DateField()
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name="attendance_daily_stats")
+    section_promo = models.ForeignKey(Class, on_delete=models.SET_NULL, null=True, related_name="attendance_daily_stats")
+    teacher = models.ForeignKey(Teacher, on_delete=models.SET_NULL, null=True, related_name="attendance_daily_stats")
+    department = models.ForeignKey(
+        Department, on_delete=models.SET_NULL, null=True, related_name="attendance_daily_stats"
+    )
+    present = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'attendance_daily_stat'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'subject'], name='attendance_daily_stat_date_subject'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'teacher'], name='attendance_daily_stat_teacher'),
+        ]
+
     def __str__(self):
-        return f"{self.student.user.firstName} {self.student.user.lastName}  - {self.subject.name} - {self.date} ({self.status})"
\ No newline at end of file
+        return f"{self.subject} - {self.date}: {self.present}/{self.total}"
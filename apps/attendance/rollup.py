@@ -0,0 +1,138 @@
+"""
+Daily attendance rollup (AttendanceDailyStat): one row of present / total counts per subject and day.
+
+Every code path writing Attendance rows calls refresh_daily_stats() with the (subject, day) cells it
+touched, in the same transaction; records deleted by the cascade of a student (or user) delete are
+refreshed by the receivers of signals.py. A cell is recounted from the raw records of that single day, so
+the rollup does not drift, and the dashboards only read the rollup: their cost does not grow with the history.
+rebuild_daily_stats() recomputes whole date ranges (see the rebuild_attendance_rollup command).
+Each change also invalidates the cached dashboards it affects (see dashboard_cache), and the attendance
+sessions of a refreshed cell are recomputed with it (see sessions).
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.subjects.models import Subject
+from . import dashboard_cache
+from .models import Attendance, AttendanceDailyStat, AttendanceSession
+from .sessions import sync_sessions
+
+
+def day_bounds(day):
+    """
+    Aware [start, end) datetimes of a local day.
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def attendance_cell(subject_id, date):
+    """
+    The (subject id, local day) rollup cell an attendance taken at `date` belongs to.
+    """
+    return subject_id, timezone.localdate(date)
+
+
+def subject_owners(subject):
+    return {
+        'section_promo_id': subject.section_promo_id,
+        'teacher_id': subject.teacher_id,
+        'department_id': subject.teacher.department_id if subject.teacher else None,
+    }
+
+
+def refresh_daily_stats(cells):
+    """
+    Recounts the given (subject id, day) cells from the raw attendance records.
+    The stat row is locked before counting, so concurrent writers of the same cell are serialized and the
+    last one to commit always counts the rows of the others.
+    """
+    with transaction.atomic():
+        for subject_id, day in sorted(set(cells)):
+            subject = Subject.objects.select_related('teacher').filter(id=subject_id).first()
+            if subject is None:
+                continue
+            owners = subject_owners(subject)
+            dashboard_cache.invalidate_days([(subject.teacher_id, day)])
+            stat, _ = AttendanceDailyStat.objects.get_or_create(date=day, subject=subject, defaults=owners)
+            stat = AttendanceDailyStat.objects.select_for_update().get(pk=stat.pk)
+
+            start, end = day_bounds(day)
+            sync_sessions(Attendance, AttendanceSession, subject_id, start, end)
+            counts = Attendance.objects.filter(subject_id=subject_id, date__gte=start, date__lt=end).aggregate(
+                total=Count('id'), present=Count('id', filter=Q(status='present'))
+            )
+            if not counts['total']:
+                stat.delete()
+                continue
+            AttendanceDailyStat.objects.filter(pk=stat.pk).update(
+                present=counts['present'], total=counts['total'], **owners
+            )
+
+
+def refresh_subject_owners(subject_ids):
+    """
+    Copies the current class, teacher and department of the subjects to their stat rows, e.g. after a
+    subject changed teacher or a teacher changed department.
+    """
+    for subject in Subject.objects.select_related('teacher').filter(id__in=subject_ids):
+        AttendanceDailyStat.objects.filter(subject=subject).update(**subject_owners(subject))
+    dashboard_cache.invalidate_all()
+
+
+def rebuild_daily_stats(date_from=None, date_to=None, batch_size=1000):
+    """
+    Recomputes every stat row between two local days (inclusive, unbounded when None) with one grouped
+    query over the raw records. Returns the number of rows written.
+    """
+    records = Attendance.objects.all()
+    stats = AttendanceDailyStat.objects.all()
+    if date_from:
+        records = records.filter(date__gte=day_bounds(date_from)[0])
+        stats = stats.filter(date__gte=date_from)
+    if date_to:
+        records = records.filter(date__lt=day_bounds(date_to)[1])
+        stats = stats.filter(date__lte=date_to)
+
+    rows = (
+        records.annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'subject_id', 'subject__section_promo_id', 'subject__teacher_id', 'subject__teacher__department_id')
+        .annotate(total=Count('id'), present=Count('id', filter=Q(status='present')))
+        .order_by()
+    )
+    with transaction.atomic():
+        dashboard_cache.invalidate_all()
+        stats.delete()
+        created = AttendanceDailyStat.objects.bulk_create(
+            (
+                AttendanceDailyStat(
+                    date=row['day'],
+                    subject_id=row['subject_id'],
+                    section_promo_id=row['subject__section_promo_id'],
+                    teacher_id=row['subject__teacher_id'],
+                    department_id=row['subject__teacher__department_id'],
+                    present=row['present'],
+                    total=row['total'],
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def rebuild_sessions(date_from=None, date_to=None):
+    """
+    Recomputes the attendance sessions starting between two local days (inclusive, unbounded when None),
+    one subject per transaction.
+    """
+    start = day_bounds(date_from)[0] if date_from else None
+    end = day_bounds(date_to)[1] if date_to else None
+    for subject_id in Subject.objects.order_by('id').values_list('id', flat=True):
+        with transaction.atomic():
+            sync_sessions(Attendance, AttendanceSession, subject_id, start, end)
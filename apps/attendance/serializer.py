@@ -1,5 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 
+from apps.classes.models import Class
+from apps.classes.serializer import with_student_count
 from apps.students.models import Student
 from .models import Attendance
 from apps.students.serializer import StudentReadLightSerializer, StudentSerializer
@@ -13,7 +16,8 @@ class AttendanceReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Attendance
-        fields = '__all__'
+        # Listed explicitly: the session link is internal to the rollup and stays out of the responses
+        fields = ['id', 'student', 'subject', 'date', 'status']
 class AttendanceReadSerializerLight(serializers.ModelSerializer):
     """Serializer for reading attendance - includes only IDs"""
     student = StudentReadLightSerializer()
@@ -23,6 +27,16 @@ class AttendanceReadSerializerLight(serializers.ModelSerializer):
         model = Attendance
         fields = ['id', 'student', 'subject', 'date', 'status']
 
+def select_light_relations(queryset):
+    """
+    Loads everything AttendanceReadSerializerLight reads with the page itself (student and user, subject,
+    teacher and user) plus one query for the classes and their student count, whatever the page size.
+    """
+    return queryset.select_related('student__user', 'subject__teacher__user').prefetch_related(
+        Prefetch('subject__section_promo', queryset=with_student_count(Class.objects.all()))
+    )
+
+
 class AttendanceWriteSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating attendance - accepts IDs"""
     student_id = serializers.PrimaryKeyRelatedField(
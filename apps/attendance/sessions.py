@@ -0,0 +1,72 @@
+"""
+Attendance sessions (AttendanceSession): one row per subject and start datetime, with the present / absent
+counts and the ids of the absent students, so "today's sessions" views read one row per session instead of
+grouping every attendance record.
+
+Attendance records stay the source of truth and point to their session. sync_sessions() recomputes the
+sessions of a subject over a time range from its records and links the records to them; the rollup calls
+it for every (subject, day) cell it refreshes, so every attendance write also writes its session.
+
+The function takes the Attendance / AttendanceSession models as arguments so the migration creating the
+sessions can backfill them with its historical models.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+
+def sync_sessions(attendance_model, session_model, subject_id=None, start=None, end=None, batch_size=500):
+    """
+    Recomputes the sessions of a subject (every subject when None) starting in [start, end) (unbounded
+    when None) from the attendance records, deletes the sessions left without records and links the
+    records to their session. Call it in a transaction.
+    """
+    records = attendance_model.objects.all()
+    sessions = session_model.objects.all()
+    if subject_id is not None:
+        records = records.filter(subject_id=subject_id)
+        sessions = sessions.filter(subject_id=subject_id)
+    if start is not None:
+        records = records.filter(date__gte=start)
+        sessions = sessions.filter(start__gte=start)
+    if end is not None:
+        records = records.filter(date__lt=end)
+        sessions = sessions.filter(start__lt=end)
+
+    absentees = defaultdict(list)
+    for key_subject_id, date, student_id in (
+        records.filter(status='absent').order_by('student_id').values_list('subject_id', 'date', 'student_id')
+    ):
+        absentees[(key_subject_id, date)].append(student_id)
+
+    existing = {(session.subject_id, session.start): session for session in sessions}
+    created, updated = [], []
+    for row in (
+        records.values('subject_id', 'date')
+        .annotate(present=Count('id', filter=Q(status='present')), absent=Count('id', filter=Q(status='absent')))
+        .order_by()
+    ):
+        key = (row['subject_id'], row['date'])
+        values = {
+            'present_count': row['present'],
+            'absent_count': row['absent'],
+            'absent_students': absentees.get(key, []),
+        }
+        session = existing.pop(key, None)
+        if session is None:
+            created.append(session_model(subject_id=key[0], start=key[1], **values))
+        elif any(getattr(session, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(session, field, value)
+            updated.append(session)
+
+    session_model.objects.bulk_create(created, batch_size=batch_size)
+    session_model.objects.bulk_update(updated, ['present_count', 'absent_count', 'absent_students'], batch_size=batch_size)
+
+    # Records created since the last sync, or moved to another subject or date
+    records.exclude(session__subject_id=F('subject_id'), session__start=F('date')).update(
+        session=Subquery(
+            session_model.objects.filter(subject_id=OuterRef('subject_id'), start=OuterRef('date')).values('id')[:1]
+        )
+    )
+    session_model.objects.filter(id__in=[session.id for session in existing.values()]).delete()
@@ -0,0 +1,29 @@
+"""
+Keeps the attendance rollup and sessions in step with the records deleted by a cascade.
+
+Deleting a student (or their user) deletes their attendance records in the database cascade, without
+going through the views that refresh the rollup. The (subject, day) cells of the student's records are
+collected before the delete and refreshed once the records are gone, in the transaction of the delete.
+"""
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from apps.students.models import Student
+from .models import Attendance
+from .rollup import attendance_cell, refresh_daily_stats
+
+
+@receiver(pre_delete, sender=Student)
+def collect_student_attendance_cells(sender, instance, **kwargs):
+    instance._attendance_cells = {
+        attendance_cell(subject_id, date)
+        for subject_id, date in Attendance.objects.filter(student=instance).values_list('subject_id', 'date')
+    }
+
+
+@receiver(post_delete, sender=Student)
+def refresh_student_attendance_cells(sender, instance, **kwargs):
+    # Sent after the attendance records of the student were deleted, in the same transaction
+    cells = getattr(instance, '_attendance_cells', None)
+    if cells:
+        refresh_daily_stats(cells)
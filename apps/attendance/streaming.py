@@ -0,0 +1,242 @@
+import asyncio
+import datetime
+import json
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, transaction
+from django.http.request import validate_host
+from django.utils import timezone
+
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from detector import FaceRecognitionHandler
+from tracker import IoUTracker
+from .models import Attendance
+from .rollup import attendance_cell, refresh_daily_stats
+
+
+class StreamCheckInConsumer:
+    """
+    Raw ASGI WebSocket consumer for streaming door check-ins.
+    Endpoint: ws://<host>/ws/attendances/check-in/?subject_id=3&date=YYYY-MM-DD HH:MM:SS
+    The client sends webcam frames as binary JPEG messages. Faces are tracked between frames and a
+    track is only embedded when it appears or when its face got noticeably bigger, so most frames
+    cost a downscaled detection only. Every newly recognized student is marked present and pushed back:
+        {"type": "recognized", "student": {"id": 12, "name": "Doe John"}, "track": 3}
+    When the server is busy, older frames are dropped in favour of the most recent one.
+    If processing a frame fails, {"type": "error", "error": "..."} is sent and the socket is closed (1011).
+    The user comes from the session cookie, so the handshake is refused (4403) when it is sent by a page of an
+    origin outside ALLOWED_HOSTS and FACE_STREAM_ALLOWED_ORIGINS.
+    """
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.face_handler = FaceRecognitionHandler()
+        self.tracker = IoUTracker(max_missed=settings.FACE_STREAM_MAX_MISSED_FRAMES)
+        self.recognized = set()
+        self.frame_index = 0
+        self.latest_frame = None
+        self.frame_ready = asyncio.Event()
+        self.closed = False
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        if not self.origin_allowed():
+            await self.send({'type': 'websocket.close', 'code': 4403})
+            return
+
+        user = await self.database(self.get_user)
+        if not user.is_authenticated or user.role not in ['teacher', 'admin']:
+            await self.send({'type': 'websocket.close', 'code': 4403})
+            return
+
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            self.subject, self.attendance_date = await self.database(
+                self.get_session, params.get('subject_id', [None])[0], params.get('date', [None])[0]
+            )
+        except ValueError:
+            await self.send({'type': 'websocket.close', 'code': 4400})
+            return
+
+        await self.send({'type': 'websocket.accept'})
+        worker = asyncio.ensure_future(self.process_frames())
+        try:
+            while True:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect' or self.closed:
+                    break
+                if message.get('bytes'):
+                    # Only the most recent frame is kept, stale ones are dropped
+                    self.latest_frame = message['bytes']
+                    self.frame_ready.set()
+        finally:
+            self.closed = True
+            self.frame_ready.set()
+            await worker
+
+    async def database(self, func, *args):
+        """
+        Runs `func`, which uses the ORM, in the single thread doing all the database work of the consumers.
+        No request signals fire for a socket, so the connections Django would close at the start and end of
+        a request (broken, or older than CONN_MAX_AGE) are closed around each call instead: a stream left
+        open overnight does not hit a connection the server has dropped.
+        """
+        return await sync_to_async(self.with_fresh_connection)(func, *args)
+
+    @staticmethod
+    def with_fresh_connection(func, *args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    def origin_allowed(self):
+        """
+        Browsers send the origin of the page opening a WebSocket, and the session cookie whatever that page is.
+        Only pages served from ALLOWED_HOSTS, or listed in FACE_STREAM_ALLOWED_ORIGINS, may use it. Clients
+        that are not browsers send no Origin and are let through.
+        """
+        origin = dict(self.scope.get('headers', [])).get(b'origin')
+        if origin is None:
+            return True
+        origin = origin.decode('latin-1')
+        if origin in settings.FACE_STREAM_ALLOWED_ORIGINS:
+            return True
+        allowed_hosts = settings.ALLOWED_HOSTS
+        if settings.DEBUG and not allowed_hosts:
+            # Same default as Django's host validation
+            allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+        host = urlsplit(origin).hostname
+        return bool(host) and validate_host(host, allowed_hosts)
+
+    def get_user(self):
+        """
+        Resolves the Django user from the session cookie sent with the WebSocket handshake.
+        """
+        headers = dict(self.scope.get('headers', []))
+        cookies = {}
+        for cookie in headers.get(b'cookie', b'').decode().split(';'):
+            if '=' in cookie:
+                key, value = cookie.strip().split('=', 1)
+                cookies[key] = value
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+        return get_user(SimpleNamespace(session=session))
+
+    def get_session(self, subject_id, date_str):
+        if not all([subject_id, date_str]):
+            raise ValueError("subject_id and date are required")
+        attendance_date = timezone.make_aware(datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S'))
+        try:
+            subject = Subject.objects.select_related('section_promo').get(id=subject_id)
+        except Subject.DoesNotExist:
+            raise ValueError(f"Subject with id='{subject_id}' not found")
+        if subject.section_promo is None:
+            raise ValueError(f"Subject with id='{subject_id}' is not assigned to a class")
+        return subject, attendance_date
+
+    async def process_frames(self):
+        try:
+            await self.process_frame_loop()
+        except Exception as e:
+            print(f"Streaming check-in failed: {e}")
+            if not self.closed:
+                self.closed = True
+                await self.send(
+                    {
+                        'type': 'websocket.send',
+                        'text': json.dumps({'type': 'error', 'error': 'Frame processing failed, check-in stopped'}),
+                    }
+                )
+                await self.send({'type': 'websocket.close', 'code': 1011})
+
+    async def process_frame_loop(self):
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            if self.closed:
+                return
+            frame_bytes, self.latest_frame = self.latest_frame, None
+            if frame_bytes is None:
+                continue
+
+            # The gallery version is read from the database, detection and embedding are CPU bound and run
+            # in a pool thread without touching the database
+            labels, matrix = await self.database(self.load_gallery)
+            tracks = await sync_to_async(self.recognize_frame, thread_sensitive=False)(frame_bytes, labels, matrix)
+            for track in tracks:
+                student_id = track.identity
+                if student_id is None or student_id in self.recognized:
+                    continue
+                student = await self.database(self.mark_present, student_id)
+                if student is None:
+                    continue
+                self.recognized.add(student_id)
+                await self.send(
+                    {
+                        'type': 'websocket.send',
+                        'text': json.dumps(
+                            {
+                                'type': 'recognized',
+                                'student': {
+                                    'id': student.id,
+                                    'name': f'{student.user.lastName} {student.user.firstName}',
+                                },
+                                'track': track.id,
+                            }
+                        ),
+                    }
+                )
+
+    def load_gallery(self):
+        with self.face_handler.timer.stage('gallery_load'):
+            return self.face_handler.get_class_gallery(self.subject.section_promo_id)
+
+    def recognize_frame(self, frame_bytes, labels, matrix):
+        frame = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return []
+        tracks = self.face_handler.process_frame(
+            frame,
+            self.frame_index,
+            self.tracker,
+            labels,
+            matrix,
+            max_embeddings=settings.FACE_STREAM_MAX_EMBEDDINGS_PER_TRACK,
+            growth=settings.FACE_STREAM_QUALITY_GROWTH,
+            skip_identified=True,
+        )
+        self.frame_index += 1
+        self.face_handler.timer.publish('stream')
+        return tracks
+
+    def mark_present(self, student_id):
+        try:
+            student = Student.objects.select_related('user').get(
+                id=student_id, section_promo=self.subject.section_promo
+            )
+        except Student.DoesNotExist:
+            return None
+        with transaction.atomic():
+            Attendance.objects.update_or_create(
+                student=student,
+                subject=self.subject,
+                date=self.attendance_date,
+                defaults={'status': 'present'},
+            )
+            refresh_daily_stats([attendance_cell(self.subject.id, self.attendance_date)])
+        return student
@@ -0,0 +1,363 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.attendance.models import Attendance, AttendanceDailyStat, AttendanceSession
+from apps.attendance.rollup import day_bounds, rebuild_daily_stats
+from apps.attendance.sessions import sync_sessions
+from apps.classes.models import Class
+from apps.departments.models import Department
+from apps.studentimages.models import StudentImage
+from apps.students.models import Student
+from apps.subjects.models import Subject
+from apps.teachers.models import Teacher
+from apps.users.models import User
+
+
+class AttendanceTestCase(TestCase):
+    """
+    A class of 4 students with 2 subjects of one teacher, and 3 days of attendance (today included).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(email='admin@example.com', firstName='Ada', lastName='Admin', role='admin')
+        teacher_user = User.objects.create(email='teacher@example.com', firstName='Tom', lastName='Teacher', role='teacher')
+        cls.teacher = Teacher.objects.create(user=teacher_user, department=Department.objects.create(name='Computer Science'))
+        cls.section_promo = Class.objects.create(name='PROMO_IAGI_2026')
+        cls.subjects = [
+            Subject.objects.create(name=name, teacher=cls.teacher, section_promo=cls.section_promo)
+            for name in ('Algorithms', 'Databases')
+        ]
+        cls.students = [cls.create_student(index) for index in range(4)]
+
+        # 3 days x 2 subjects x 4 students = 24 records, today included
+        today = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        for days_ago in range(3):
+            for subject in cls.subjects:
+                for index, student in enumerate(cls.students):
+                    Attendance.objects.create(
+                        student=student,
+                        subject=subject,
+                        date=today - datetime.timedelta(days=days_ago),
+                        status='absent' if index % 2 else 'present',
+                    )
+        sync_sessions(Attendance, AttendanceSession)
+
+    @classmethod
+    def create_student(cls, index):
+        user = User.objects.create(
+            email=f'student{index}@example.com', firstName=f'Student{index}', lastName='Test', role='student'
+        )
+        student = Student.objects.create(user=user, section_promo=cls.section_promo)
+        for image_index in range(2):
+            StudentImage.objects.create(student=student, image=f'{cls.section_promo.id}/{student.id}/{image_index}.jpg')
+        return student
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+class AttendanceQueryCountTestCase(AttendanceTestCase):
+    """
+    The attendance read paths load the nested student / subject / teacher / class relations of a page with
+    a fixed number of queries: the count must not change when the page gets bigger.
+    """
+
+    def get(self, url, params=None):
+        """
+        Returns the response of a GET and the number of queries it ran, without any cached list total.
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, len(queries)
+
+    def add_records(self):
+        """
+        Adds a record of every student to an earlier day of the first subject.
+        """
+        date = timezone.now() - datetime.timedelta(days=10)
+        for student in self.students:
+            Attendance.objects.create(student=student, subject=self.subjects[0], date=date, status='absent')
+
+    def assertConstantPages(self, url, **params):
+        small, small_queries = self.get(url, {**params, 'limit': 2})
+        large, large_queries = self.get(url, {**params, 'limit': 10})
+        self.assertGreater(len(large.data['data']), len(small.data['data']))
+        self.assertEqual(small_queries, large_queries)
+
+    def assertConstantCursorPages(self, url):
+        page_queries = []
+        page_sizes = []
+        for limit in (1, 3):
+            first_page, _ = self.get(url, {'pagination': 'cursor', 'limit': limit})
+            next_cursor = first_page.data['metadata']['next']
+            self.assertIsNotNone(next_cursor)
+            page, queries = self.get(url, {'cursor': next_cursor, 'limit': limit})
+            page_sizes.append(len(page.data['data']))
+            page_queries.append(queries)
+        self.assertGreater(page_sizes[1], page_sizes[0])
+        self.assertEqual(page_queries[0], page_queries[1])
+
+    def assertConstantUnpaginated(self, url):
+        before, before_queries = self.get(url, {'paginated': 'false'})
+        self.add_records()
+        after, after_queries = self.get(url, {'paginated': 'false'})
+        self.assertGreater(len(after.data['data']), len(before.data['data']))
+        self.assertEqual(before_queries, after_queries)
+
+
+class AttendanceListQueryCountTests(AttendanceQueryCountTestCase):
+    url = '/api/attendances/'
+
+    def test_offset_pages(self):
+        self.assertConstantPages(self.url)
+
+    def test_offset_pages_without_count(self):
+        self.assertConstantPages(self.url, count='none')
+
+    def test_cursor_pages(self):
+        self.assertConstantCursorPages(self.url)
+
+    def test_unpaginated(self):
+        self.assertConstantUnpaginated(self.url)
+
+
+class StudentAttendanceQueryCountTests(AttendanceQueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.urls = [
+            f'/api/attendances/students/{self.students[0].id}/',
+            f'/api/students/{self.students[0].id}/attendances/',
+        ]
+
+    def test_offset_pages(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertConstantPages(url)
+
+    def test_cursor_pages(self):
+        self.assertConstantCursorPages(self.urls[0])
+
+    def test_unpaginated(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertConstantUnpaginated(url)
+
+
+class TeacherAttendanceQueryCountTests(AttendanceQueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/teachers/{self.teacher.id}/attendances/'
+
+    def test_offset_pages(self):
+        self.assertConstantPages(self.url)
+
+    def test_cursor_pages(self):
+        self.assertConstantCursorPages(self.url)
+
+    def test_unpaginated(self):
+        self.assertConstantUnpaginated(self.url)
+
+
+class SubjectAttendanceQueryCountTests(AttendanceQueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/subjects/{self.subjects[0].id}/attendance/'
+
+    def test_offset_pages(self):
+        self.assertConstantPages(self.url)
+
+    def test_cursor_pages(self):
+        self.assertConstantCursorPages(self.url)
+
+    def test_unpaginated(self):
+        self.assertConstantUnpaginated(self.url)
+
+
+class ClassAttendanceQueryCountTests(AttendanceQueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/classes/{self.section_promo.id}/attendance/'
+
+    def test_offset_pages(self):
+        self.assertConstantPages(self.url)
+
+    def test_cursor_pages(self):
+        self.assertConstantCursorPages(self.url)
+
+    def test_unpaginated(self):
+        self.assertConstantUnpaginated(self.url)
+
+
+class AttendanceTodayQueryCountTests(AttendanceQueryCountTestCase):
+    def add_today_sessions(self):
+        """
+        Adds a session of a new subject today, with new absent students.
+        """
+        subject = Subject.objects.create(name='Networks', teacher=self.teacher, section_promo=self.section_promo)
+        date = timezone.now().replace(hour=14, minute=0, second=0, microsecond=0)
+        for index in range(4, 8):
+            student = self.create_student(index)
+            Attendance.objects.create(student=student, subject=subject, date=date, status='absent')
+        sync_sessions(Attendance, AttendanceSession, subject_id=subject.id)
+
+    def assertConstantToday(self, url):
+        before, before_queries = self.get(url)
+        self.add_today_sessions()
+        after, after_queries = self.get(url)
+        self.assertGreater(len(after.data), len(before.data))
+        self.assertEqual(before_queries, after_queries)
+
+    def test_classes_attendance_today(self):
+        self.assertConstantToday('/api/subjects/attendance-today/')
+
+    def test_teacher_subjects_attendance_today(self):
+        self.assertConstantToday(f'/api/subjects/attendance-today/teacher/{self.teacher.id}/')
+
+
+class CascadeDeleteRollupTests(AttendanceTestCase):
+    """
+    Deleting a student, or their user, deletes their attendance records in a cascade: the rollup and the
+    attendance sessions must follow.
+    """
+
+    def setUp(self):
+        super().setUp()
+        rebuild_daily_stats()
+        self.student = self.students[1]
+
+    def assertRollupMatchesRecords(self):
+        stats = AttendanceDailyStat.objects.all()
+        for stat in stats:
+            start, end = day_bounds(stat.date)
+            records = Attendance.objects.filter(subject_id=stat.subject_id, date__gte=start, date__lt=end)
+            self.assertEqual(stat.total, records.count())
+            self.assertEqual(stat.present, records.filter(status='present').count())
+        self.assertEqual(sum(stat.total for stat in stats), Attendance.objects.count())
+
+    def test_student_delete(self):
+        response = self.client.delete(f'/api/students/{self.student.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Attendance.objects.filter(student_id=self.student.id).exists())
+        self.assertRollupMatchesRecords()
+
+    def test_user_delete(self):
+        self.student.user.delete()
+        self.assertFalse(Attendance.objects.filter(student_id=self.student.id).exists())
+        self.assertRollupMatchesRecords()
+
+    def test_sessions_follow_student_delete(self):
+        response = self.client.delete(f'/api/students/{self.student.id}/')
+        self.assertEqual(response.status_code, 204)
+        sessions = AttendanceSession.objects.all()
+        self.assertTrue(sessions)
+        for session in sessions:
+            records = Attendance.objects.filter(subject_id=session.subject_id, date=session.start)
+            self.assertEqual(session.present_count, records.filter(status='present').count())
+            self.assertEqual(session.absent_count, records.filter(status='absent').count())
+            self.assertNotIn(self.student.id, session.absent_students)
+            self.assertEqual(len(session.absent_students), session.absent_count)
+
+
+class CursorPaginationTests(AttendanceTestCase):
+    """
+    The cursor pages walk the records of a subject newest first, the id breaking the ties of a date.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # 30 records of a new subject at the same date, more than a page of records sharing a date
+        subject = Subject.objects.create(name='Networks', teacher=self.teacher, section_promo=self.section_promo)
+        date = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        students = self.students + [self.create_student(index) for index in range(4, 30)]
+        for student in students:
+            Attendance.objects.create(student=student, subject=subject, date=date, status='present')
+        self.url = f'/api/subjects/{subject.id}/attendance/'
+        self.record_ids = list(Attendance.objects.filter(subject=subject).order_by('-id').values_list('id', flat=True))
+
+    def get_page(self, params):
+        response = self.client.get(self.url, {'limit': 7, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [record['id'] for record in response.data['data']], response.data['metadata']
+
+    def walk(self):
+        """
+        Returns the pages (ids and metadata) from the first page to the last one, following the next cursors.
+        """
+        pages = [self.get_page({'pagination': 'cursor'})]
+        while pages[-1][1]['next']:
+            pages.append(self.get_page({'cursor': pages[-1][1]['next']}))
+        return pages
+
+    def test_same_date_pages(self):
+        pages = self.walk()
+        self.assertEqual([len(ids) for ids, _ in pages], [7, 7, 7, 7, 2])
+        self.assertEqual([record_id for ids, _ in pages for record_id in ids], self.record_ids)
+        self.assertIsNone(pages[0][1]['previous'])
+
+    def test_previous_pages(self):
+        pages = self.walk()
+        ids, metadata = pages[-1]
+        for expected_ids, _ in reversed(pages[:-1]):
+            ids, metadata = self.get_page({'cursor': metadata['previous']})
+            self.assertEqual(ids, expected_ids)
+        # Back on the first page
+        self.assertIsNone(metadata['previous'])
+        self.assertEqual(metadata['next'], pages[0][1]['next'])
+
+    def test_malformed_cursor(self):
+        for cursor in ('garbage', 'eyJkIjogMX0', '!!!'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class AttendanceConfirmTests(AttendanceTestCase):
+    """
+    Confirming an attendance upserts one record per (student, subject, date) cell.
+    """
+
+    url = '/api/attendances/confirm/'
+
+    def setUp(self):
+        super().setUp()
+        self.subject = self.subjects[0]
+        self.date = timezone.now().replace(hour=16, minute=0, second=0, microsecond=0)
+
+    def confirm(self, students):
+        payload = {
+            'date': timezone.localtime(self.date).strftime('%Y-%m-%d %H:%M:%S'),
+            'subject_id': self.subject.id,
+            'students': [{'student_id': student.id, 'status': status} for student, status in students],
+        }
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def records(self, student):
+        return Attendance.objects.filter(student=student, subject=self.subject, date=self.date)
+
+    def test_confirm_again(self):
+        student = self.students[0]
+        self.confirm([(student, 'present')])
+        count = Attendance.objects.count()
+        self.confirm([(student, 'absent')])
+        self.assertEqual(Attendance.objects.count(), count)
+        self.assertEqual(list(self.records(student).values_list('status', flat=True)), ['absent'])
+
+    def test_student_listed_twice(self):
+        student = self.students[0]
+        response = self.confirm([(student, 'present'), (self.students[1], 'present'), (student, 'absent')])
+        self.assertEqual(response.data['records_processed'], 2)
+        # The last status of the payload wins
+        self.assertEqual(list(self.records(student).values_list('status', flat=True)), ['absent'])
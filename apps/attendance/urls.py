@@ -3,8 +3,11 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     AttendanceViewSet,
     AttendanceProcessView,
+    AttendanceVideoProcessView,
+    KioskCheckInView,
     AttendanceConfirmView,
     GenerateEncodingsView,
+    EncodingJobView,
     get_attendance_by_student_id,
     get_teacher_attendance_hourly_week,
     get_teacher_attendance_last_30_days,
@@ -18,7 +21,10 @@ router.register(r'', AttendanceViewSet)
 # URLs
 urlpatterns = [
     path('process/', AttendanceProcessView.as_view({'post': 'post'}), name='process'),
+    path('process-video/', AttendanceVideoProcessView.as_view({'post': 'post'}), name='process-video'),
+    path('kiosk/check-in/', KioskCheckInView.as_view({'post': 'post'}), name='kiosk-check-in'),
     path('generate/', GenerateEncodingsView.as_view({'post': 'post'}), name='generate'),
+    path('generate/<str:task_id>/', EncodingJobView.as_view({'get': 'get'}), name='generate-job'),
     path('confirm/', AttendanceConfirmView.as_view({'post': 'post'}), name='confirm'),
     path(
         'attendance-last-30-days/teacher/<int:id>/',
@@ -1,13 +1,26 @@
 import datetime
-from django.db import transaction
+from django.db import connection, transaction
 from jsonschema import ValidationError
 from rest_framework import viewsets
 
 from apps.classes.models import Class
 from apps.students.models import Student
 from apps.subjects.models import Subject
+from apps.studentimages.storage import class_encodings_dir, class_media_dir
+from apps.studentimages.tasks import encode_class_images_task, images_to_encode, start_class_encoding
+from . import dashboard_cache
+from .dashboard_cache import GLOBAL_SCOPE, teacher_scope
+from .heatmap import hourly_week_heatmap, week_bounds
 from .models import Attendance
-from .serializer import AttendanceReadSerializer, AttendanceReadSerializerLight, AttendanceWriteSerializer
+from .analytics import AnalyticsError, daily_attendance_rates, parse_analytics_params, run_analytics
+from .rollup import attendance_cell, refresh_daily_stats
+from .limiter import RecognitionBusy, recognition_limiter
+from .serializer import (
+    AttendanceReadSerializer,
+    AttendanceReadSerializerLight,
+    AttendanceWriteSerializer,
+    select_light_relations,
+)
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from apps.users.permissions import IsTeacherOrAdmin, TeacherAttendanceOwnerOrAdmin
 from rest_framework import viewsets
@@ -15,14 +28,87 @@ from rest_framework.response import Response
 from rest_framework import status
 from detector import FaceRecognitionHandler, imageException
 from pathlib import Path
+from django.conf import settings
 import tempfile
 from rest_framework.decorators import action
-from django.db.models import Count
 from django.utils import timezone
-from django.db.models import Case, When, F, fields
-from django.db.models.functions import Cast  # For potential float conversion
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
+from classroom_absence_management.pagination import (
+    PaginationError,
+    cursor_paginated_response,
+    is_cursor_pagination,
+    paginate_by_offset,
+)
+
+
+def dashboard_scope(teacher_id):
+    return GLOBAL_SCOPE if teacher_id is None else teacher_scope(teacher_id)
+
+
+def attendance_last_30_days(teacher_id=None):
+    """
+    [{ "date": "Jan 30", "attendance": 90 }, ...] for the last 30 days, optionally for one teacher.
+    """
+    today_date = timezone.localdate()
+    first_day = today_date - datetime.timedelta(days=29)
+
+    def compute():
+        # Daily presence rates from the rollup, days without records are missing
+        daily_rates = daily_attendance_rates(first_day, today_date, teacher_id=teacher_id)
+        formatted_data = []
+        for i in range(30):
+            day_iter = first_day + datetime.timedelta(days=i)
+            formatted_data.append(
+                {
+                    "date": day_iter.strftime("%b %d"),
+                    "attendance": daily_rates.get(day_iter, 0) * 100,
+                }
+            )
+        return formatted_data
+
+    return dashboard_cache.get_or_compute(
+        'attendance-last-30-days', dashboard_scope(teacher_id), (first_day, today_date), compute
+    )
+
+
+def attendance_week(teacher_id=None):
+    """
+    [{ "date": "Mon", "attendance": 90}, ...] for the current week, optionally for one teacher.
+    """
+    today_date = timezone.localdate()
+    start_of_week = today_date - datetime.timedelta(days=today_date.weekday())
+    end_of_week = start_of_week + datetime.timedelta(days=6)
+
+    def compute():
+        # Daily presence rates from the rollup, days without records are missing
+        daily_rates = daily_attendance_rates(start_of_week, end_of_week, teacher_id=teacher_id)
+        formatted_data = []
+        for i in range(7):
+            day_iter = start_of_week + datetime.timedelta(days=i)
+            formatted_data.append(
+                {
+                    "date": day_iter.strftime("%a"),  # Format as abbreviated weekday name (e.g., "Mon")
+                    "attendance": daily_rates.get(day_iter, 0) * 100,
+                }
+            )
+        return formatted_data
+
+    return dashboard_cache.get_or_compute(
+        'attendance-week', dashboard_scope(teacher_id), (start_of_week, end_of_week), compute
+    )
+
+
+def attendance_hourly_week(week_offset=0, teacher_id=None):
+    """
+    Hourly heatmap of a week (see heatmap.hourly_week_heatmap), optionally for one teacher.
+    """
+    return dashboard_cache.get_or_compute(
+        'attendance-hourly-week',
+        dashboard_scope(teacher_id),
+        week_bounds(week_offset),
+        lambda: hourly_week_heatmap(week_offset, teacher_id=teacher_id),
+    )
 
 
 class AttendanceViewSet(viewsets.ModelViewSet):
@@ -40,6 +126,11 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             - date_to: Filter by end date (YYYY-MM-DD HH:mm:ss, time is optional).
             - status: Filter by attendance status (present/absent).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
+            - pagination: "cursor" for keyset pagination, newest first, from the `cursor` parameter
+              (metadata: limit and next / previous cursors instead of page, total and totalPages).
+            - cursor: Cursor of the page to retrieve, from the metadata of another page.
         Returns:
             - data: array of Attendance objects
             - metadata: {
@@ -53,7 +144,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         limit = int(request.query_params.get('limit', 10))
         paginated = request.query_params.get('paginated', 'true').lower() == 'true'
 
-        queryset = self.get_queryset()
+        # Relations of the light serializer loaded with the page (constant number of queries)
+        queryset = select_light_relations(self.get_queryset())
 
         # Apply filters
         filters = Q()
@@ -79,12 +171,16 @@ class AttendanceViewSet(viewsets.ModelViewSet):
 
         queryset = queryset.filter(filters)
 
-        total_count = queryset.count()
+        if is_cursor_pagination(request):
+            return cursor_paginated_response(request, queryset, AttendanceReadSerializerLight, limit)
 
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # Stable order for the page slices
+        queryset = queryset.order_by('-date', '-id')
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = AttendanceReadSerializerLight(queryset, many=True)
 
@@ -93,9 +189,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=status.HTTP_200_OK,
@@ -111,76 +206,73 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         if self.action in ['list', 'retrieve']:  # Allow anyone to view teachers
             return [AllowAny()]
         # For create require authentication
-        elif self.action == 'create':
+        elif self.action in ['create', 'get_attendance_analytics']:
             return [IsAuthenticated(), IsTeacherOrAdmin()]
         # For  update, and delete actions, require either admin or teacher permissions
         return [IsAuthenticated(), TeacherAttendanceOwnerOrAdmin()]
 
+    # Every write refreshes the daily rollup cells it touched, in the same transaction
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            attendance = serializer.save()
+            refresh_daily_stats([attendance_cell(attendance.subject_id, attendance.date)])
+
+    def perform_update(self, serializer):
+        previous_cell = attendance_cell(serializer.instance.subject_id, serializer.instance.date)
+        with transaction.atomic():
+            attendance = serializer.save()
+            refresh_daily_stats([previous_cell, attendance_cell(attendance.subject_id, attendance.date)])
+
+    def perform_destroy(self, instance):
+        cell = attendance_cell(instance.subject_id, instance.date)
+        with transaction.atomic():
+            instance.delete()
+            refresh_daily_stats([cell])
+
+    @action(detail=False, methods=['GET'], url_path='analytics')
+    def get_attendance_analytics(self, request):
+        """
+        Attendance counts and rates grouped by dimensions and time grain, in one query.
+        Query params:
+            - group_by: Comma separated dimensions among class, subject, teacher, department, student.
+            - grain: hour, day (default), week, month or total.
+            - from / to: First and last days (YYYY-MM-DD), the last 30 days by default.
+            - class, subject, teacher, department, student: Filters, comma separated ids.
+            - source: Force raw or rollup (the cheapest able to answer is picked by default).
+        Response format:
+        {
+            "source": "rollup", "grain": "day", "group_by": ["class"], "from": "...", "to": "...",
+            "truncated": false,
+            "results": [{"period": "2025-06-02", "class": 1, "class_name": "L3", "present": 40,
+                         "total": 48, "attendance": 83.3}, ...]
+        }
+        """
+        try:
+            params = parse_analytics_params(request.query_params)
+            teacher_ids = params['filters'].get('teacher', [])
+            scope = (
+                teacher_scope(teacher_ids[0])
+                if list(params['filters']) == ['teacher'] and len(teacher_ids) == 1
+                else GLOBAL_SCOPE
+            )
+            data = dashboard_cache.get_or_compute(
+                'analytics',
+                scope,
+                (params['date_from'], params['date_to']),
+                lambda: run_analytics(**params),
+                params=params,
+            )
+            return Response(data, status=status.HTTP_200_OK)
+        except AnalyticsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=False, methods=['GET'], url_path='attendance-last-30-days')
     def get_attendance_last_30_days(self, request):
         """
         Returns daily attendance counts and presence rates for the last 30 days in the format:
         [{ "date": "Jan 30", "attendance": 90, "presence_rate": 0.85 }, ...]
         """
-        today_date = datetime.date.today()
-
-        naive_start_datetime = datetime.datetime.combine(
-            today_date - datetime.timedelta(days=29), datetime.time.min
-        )
-        start_datetime_aware = timezone.make_aware(naive_start_datetime)
-
-        naive_end_datetime = datetime.datetime.combine(today_date, datetime.time.max)
-        end_datetime_aware = timezone.make_aware(naive_end_datetime)
-
-        attendance_records = Attendance.objects.filter(date__range=[start_datetime_aware, end_datetime_aware])
-
-        daily_counts_and_rates = (
-            attendance_records.values('date__date').annotate(  # Group by the date part of the datetime field
-                # Count total attendance records for the day (present + absent + others)
-                total_observations=Count('id'),
-                # Count observations where status is 'present'
-                present_count=Count(Case(When(status='present', then=1), output_field=fields.IntegerField())),
-            )
-            # Now, annotate again to calculate the attendance rate based on the counts
-            .annotate(
-                # Calculate attendance rate: present_count / total_observations
-                # Ensure division by zero is handled and result is float
-                attendance=Case(
-                    When(total_observations=0, then=0.0),  # If sum is 0, rate is 0
-                    default=Cast(F('present_count'), output_field=fields.FloatField())
-                    / Cast(F('total_observations'), output_field=fields.FloatField()),
-                    output_field=fields.FloatField(),
-                )
-            )
-            # Select only the fields you need for the final output
-            .order_by('date__date')  # Order by date to ensure correct loop processing
-        )
-
-        # Build a dict for quick lookup using date objects as keys
-        attendance_data_dict = {
-            record['date__date']: {
-                "attendance": record['attendance'],
-            }
-            for record in daily_counts_and_rates
-        }
-
-        formatted_data = []
-        for i in range(30):
-            day_iter = start_datetime_aware.date() + datetime.timedelta(days=i)
-
-            # Get data for the current day from the dictionary
-            day_data = attendance_data_dict.get(
-                day_iter, {"attendance": 0}
-            )  # Default values if no records for the day
-
-            formatted_data.append(
-                {
-                    "date": day_iter.strftime("%b %d"),
-                    "attendance": day_data["attendance"] * 100,
-                }
-            )
-
-        return Response(formatted_data, status=status.HTTP_200_OK)
+        return Response(attendance_last_30_days(), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['GET'], url_path='attendance-week')
     def get_attendance_week(self, request):
@@ -188,69 +280,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         Returns the attendance for the current week in the format:
         [{ "date": "Mon", "attendance": 90}, ...]
         """
-        # First get the start and end of the current week
-        today_date = datetime.date.today()
-        start_of_week_naive = datetime.datetime.combine(
-            today_date - datetime.timedelta(days=today_date.weekday()), datetime.time.min
-        )
-        end_of_week_naive = datetime.datetime.combine(
-            start_of_week_naive + datetime.timedelta(days=6), datetime.time.max
-        )
-
-        start_of_week = timezone.make_aware(start_of_week_naive)
-        end_of_week = timezone.make_aware(end_of_week_naive)
-
-        # Get attendance records for the current week
-        attendance_records = Attendance.objects.filter(date__range=[start_of_week, end_of_week])
-
-        # Group by date and calculate attendance
-        daily_counts_and_rates = (
-            attendance_records.values('date__date').annotate(  # Group by the date part of the datetime field
-                # Count total attendance records for the day (present + absent + others)
-                total_observations=Count('id'),
-                # Count observations where status is 'present'
-                present_count=Count(Case(When(status='present', then=1), output_field=fields.IntegerField())),
-            )
-            # Now, annotate again to calculate the attendance rate based on the counts
-            .annotate(
-                # Calculate attendance rate: present_count / total_observations
-                # Ensure division by zero is handled and result is float
-                attendance=Case(
-                    When(total_observations=0, then=0.0),  # If sum is 0, rate is 0
-                    default=Cast(F('present_count'), output_field=fields.FloatField())
-                    / Cast(F('total_observations'), output_field=fields.FloatField()),
-                    output_field=fields.FloatField(),
-                )
-            )
-            # Select only the fields you need for the final output
-            .order_by('date__date')  # Order by date to ensure correct loop processing
-        )
-
-        # Build a dict for quick lookup using date objects as keys
-        attendance_data_dict = {
-            record['date__date']: {
-                "attendance": record['attendance'],
-            }
-            for record in daily_counts_and_rates
-        }
-
-        formatted_data = []
-        for i in range(7):
-            day_iter = start_of_week.date() + datetime.timedelta(days=i)
-
-            # Get data for the current day from the dictionary
-            day_data = attendance_data_dict.get(
-                day_iter, {"attendance": 0}
-            )  # Default values if no records for the day
-
-            formatted_data.append(
-                {
-                    "date": day_iter.strftime("%a"),  # Format as abbreviated weekday name (e.g., "Mon")
-                    "attendance": day_data["attendance"] * 100,
-                }
-            )
-
-        return Response(formatted_data, status=status.HTTP_200_OK)
+        return Response(attendance_week(), status=status.HTTP_200_OK)
 
     # Know i want to get attendance records each day in the current week across different hour ranges (e.g., 8-10, 10-12, etc.)
     @action(detail=False, methods=['GET'], url_path='attendance-hourly-week')
@@ -258,6 +288,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         """
         Returns attendance records for each day of the current week across different hour ranges.
         The data is structured to show attendance patterns throughout the day for each weekday.
+        Query params: week_offset (optional, e.g. -1 for last week).
         Response format:
         [
             {
@@ -274,76 +305,12 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             ...
         ]
         """
-        # Define the hour ranges we want to track
-        hour_ranges = [
-            {"start": 8, "end": 10, "label": "8:00 - 10:00"},
-            {"start": 10, "end": 12, "label": "10:00 - 12:00"},
-            {"start": 12, "end": 14, "label": "12:00 - 14:00 (Break)"},
-            {"start": 14, "end": 16, "label": "14:00 - 16:00"},
-            {"start": 16, "end": 18, "label": "16:00 - 18:00"},
-        ]
-
-        # First get the start and end of the current week
-        today_date = datetime.date.today()
-        start_of_week_naive = datetime.datetime.combine(
-            today_date - datetime.timedelta(days=today_date.weekday()), datetime.time.min
-        )
-        end_of_week_naive = datetime.datetime.combine(
-            start_of_week_naive + datetime.timedelta(days=6), datetime.time.max
-        )
-
-        start_of_week = timezone.make_aware(start_of_week_naive)
-        end_of_week = timezone.make_aware(end_of_week_naive)
-
-        # Get attendance records for the current week
-        attendance_records = Attendance.objects.filter(date__range=[start_of_week, end_of_week])
-
-        # Prepare the week data structure
-        week_data = []
-        for day_offset in range(7):
-            current_day = start_of_week.date() + datetime.timedelta(days=day_offset)
-            day_data = {
-                "day": current_day.strftime("%a"),  # Abbreviated day name (Mon, Tue, etc.)
-                "date": current_day.strftime("%Y-%m-%d"),
-                "hourly_data": [],
-            }
-
-            # Calculate attendance for each hour range
-            for hour_range in hour_ranges:
-                # Define time range for this hour block
-                range_start_naive = datetime.datetime.combine(
-                    current_day, datetime.time(hour=hour_range["start"])
-                )
-                range_end_naive = datetime.datetime.combine(
-                    current_day, datetime.time(hour=hour_range["end"])
-                )
-
-                range_start = timezone.make_aware(range_start_naive)
-                range_end = timezone.make_aware(range_end_naive)
-
-                # Filter attendance records for this time range
-                time_range_records = attendance_records.filter(date__range=[range_start, range_end])
-
-                # Calculate attendance rate for this time range
-                total_records = time_range_records.count()
-                present_records = time_range_records.filter(status='present').count()
-
-                # Calculate attendance percentage (avoid division by zero)
-                attendance_rate = 0
-                if total_records > 0:
-                    attendance_rate = (present_records / total_records) * 100
-
-                # Add hour range data
-                day_data["hourly_data"].append(
-                    {
-                        "hour_range": hour_range["label"],
-                        "attendance": round(attendance_rate, 1),  # Round to 1 decimal place
-                    }
-                )
-
-            week_data.append(day_data)
+        try:
+            week_offset = int(request.query_params.get('week_offset', 0))
+        except ValueError:
+            return Response({"error": "week_offset must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(week_data, status=status.HTTP_200_OK)
+        return Response(attendance_hourly_week(week_offset), status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -358,6 +325,11 @@ def get_attendance_by_student_id(request, student_id):
         - date_to: Filter by end date (YYYY-MM-DD HH:mm:ss).
         - status: Filter by attendance status (present/absent).
         - paginated: A boolean to indicate whether to paginate the results (default is True).
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists.
+        - pagination: "cursor" for keyset pagination, newest first, from the `cursor` parameter
+          (metadata: limit and next / previous cursors instead of page, total and totalPages).
+        - cursor: Cursor of the page to retrieve, from the metadata of another page.
     Returns:
         - data: array of Attendance objects
         - metadata: {
@@ -371,7 +343,7 @@ def get_attendance_by_student_id(request, student_id):
     limit = int(request.query_params.get('limit', 10))
     paginated = request.query_params.get('paginated', 'true').lower() == 'true'
 
-    records = Attendance.objects.filter(student_id=student_id)
+    records = select_light_relations(Attendance.objects.filter(student_id=student_id))
 
     # Apply filters
     filters = Q()
@@ -393,12 +365,16 @@ def get_attendance_by_student_id(request, student_id):
 
     records = records.filter(filters)
 
-    total_count = records.count()
+    if is_cursor_pagination(request):
+        return cursor_paginated_response(request, records, AttendanceReadSerializerLight, limit)
 
-    if paginated:
-        start = page * limit
-        end = start + limit
-        records = records[start:end]
+    # Stable order for the page slices
+    records = records.order_by('-date', '-id')
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        records, count_metadata = paginate_by_offset(request, records, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = AttendanceReadSerializerLight(records, many=True)
 
@@ -407,9 +383,8 @@ def get_attendance_by_student_id(request, student_id):
             'data': serializer.data,
             'metadata': {
                 'page': page if paginated else 0,
-                'limit': limit if paginated else total_count,
-                'total': total_count,
-                'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                'limit': limit if paginated else count_metadata['total'],
+                **count_metadata,
             },
         },
         status=status.HTTP_200_OK,
@@ -428,67 +403,7 @@ def get_teacher_attendance_last_30_days(request, id):
     if request.method != 'GET':
         return Response({"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    today_date = datetime.date.today()
-
-    naive_start_datetime = datetime.datetime.combine(
-        today_date - datetime.timedelta(days=29), datetime.time.min
-    )
-    start_datetime_aware = timezone.make_aware(naive_start_datetime)
-
-    naive_end_datetime = datetime.datetime.combine(today_date, datetime.time.max)
-    end_datetime_aware = timezone.make_aware(naive_end_datetime)
-
-    attendance_records = Attendance.objects.filter(
-        date__range=[start_datetime_aware, end_datetime_aware], subject__teacher__id=id
-    )
-
-    daily_counts_and_rates = (
-        attendance_records.values('date__date').annotate(  # Group by the date part of the datetime field
-            # Count total attendance records for the day (present + absent + others)
-            total_observations=Count('id'),
-            # Count observations where status is 'present'
-            present_count=Count(Case(When(status='present', then=1), output_field=fields.IntegerField())),
-        )
-        # Now, annotate again to calculate the attendance rate based on the counts
-        .annotate(
-            # Calculate attendance rate: present_count / total_observations
-            # Ensure division by zero is handled and result is float
-            attendance=Case(
-                When(total_observations=0, then=0.0),  # If sum is 0, rate is 0
-                default=Cast(F('present_count'), output_field=fields.FloatField())
-                / Cast(F('total_observations'), output_field=fields.FloatField()),
-                output_field=fields.FloatField(),
-            )
-        )
-        # Select only the fields you need for the final output
-        .order_by('date__date')  # Order by date to ensure correct loop processing
-    )
-
-    # Build a dict for quick lookup using date objects as keys
-    attendance_data_dict = {
-        record['date__date']: {
-            "attendance": record['attendance'],
-        }
-        for record in daily_counts_and_rates
-    }
-
-    formatted_data = []
-    for i in range(30):
-        day_iter = start_datetime_aware.date() + datetime.timedelta(days=i)
-
-        # Get data for the current day from the dictionary
-        day_data = attendance_data_dict.get(
-            day_iter, {"attendance": 0}
-        )  # Default values if no records for the day
-
-        formatted_data.append(
-            {
-                "date": day_iter.strftime("%b %d"),
-                "attendance": day_data["attendance"] * 100,
-            }
-        )
-
-    return Response(formatted_data, status=status.HTTP_200_OK)
+    return Response(attendance_last_30_days(teacher_id=id), status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -502,71 +417,7 @@ def get_teacher_attendance_week(request, id):
     if request.method != 'GET':
         return Response({"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    # First get the start and end of the current week
-    today_date = datetime.date.today()
-    start_of_week_naive = datetime.datetime.combine(
-        today_date - datetime.timedelta(days=today_date.weekday()), datetime.time.min
-    )
-    end_of_week_naive = datetime.datetime.combine(
-        start_of_week_naive + datetime.timedelta(days=6), datetime.time.max
-    )
-
-    start_of_week = timezone.make_aware(start_of_week_naive)
-    end_of_week = timezone.make_aware(end_of_week_naive)
-
-    # Get attendance records for the current week
-    attendance_records = Attendance.objects.filter(
-        date__range=[start_of_week, end_of_week], subject__teacher__id=id
-    )
-
-    # Group by date and calculate attendance
-    daily_counts_and_rates = (
-        attendance_records.values('date__date').annotate(  # Group by the date part of the datetime field
-            # Count total attendance records for the day (present + absent + others)
-            total_observations=Count('id'),
-            # Count observations where status is 'present'
-            present_count=Count(Case(When(status='present', then=1), output_field=fields.IntegerField())),
-        )
-        # Now, annotate again to calculate the attendance rate based on the counts
-        .annotate(
-            # Calculate attendance rate: present_count / total_observations
-            # Ensure division by zero is handled and result is float
-            attendance=Case(
-                When(total_observations=0, then=0.0),  # If sum is 0, rate is 0
-                default=Cast(F('present_count'), output_field=fields.FloatField())
-                / Cast(F('total_observations'), output_field=fields.FloatField()),
-                output_field=fields.FloatField(),
-            )
-        )
-        # Select only the fields you need for the final output
-        .order_by('date__date')  # Order by date to ensure correct loop processing
-    )
-
-    # Build a dict for quick lookup using date objects as keys
-    attendance_data_dict = {
-        record['date__date']: {
-            "attendance": record['attendance'],
-        }
-        for record in daily_counts_and_rates
-    }
-
-    formatted_data = []
-    for i in range(7):
-        day_iter = start_of_week.date() + datetime.timedelta(days=i)
-
-        # Get data for the current day from the dictionary
-        day_data = attendance_data_dict.get(
-            day_iter, {"attendance": 0}
-        )  # Default values if no records for the day
-
-        formatted_data.append(
-            {
-                "date": day_iter.strftime("%a"),  # Format as abbreviated weekday name (e.g., "Mon")
-                "attendance": day_data["attendance"] * 100,
-            }
-        )
-
-    return Response(formatted_data, status=status.HTTP_200_OK)
+    return Response(attendance_week(teacher_id=id), status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -575,6 +426,7 @@ def get_teacher_attendance_hourly_week(request, id):
     """
     Returns attendance records for each day of the current week across different hour ranges.
     The data is structured to show attendance patterns throughout the day for each weekday.
+    Query params: week_offset (optional, e.g. -1 for last week).
     Response format:
     [
         {
@@ -591,154 +443,280 @@ def get_teacher_attendance_hourly_week(request, id):
         ...
     ]
     """
-    # Check if the method is GET AND get the id
-    if request.method != 'GET':
-        return Response({"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        week_offset = int(request.query_params.get('week_offset', 0))
+    except ValueError:
+        return Response({"error": "week_offset must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Define the hour ranges we want to track
-    hour_ranges = [
-        {"start": 8, "end": 10, "label": "8:00 - 10:00"},
-        {"start": 10, "end": 12, "label": "10:00 - 12:00"},
-        {"start": 12, "end": 14, "label": "12:00 - 14:00 (Break)"},
-        {"start": 14, "end": 16, "label": "14:00 - 16:00"},
-        {"start": 16, "end": 18, "label": "16:00 - 18:00"},
-    ]
+    return Response(attendance_hourly_week(week_offset, teacher_id=id), status=status.HTTP_200_OK)
 
-    # First get the start and end of the current week
-    today_date = datetime.date.today()
-    start_of_week_naive = datetime.datetime.combine(
-        today_date - datetime.timedelta(days=today_date.weekday()), datetime.time.min
-    )
-    end_of_week_naive = datetime.datetime.combine(
-        start_of_week_naive + datetime.timedelta(days=6), datetime.time.max
+
+def recognition_busy_response(busy):
+    """
+    429 answer for a request turned away by the recognition limiter, with the estimated wait as Retry-After.
+    """
+    return Response(
+        {"error": str(busy), "estimated_wait": busy.estimated_wait},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(busy.estimated_wait)},
     )
 
-    start_of_week = timezone.make_aware(start_of_week_naive)
-    end_of_week = timezone.make_aware(end_of_week_naive)
 
-    # Get attendance records for the current week
-    attendance_records = Attendance.objects.filter(
-        date__range=[start_of_week, end_of_week], subject__teacher__id=id
-    )
+class AttendanceProcessView(viewsets.ViewSet):
+    def post(self, request):
+        """
+        POST endpoint to process attendance by recognizing faces in uploaded images.
+        Expects 'images[]', 'promo_section', and 'date' in the request body.
+        """
+        try:
+            # Get request parameters from the body
+            images = request.FILES.getlist('images[]')
+            promo_section = request.data.get('promo_section')
+            date = request.data.get('date')
 
-    # Prepare the week data structure
-    week_data = []
-    for day_offset in range(7):
-        current_day = start_of_week.date() + datetime.timedelta(days=day_offset)
-        day_data = {
-            "day": current_day.strftime("%a"),  # Abbreviated day name (Mon, Tue, etc.)
-            "date": current_day.strftime("%Y-%m-%d"),
-            "hourly_data": [],
-        }
+            # Validate input parameters
+            if not all([images, promo_section, date]):
+                return Response(
+                    {"error": "Missing required parameters: images[], promo_section, and date are required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-        # Calculate attendance for each hour range
-        for hour_range in hour_ranges:
-            # Define time range for this hour block
-            range_start_naive = datetime.datetime.combine(
-                current_day, datetime.time(hour=hour_range["start"])
-            )
-            range_end_naive = datetime.datetime.combine(current_day, datetime.time(hour=hour_range["end"]))
+            # Validate promo_section
+            try:
+                section_promo = Class.objects.get(name=promo_section)
+            except Class.DoesNotExist:
+                return Response(
+                    {"error": f"Class with name '{promo_section}' does not exist."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            range_start = timezone.make_aware(range_start_naive)
-            range_end = timezone.make_aware(range_end_naive)
+            # Encodings are stored by class id
+            the_classe = section_promo.id
 
-            # Filter attendance records for this time range
-            time_range_records = attendance_records.filter(date__range=[range_start, range_end])
+            # Initialize face recognition handler
+            face_handler = FaceRecognitionHandler()
+
+            all_recognized_people = set()
+            # Process each uploaded image
+            with tempfile.TemporaryDirectory() as temp_dir:
+                temp_paths = []
+                with face_handler.timer.stage('upload'):
+                    for index, image_file in enumerate(images):
+                        # Save temporary file
+                        temp_path = Path(temp_dir) / f"{index}_{Path(image_file.name).name}"
+                        with open(temp_path, 'wb+') as temp_file:
+                            for chunk in image_file.chunks():
+                                temp_file.write(chunk)
+                        temp_paths.append(temp_path)
 
-            # Calculate attendance rate for this time range
-            total_records = time_range_records.count()
-            present_records = time_range_records.filter(status='present').count()
+                try:
+                    # Only a few recognitions run at once on a node, the others wait or are turned away
+                    with recognition_limiter.slot():
+                        for temp_path in temp_paths:
+                            # Recognize faces in the image
+                            recognized_people = face_handler.recognize_faces(temp_path, the_classe)
+                            all_recognized_people.update(set(recognized_people))
+                except RecognitionBusy as e:
+                    return recognition_busy_response(e)
+                except imageException as e:
+                    return Response(
+                        {"error": f"Image processing failed: {str(e)}. Please upload a clearer image."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
-            # Calculate attendance percentage (avoid division by zero)
-            attendance_rate = 0
-            if total_records > 0:
-                attendance_rate = (present_records / total_records) * 100
+            class_students = Student.objects.filter(section_promo=section_promo)
 
-            # Add hour range data
-            day_data["hourly_data"].append(
+            # Create final attendance list
+            final_attendance = [
                 {
-                    "hour_range": hour_range["label"],
-                    "attendance": round(attendance_rate, 1),  # Round to 1 decimal place
+                    "id": student.id,
+                    "name": f'{student.user.lastName} {student.user.firstName}',
+                    "status": "present" if str(student.id) in all_recognized_people else "absent",
                 }
-            )
+                for student in class_students
+            ]
+
+            print(f"Final attendance for {promo_section} on {date}: {final_attendance}")
 
-        week_data.append(day_data)
+            # Return response
+            return Response(
+                {"date": date, "promo_section": promo_section, "students": final_attendance},
+                status=status.HTTP_200_OK,
+                headers={"Server-Timing": face_handler.timer.server_timing()},
+            )
 
-    return Response(week_data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
 
-class AttendanceProcessView(viewsets.ViewSet):
+class AttendanceVideoProcessView(viewsets.ViewSet):
     def post(self, request):
         """
-        POST endpoint to process attendance by recognizing faces in uploaded images.
-        Expects 'images[]', 'promo_section', and 'date' in the request body.
+        POST endpoint to process attendance by recognizing faces in a short video of the classroom.
+        Expects 'video', 'promo_section', and 'date' in the request body.
+        Each student gets a number of votes (one per embedding of a face track matched to them),
+        students with at least FACE_VIDEO_MIN_VOTES votes are marked present.
         """
         try:
             # Get request parameters from the body
-            images = request.FILES.getlist('images[]')
+            video = request.FILES.get('video')
             promo_section = request.data.get('promo_section')
             date = request.data.get('date')
 
             # Validate input parameters
-            if not all([images, promo_section, date]):
+            if not all([video, promo_section, date]):
                 return Response(
-                    {"error": "Missing required parameters: images[], promo_section, and date are required"},
+                    {"error": "Missing required parameters: video, promo_section, and date are required"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # Validate promo_section
             try:
-                Class.objects.get(name=promo_section)
+                section_promo = Class.objects.get(name=promo_section)
             except Class.DoesNotExist:
                 return Response(
                     {"error": f"Class with name '{promo_section}' does not exist."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Use promo_section directly as the_classe (e.g., "PROMO_IAGI_2026")
-            the_classe = promo_section
+            the_classe = section_promo.id
 
             # Initialize face recognition handler
             face_handler = FaceRecognitionHandler()
 
-            all_recognized_people = set()
-            # Process each uploaded image
             with tempfile.TemporaryDirectory() as temp_dir:
-                for image_file in images:
-                    # Save temporary file
-                    temp_path = Path(temp_dir) / image_file.name
-                    with open(temp_path, 'wb+') as temp_file:
-                        for chunk in image_file.chunks():
-                            temp_file.write(chunk)
-
-                    try:
-                        # Recognize faces in the image
-                        recognized_people = face_handler.recognize_faces(temp_path, the_classe)
-                        all_recognized_people.update(set(recognized_people))
-                    except imageException as e:
-                        return Response(
-                            {"error": f"Image processing failed: {str(e)}. Please upload a clearer image."},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-            class_students = Student.objects.filter(section_promo__name=the_classe)
+                # OpenCV needs a real file to decode the video from
+                temp_path = Path(temp_dir) / Path(video.name).name
+                with face_handler.timer.stage('upload'), open(temp_path, 'wb+') as temp_file:
+                    for chunk in video.chunks():
+                        temp_file.write(chunk)
+
+                try:
+                    with recognition_limiter.slot():
+                        votes = face_handler.recognize_video(temp_path, the_classe)
+                except RecognitionBusy as e:
+                    return recognition_busy_response(e)
+                except imageException as e:
+                    return Response(
+                        {"error": f"Video processing failed: {str(e)}."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+            class_students = Student.objects.filter(section_promo=section_promo)
 
             # Create final attendance list
             final_attendance = [
                 {
                     "id": student.id,
                     "name": f'{student.user.lastName} {student.user.firstName}',
-                    "status": "present" if str(student.id) in all_recognized_people else "absent",
+                    "status": "present" if str(student.id) in votes else "absent",
+                    "votes": votes.get(str(student.id), 0),
                 }
                 for student in class_students
             ]
 
-            print(f"Final attendance for {the_classe} on {date}: {final_attendance}")
-
-            # Return response
             return Response(
                 {"date": date, "promo_section": promo_section, "students": final_attendance},
                 status=status.HTTP_200_OK,
+                headers={"Server-Timing": face_handler.timer.server_timing()},
+            )
+
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class KioskCheckInView(viewsets.ViewSet):
+    def get_permissions(self):
+        return [IsAuthenticated(), IsTeacherOrAdmin()]
+
+    def post(self, request):
+        """
+        POST endpoint for door-side kiosk check-ins, one face at a time.
+        Expects 'image' (a tightly cropped face), 'subject_id' and 'date' (YYYY-MM-DD HH:MM:SS, the session date)
+        in the request body. Set 'detect' to true if the image is not already cropped to the face.
+        The face is matched against the in-memory gallery of the subject's class and the student is
+        marked present for that session.
+        """
+        try:
+            image = request.FILES.get('image')
+            subject_id = request.data.get('subject_id')
+            date_str = request.data.get('date')
+            detect = str(request.data.get('detect', 'false')).lower() == 'true'
+
+            if not all([image, subject_id, date_str]):
+                return Response(
+                    {"error": "Missing required parameters: image, subject_id, and date are required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            try:
+                naive_datetime = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+                attendance_date = timezone.make_aware(naive_datetime)
+            except ValueError:
+                return Response(
+                    {"error": "Invalid date format. Use YYYY-MM-DD HH:MM:SS"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            try:
+                subject = Subject.objects.select_related('section_promo').get(id=subject_id)
+            except Subject.DoesNotExist:
+                return Response(
+                    {"error": f"Subject with id='{subject_id}' not found"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            if subject.section_promo is None:
+                return Response(
+                    {"error": f"Subject with id='{subject_id}' is not assigned to a class"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            face_handler = FaceRecognitionHandler()
+            try:
+                student_id, distance = face_handler.recognize_single_face(
+                    image, subject.section_promo_id, detect=detect
+                )
+            except imageException as e:
+                return Response(
+                    {"error": f"Image processing failed: {str(e)}. Please upload a clearer image."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if student_id is None:
+                return Response({"error": "Face not recognized"}, status=status.HTTP_404_NOT_FOUND)
+
+            try:
+                student = Student.objects.select_related('user').get(
+                    id=student_id, section_promo=subject.section_promo
+                )
+            except Student.DoesNotExist:
+                return Response({"error": "Face not recognized"}, status=status.HTTP_404_NOT_FOUND)
+
+            with transaction.atomic():
+                Attendance.objects.update_or_create(
+                    student=student,
+                    subject=subject,
+                    date=attendance_date,
+                    defaults={'status': 'present'},
+                )
+                refresh_daily_stats([attendance_cell(subject.id, attendance_date)])
+
+            return Response(
+                {
+                    "id": student.id,
+                    "name": f'{student.user.lastName} {student.user.firstName}',
+                    "status": "present",
+                    "distance": round(distance, 4),
+                },
+                status=status.HTTP_200_OK,
+                headers={"Server-Timing": face_handler.timer.server_timing()},
             )
 
         except Exception as e:
@@ -752,11 +730,18 @@ class GenerateEncodingsView(viewsets.ViewSet):
     def post(self, request):
         """
         POST endpoint to generate encodings for a specific promo_section.
-        Expects 'promo_section' (e.g., 'PROMO_IAGI_2026') in the request body.
+        Expects 'promo_section' (e.g., 'PROMO_IAGI_2026') in the request body, and optionally 'student_ids'
+        to only encode some students of the class.
+        The encoding runs in a Celery task and only touches the unencoded images of the class. Returns 202 with
+        the id of the job, to be followed with the generate/<task_id>/ endpoint. A run of the class that has not
+        started yet and covers the students is shared instead of starting another one; a run that already started
+        is followed by a new one (see start_class_encoding). Returns 200 without a task when there is no new image
+        to encode.
         """
         try:
             # Get promo_section from the request body
             promo_section = request.data.get('promo_section')
+            student_ids = request.data.get('student_ids')
 
             # Validate input parameter
             if not promo_section:
@@ -765,49 +750,52 @@ class GenerateEncodingsView(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Use promo_section directly as the_classe (e.g., "PROMO_IAGI_2026")
-            the_classe = promo_section
+            if student_ids is not None:
+                try:
+                    if not isinstance(student_ids, list):
+                        raise TypeError
+                    student_ids = [int(student_id) for student_id in student_ids]
+                except (TypeError, ValueError):
+                    return Response(
+                        {"error": "student_ids must be a list of student ids"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+            try:
+                section_promo = Class.objects.get(name=promo_section)
+            except Class.DoesNotExist:
+                return Response(
+                    {"error": f"Class with name '{promo_section}' does not exist."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
             # Check if the corresponding training directory exists
-            training_path = Path("training") / the_classe
+            training_path = Path(settings.MEDIA_ROOT) / class_media_dir(section_promo.id)
             if not training_path.exists():
                 return Response(
                     {
-                        "error": f"No training data found for {the_classe}. Ensure images are in training/{the_classe}/student_id/"
+                        "error": f"No training data found for {promo_section}. Ensure images are in {training_path}/"
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Initialize face recognition handler
-            face_handler = FaceRecognitionHandler()
-
-            # Generate encodings
-            try:
-                face_handler.encode_known_faces()
-            except Exception as e:
+            # Nothing to enqueue when every image is already encoded
+            if not images_to_encode(section_promo.id, student_ids).exists():
                 return Response(
-                    {"error": f"Failed to generate encodings: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    {"message": f"No new images to encode for {promo_section}", "task_id": None},
+                    status=status.HTTP_200_OK,
                 )
 
-            # Verify that encodings were generated
-            encodings_path = Path("encoding") / the_classe
-            generated_files = list(encodings_path.glob('*_encodings.pkl')) if encodings_path.exists() else []
-            if not generated_files:
-                return Response(
-                    {
-                        "error": f"No encodings were generated for {the_classe}. Ensure images contain detectable faces."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+            # Enqueue the encoding, or attach to the run already in flight for this class
+            result = start_class_encoding(section_promo.id, student_ids=student_ids)
 
             return Response(
                 {
-                    "message": f"Encodings generated successfully for {the_classe}",
-                    "encoding_path": str(encodings_path),
-                    "generated_files": [file.name for file in generated_files],
+                    "message": f"Encoding of {promo_section} started",
+                    "task_id": result.id,
+                    "encoding_path": class_encodings_dir(section_promo.id),
                 },
-                status=status.HTTP_200_OK,
+                status=status.HTTP_202_ACCEPTED,
             )
 
         except Exception as e:
@@ -817,6 +805,24 @@ class GenerateEncodingsView(viewsets.ViewSet):
             )
 
 
+class EncodingJobView(viewsets.ViewSet):
+    def get(self, request, task_id):
+        """
+        GET endpoint to follow an encoding job started by GenerateEncodingsView.
+        Returns the task state (PENDING, QUEUED, PROGRESS, SUCCESS or FAILURE) with the progress counts:
+        images done / total and faces found.
+        """
+        result = encode_class_images_task.AsyncResult(task_id)
+        job = {"task_id": task_id, "state": result.state}
+
+        if result.state in ('QUEUED', 'PROGRESS', 'SUCCESS') and isinstance(result.info, dict):
+            job.update(result.info)
+        elif result.state == 'FAILURE':
+            job["error"] = str(result.info)
+
+        return Response(job, status=status.HTTP_200_OK)
+
+
 class AttendanceConfirmView(viewsets.ViewSet):
     def post(self, request):
         """
@@ -871,65 +877,78 @@ class AttendanceConfirmView(viewsets.ViewSet):
                     {"error": "Students must be provided as a list"}, status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Use Django's transaction to ensure atomicity
-            with transaction.atomic():
-                # Get or create subject
+            # Validate every entry before touching the database
+            statuses = {}
+            for student_entry in students_data:
+                student_id = student_entry.get('student_id') if isinstance(student_entry, dict) else None
+                status_value = student_entry.get('status') if isinstance(student_entry, dict) else None
+
+                # Validate student entry
+                if not all([student_id, status_value]):
+                    return Response(
+                        {"error": "Each student entry must have student_id and status"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+                if status_value not in ['present', 'absent']:
+                    return Response(
+                        {
+                            "error": f"Invalid status '{status_value}' for student {student_id}. Must be 'present' or 'absent'"
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
                 try:
-                    subject = Subject.objects.get(id=subject_id)
-                except Subject.DoesNotExist:
+                    # A student listed twice keeps the last status
+                    statuses[int(student_id)] = status_value
+                except (TypeError, ValueError):
                     return Response(
-                        {"error": f"Subject with id='{subject_id}' not found"},
+                        {"error": f"Student with student_id {student_id} not found"},
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-                # Process each student
-                records_processed = 0
-                for student_entry in students_data:
-                    student_id = student_entry.get('student_id')
-                    status_value = student_entry.get('status')
-
-                    # Validate student entry
-                    if not all([student_id, status_value]):
-                        return Response(
-                            {"error": "Each student entry must have student_id and status"},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    if status_value not in ['present', 'absent']:
-                        return Response(
-                            {
-                                "error": f"Invalid status '{status_value}' for student {student_id}. Must be 'present' or 'absent'"
-                            },
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    # Get student by student_id
-                    try:
-                        student = Student.objects.get(id=student_id)
-                    except Student.DoesNotExist:
-                        return Response(
-                            {"error": f"Student with student_id {student_id} not found"},
-                            status=status.HTTP_404_NOT_FOUND,
-                        )
-
-                    # Create or update attendance record
-                    Attendance.objects.update_or_create(
-                        student=student,
-                        subject=subject,
-                        date=attendance_date,
-                        defaults={'status': status_value},
-                    )
-                    records_processed += 1
+            try:
+                subject = Subject.objects.get(id=subject_id)
+            except (Subject.DoesNotExist, ValueError):
+                return Response(
+                    {"error": f"Subject with id='{subject_id}' not found"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
 
+            # One query for all the students of the payload
+            known_ids = set(Student.objects.filter(id__in=statuses).values_list('id', flat=True))
+            unknown_ids = [student_id for student_id in statuses if student_id not in known_ids]
+            if unknown_ids:
                 return Response(
-                    {
-                        "message": "Attendance successfully recorded",
-                        "status": "success",
-                        "records_processed": records_processed,
-                    },
-                    status=status.HTTP_201_CREATED,
+                    {"error": f"Student with student_id {unknown_ids[0]} not found"},
+                    status=status.HTTP_404_NOT_FOUND,
                 )
 
+            attendances = [
+                Attendance(student_id=student_id, subject=subject, date=attendance_date, status=status_value)
+                for student_id, status_value in statuses.items()
+            ]
+            # Backends without ON CONFLICT (<columns>) (e.g. MySQL) resolve the conflict on any unique key
+            unique_fields = (
+                ['student', 'subject', 'date'] if connection.features.supports_update_conflicts_with_target else None
+            )
+
+            # One upsert on the (student, subject, date) constraint, and the rollup in the same transaction
+            with transaction.atomic():
+                Attendance.objects.bulk_create(
+                    attendances, update_conflicts=True, update_fields=['status'], unique_fields=unique_fields
+                )
+                refresh_daily_stats([attendance_cell(subject.id, attendance_date)])
+
+            return Response(
+                {
+                    "message": "Attendance successfully recorded",
+                    "status": "success",
+                    "records_processed": len(attendances),
+                },
+                status=status.HTTP_201_CREATED,
+            )
+
         except ValidationError as e:
             return Response({"error": f"Validation error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
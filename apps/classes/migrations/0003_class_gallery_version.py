@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0002_remove_class_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='gallery_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.db import models
 class Class(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
+    # Incremented whenever the face encodings of the class are rewritten (see FaceRecognitionHandler)
+    gallery_version = models.PositiveIntegerField(default=0)
     def __str__(self):
         return self.name
 
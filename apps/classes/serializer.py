@@ -2,6 +2,15 @@ from rest_framework import serializers
 from .models import Class
 from django.db.models import Count
 
+
+def with_student_count(queryset):
+    """
+    Annotates the classes of the queryset with their studentCount, read by ClassSerializer instead of
+    one COUNT query per class.
+    """
+    return queryset.annotate(studentCount=Count('students'))
+
+
 class ClassSerializer(serializers.ModelSerializer):
     studentCount = serializers.SerializerMethodField(read_only=True)
     class Meta:
@@ -10,13 +10,20 @@ from apps.users.permissions import IsAdmin, IsTeacherOrAdmin
 from apps.students.serializer import StudentReadLightSerializer
 from rest_framework.permissions import AllowAny
 import shutil
+from apps.studentimages.storage import class_encodings_dir, class_media_dir
 from apps.attendance.models import Attendance
 from rest_framework.decorators import api_view, permission_classes
 from apps.subjects.models import Subject
 from apps.subjects.serializer import SubjectReadSerializerLight
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from apps.attendance.serializer import AttendanceReadSerializerLight
+from apps.attendance.serializer import AttendanceReadSerializerLight, select_light_relations
 from django.db.models import Q
+from classroom_absence_management.pagination import (
+    PaginationError,
+    cursor_paginated_response,
+    is_cursor_pagination,
+    paginate_by_offset,
+)
 
 
 class ClassViewSet(viewsets.ModelViewSet):
@@ -38,6 +45,8 @@ class ClassViewSet(viewsets.ModelViewSet):
             - limit: The number of items per page (default is 10).
             - search: A search term to filter the results by class name (default is an empty string).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
         Returns:
              - data: array of Department objects
              - metadata: {
@@ -58,12 +67,11 @@ class ClassViewSet(viewsets.ModelViewSet):
             search_term = search.strip()
             queryset = queryset.filter(Q(name__icontains=search_term))
 
-        total_count = queryset.count()
-
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = ClassSerializer(queryset, many=True)
 
@@ -72,41 +80,30 @@ class ClassViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=status.HTTP_200_OK,
         )
 
-    # Default create method is overridden to create a folder with the class name
+    # Default create method is overridden to create the folder of the class.
+    # Folders are named after the class id, so renaming a class does not touch the file system.
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
-        class_name = response.data.get('name')
-        folder_path = os.path.join(settings.MEDIA_ROOT, class_name)
+        folder_path = os.path.join(settings.MEDIA_ROOT, class_media_dir(response.data.get('id')))
         os.makedirs(folder_path, exist_ok=True)
         return response
 
-    # Default update method is overridden to update the folder name plus the class name
-    def update(self, request, *args, **kwargs):
-        class_instance = self.get_object()
-        class_name = request.data.get('name')
-
-        # Here instead of creating new folder, we will update the folder name
-        old_class_name = class_instance.name
-        old_folder_path = os.path.join(settings.MEDIA_ROOT, old_class_name)
-        new_folder_path = os.path.join(settings.MEDIA_ROOT, class_name)
-        print(old_folder_path, new_folder_path)
-        os.rename(old_folder_path, new_folder_path)
-        response = super().update(request, *args, **kwargs)
-        return response
-
-    # Default destroy method is overridden to delete the folder
+    # Default destroy method is overridden to delete the folders of the class
     def destroy(self, request, *args, **kwargs):
         class_instance = self.get_object()
-        folder_path = os.path.join(settings.MEDIA_ROOT, class_instance.name)
-        shutil.rmtree(folder_path)
+        for folder_path in [
+            os.path.join(settings.MEDIA_ROOT, class_media_dir(class_instance.id)),
+            class_encodings_dir(class_instance.id),
+        ]:
+            if os.path.exists(folder_path):
+                shutil.rmtree(folder_path)
         return super().destroy(request, *args, **kwargs)
 
     @action(detail=True, methods=['get'], url_path='students')
@@ -118,6 +115,8 @@ class ClassViewSet(viewsets.ModelViewSet):
             - limit: The number of items per page (default is 10).
             - search: A search term to filter the results (default is an empty string).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
         Returns:
              - data: array of Student objects
              - metadata: {
@@ -147,12 +146,11 @@ class ClassViewSet(viewsets.ModelViewSet):
                 | Q(user__email__icontains=search_term)
             )
 
-        total_count = students.count()
-
-        if paginated:
-            start = page * limit
-            end = start + limit
-            students = students[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            students, count_metadata = paginate_by_offset(request, students, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = StudentReadLightSerializer(students, many=True)
 
@@ -161,9 +159,8 @@ class ClassViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=status.HTTP_200_OK,
@@ -192,6 +189,11 @@ def get_class_attendance(request, id):
         - date_to: Filter by end date (YYYY-MM-DD HH:mm:ss, time is optional)
         - status: Filter by attendance status (present/absent)
         - paginated: Boolean to indicate whether to paginate results (default is True)
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists
+        - pagination: "cursor" for keyset pagination, newest first, from the `cursor` parameter
+          (metadata: limit and next / previous cursors instead of page, total and totalPages)
+        - cursor: Cursor of the page to retrieve, from the metadata of another page
     """
     if request.method != 'GET':
         return Response({"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -210,7 +212,7 @@ def get_class_attendance(request, id):
     subjects = Subject.objects.filter(section_promo=section_promo)
 
     # Get all attendance records for these subjects
-    attendance_records = Attendance.objects.filter(subject__in=subjects)
+    attendance_records = select_light_relations(Attendance.objects.filter(subject__in=subjects))
 
     # Apply filters
     filters = Q()
@@ -238,14 +240,17 @@ def get_class_attendance(request, id):
     # Apply filters to queryset
     attendance_records = attendance_records.filter(filters)
 
-    # Get total count before pagination
-    total_count = attendance_records.count()
+    if is_cursor_pagination(request):
+        return cursor_paginated_response(request, attendance_records, AttendanceReadSerializerLight, limit)
+
+    # Stable order for the page slices
+    attendance_records = attendance_records.order_by('-date', '-id')
 
-    # Apply pagination
-    if paginated:
-        start = page * limit
-        end = start + limit
-        attendance_records = attendance_records[start:end]
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        attendance_records, count_metadata = paginate_by_offset(request, attendance_records, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = AttendanceReadSerializerLight(attendance_records, many=True)
 
@@ -254,9 +259,8 @@ def get_class_attendance(request, id):
             'data': serializer.data,
             'metadata': {
                 'page': page if paginated else 0,
-                'limit': limit if paginated else total_count,
-                'total': total_count,
-                'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                'limit': limit if paginated else count_metadata['total'],
+                **count_metadata,
             },
         },
         status=status.HTTP_200_OK,
@@ -274,6 +278,8 @@ def get_class_subjects(request, id):
         - search: Search term to filter by subject name
         - teacher_id: Filter by teacher ID
         - paginated: Boolean to indicate whether to paginate results (default is True)
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists
     Returns:
         - data: array of Subject objects
         - metadata: {
@@ -309,14 +315,11 @@ def get_class_subjects(request, id):
     if teacher_id:
         subjects = subjects.filter(teacher__id=teacher_id)
 
-    # Get total count before pagination
-    total_count = subjects.count()
-
-    # Apply pagination
-    if paginated:
-        start = page * limit
-        end = start + limit
-        subjects = subjects[start:end]
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        subjects, count_metadata = paginate_by_offset(request, subjects, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = SubjectReadSerializerLight(subjects, many=True)
 
@@ -325,9 +328,8 @@ def get_class_subjects(request, id):
             'data': serializer.data,
             'metadata': {
                 'page': page if paginated else 0,
-                'limit': limit if paginated else total_count,
-                'total': total_count,
-                'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                'limit': limit if paginated else count_metadata['total'],
+                **count_metadata,
             },
         },
         status=status.HTTP_200_OK,
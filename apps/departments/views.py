@@ -4,11 +4,14 @@ from .serializer import DepartmentSerializer
 from rest_framework.permissions import IsAuthenticated
 from apps.users.permissions import IsAdmin, IsTeacherOrAdmin
 from rest_framework.permissions import AllowAny
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from apps.attendance import dashboard_cache
 from apps.teachers.serializer import TeacherReadLightSerializer
 from rest_framework import status as Status
+from classroom_absence_management.pagination import PaginationError, paginate_by_offset
 
 
 class DepartmentViewSet(viewsets.ModelViewSet):
@@ -30,6 +33,8 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             - limit: The number of items per page (default is 10).
             - search: A search term to filter the results by department name or desc (default is an empty string).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
         Returns:
              - data: array of Department objects
              - metadata: {
@@ -50,12 +55,11 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             search_term = search.strip()
             queryset = queryset.filter(Q(name__icontains=search_term) | Q(description__icontains=search_term))
 
-        total_count = queryset.count()
-
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=Status.HTTP_400_BAD_REQUEST)
 
         serializer = DepartmentSerializer(queryset, many=True)
 
@@ -64,9 +68,8 @@ class DepartmentViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=Status.HTTP_200_OK,
@@ -81,6 +84,8 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             - limit: The number of items per page (default is 10)
             - search: Search term to filter by name or email
             - paginated: Boolean to indicate whether to paginate results (default is True)
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists
         Returns:
             - data: array of Teacher objects
             - metadata: {
@@ -111,12 +116,11 @@ class DepartmentViewSet(viewsets.ModelViewSet):
                 | Q(user__email__icontains=search_term)
             )
 
-        total_count = teachers.count()
-
-        if paginated:
-            start = page * limit
-            end = start + limit
-            teachers = teachers[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            teachers, count_metadata = paginate_by_offset(request, teachers, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=Status.HTTP_400_BAD_REQUEST)
 
         serializer = TeacherReadLightSerializer(teachers, many=True)
 
@@ -125,9 +129,8 @@ class DepartmentViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=Status.HTTP_200_OK,
@@ -138,20 +141,25 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         """
         Returns the attendance count for each department.
         """
-        departments_data = Department.objects.annotate(
-            total=Count('teachers__subjects__attendance_records')
-        ).values(
-            'name', 'total'
-        )  # Only select 'name' and 'total' as 'id' is not needed in final output
-
-        # Transform the QuerySet into the desired JSON format
-        formatted_data = []
-        for department in departments_data:
-            formatted_data.append(
-                {
-                    "department": department['name'],  # Map 'name' to 'department'
-                    "attendance": department['total'] * 100,  # Map 'total' to 'attendance'
-                }
-            )
-
+        def compute():
+            departments_data = Department.objects.annotate(
+                total=Coalesce(Sum('attendance_daily_stats__total'), 0)
+            ).values(
+                'name', 'total'
+            )  # Only select 'name' and 'total' as 'id' is not needed in final output
+
+            # Transform the QuerySet into the desired JSON format
+            formatted_data = []
+            for department in departments_data:
+                formatted_data.append(
+                    {
+                        "department": department['name'],  # Map 'name' to 'department'
+                        "attendance": department['total'] * 100,  # Map 'total' to 'attendance'
+                    }
+                )
+            return formatted_data
+
+        formatted_data = dashboard_cache.get_or_compute(
+            'departments-attendance-total', dashboard_cache.GLOBAL_SCOPE, None, compute
+        )
         return Response(formatted_data, status=Status.HTTP_200_OK)
@@ -0,0 +1,89 @@
+import io
+import math
+
+import numpy as np
+import face_recognition
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .quality import face_recognition_lock
+
+
+def jpeg_bytes(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def working_copy(image):
+    """
+    Returns the size-capped copy of an (already orientation-corrected) image along with the scale
+    applied to it, so face locations found on the original can be mapped onto it.
+    """
+    width, height = image.size
+    scale = min(1.0, settings.STUDENT_IMAGE_WORKING_SIZE / float(max(width, height)))
+    if scale < 1.0:
+        image = image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    return image, scale
+
+
+def aligned_face_crop(image, face_location):
+    """
+    Rotates the image around the face so the eyes are level, then cuts a square crop around it
+    with some margin, resized to STUDENT_IMAGE_FACE_CROP_SIZE.
+    """
+    top, right, bottom, left = face_location
+    center_x, center_y = (left + right) / 2.0, (top + bottom) / 2.0
+
+    with face_recognition_lock:
+        landmarks = face_recognition.face_landmarks(np.asarray(image), [face_location], model="small")
+    if landmarks:
+        image_left_eye, image_right_eye = sorted(
+            [np.mean(landmarks[0]['left_eye'], axis=0), np.mean(landmarks[0]['right_eye'], axis=0)],
+            key=lambda eye: eye[0],
+        )
+        angle = math.degrees(
+            math.atan2(image_right_eye[1] - image_left_eye[1], image_right_eye[0] - image_left_eye[0])
+        )
+        image = image.rotate(angle, resample=Image.BILINEAR, center=(center_x, center_y))
+
+    half_side = max(bottom - top, right - left) * settings.STUDENT_IMAGE_FACE_CROP_MARGIN / 2.0
+    crop = image.crop(
+        (
+            int(center_x - half_side),
+            int(center_y - half_side),
+            int(center_x + half_side),
+            int(center_y + half_side),
+        )
+    )
+    size = settings.STUDENT_IMAGE_FACE_CROP_SIZE
+    return crop.resize((size, size), Image.LANCZOS)
+
+
+def build_derivatives(student_image, quality, save=True):
+    """
+    Writes the detection-optimized derivatives of an uploaded image next to the original:
+    - working_image: orientation-corrected, size-capped and recompressed copy.
+    - face_image: aligned crop of the face, which the encoder can embed without running a detection
+      on the full image.
+    Uses the decoded image and face location of the upload-time quality check (see quality.assess_image).
+    With save=False the files are written but the instance is not saved, so it can go through bulk_create.
+    """
+    image, scale = working_copy(quality.image)
+    student_image.working_image.save(
+        'working.jpg',
+        ContentFile(jpeg_bytes(image, settings.STUDENT_IMAGE_WORKING_QUALITY)),
+        save=False,
+    )
+
+    top, right, bottom, left = quality.face_location
+    face_location = (int(top * scale), int(right * scale), int(bottom * scale), int(left * scale))
+    student_image.face_image.save(
+        'face.jpg',
+        ContentFile(jpeg_bytes(aligned_face_crop(image, face_location), settings.STUDENT_IMAGE_WORKING_QUALITY)),
+        save=False,
+    )
+    if save:
+        student_image.save(update_fields=['working_image', 'face_image'])
+    return student_image
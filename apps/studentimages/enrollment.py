@@ -0,0 +1,122 @@
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from apps.students.models import Student
+from .derivatives import build_derivatives
+from .models import StudentImage
+from .quality import assess_image
+from .tasks import start_class_encoding
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class EnrollmentImportError(Exception):
+    pass
+
+
+def _archive_photos(archive):
+    """
+    Yields (label, ZipInfo) for every photo of the archive. The label is the name of the folder
+    directly containing the photo, so archives wrapped in a top-level folder work too.
+    """
+    for member in archive.infolist():
+        path = PurePosixPath(member.filename)
+        if member.is_dir() or len(path.parts) < 2:
+            continue
+        if path.parts[0] == '__MACOSX' or path.name.startswith('.'):
+            continue
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        yield path.parent.name.strip(), member
+
+
+def _import_photo(archive, member, student):
+    """
+    Reads one photo out of the archive, runs the upload quality check and writes the image and
+    its derivatives to storage. Returns an unsaved StudentImage, or the rejection reason.
+    """
+    if member.file_size > settings.STUDENT_IMAGE_IMPORT_MAX_FILE_SIZE:
+        return None, "File is too large"
+
+    with archive.open(member) as photo:
+        photo_file = ContentFile(photo.read(), name=PurePosixPath(member.filename).name)
+
+    quality = assess_image(photo_file)
+    if not quality.usable:
+        return None, quality.reason
+
+    student_image = StudentImage(student=student, **quality.model_fields())
+    student_image.image.save(photo_file.name, photo_file, save=False)
+    try:
+        build_derivatives(student_image, quality, save=False)
+    except Exception as e:
+        # The encoder falls back to the original image
+        print(f"Could not build derivatives for {member.filename}: {e}")
+    return student_image, None
+
+
+def import_enrollment_archive(archive_file, section_promo, workers=None):
+    """
+    Imports a ZIP archive of labelled photos for a class, laid out as `<student_id or email>/<photos>`.
+    Photos are stream-extracted and written in parallel, the StudentImage rows are inserted with a single
+    bulk_create and one encoding job is enqueued for the whole class.
+    Returns a summary: {"images": int, "students": int, "rejected": [...], "unknown": [...], "task_id": str}
+    """
+    students = Student.objects.filter(section_promo=section_promo).select_related('user', 'section_promo')
+    students_by_label = {}
+    for student in students:
+        students_by_label[str(student.id)] = student
+        students_by_label[student.user.email.lower()] = student
+
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except zipfile.BadZipFile:
+        raise EnrollmentImportError("The archive is not a valid ZIP file")
+
+    rejected = []
+    unknown = set()
+    with archive, ThreadPoolExecutor(max_workers=workers or settings.STUDENT_IMAGE_IMPORT_WORKERS) as executor:
+        futures = []
+        for label, member in _archive_photos(archive):
+            student = students_by_label.get(label.lower())
+            if student is None:
+                unknown.add(label)
+                continue
+            futures.append((member, executor.submit(_import_photo, archive, member, student)))
+
+        student_images = []
+        for member, future in futures:
+            try:
+                student_image, reason = future.result()
+            except Exception as e:
+                student_image, reason = None, str(e)
+            if student_image is None:
+                rejected.append({"name": member.filename, "reason": reason})
+            else:
+                student_images.append(student_image)
+
+    try:
+        with transaction.atomic():
+            StudentImage.objects.bulk_create(student_images, batch_size=500)
+    except Exception:
+        # The photos were written to storage by the workers, do not leave them behind without their rows
+        for student_image in student_images:
+            student_image.delete_files()
+        raise
+
+    task_id = None
+    if student_images:
+        task_id = start_class_encoding(section_promo.id).id
+
+    return {
+        "images": len(student_images),
+        "students": len({student_image.student_id for student_image in student_images}),
+        "rejected": rejected,
+        "unknown": sorted(unknown),
+        "task_id": task_id,
+    }
@@ -0,0 +1,124 @@
+import os
+import uuid
+from collections import defaultdict
+
+import numpy as np
+import face_recognition
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from apps.students.models import Student
+from detector import FaceRecognitionHandler
+from .derivatives import aligned_face_crop, jpeg_bytes
+from .models import StudentImage
+from .quality import face_recognition_lock
+from .tasks import encoding_lock
+
+
+class GroupPhotoError(Exception):
+    pass
+
+
+def _load_group_photo(group_photo):
+    return ImageOps.exif_transpose(Image.open(group_photo.image.path)).convert('RGB')
+
+
+def detect_group_photo(group_photo):
+    """
+    Runs a single detection pass over a class group photo and writes an aligned crop of every
+    detected face next to it, so an admin can tell which student each face belongs to.
+    Stores and returns the detected faces: [{"id": 0, "location": [...], "crop": "<file name>"}, ...]
+    """
+    image = _load_group_photo(group_photo)
+    with face_recognition_lock:
+        face_locations = face_recognition.face_locations(
+            np.asarray(image),
+            number_of_times_to_upsample=settings.GROUP_PHOTO_UPSAMPLE,
+            model=settings.GROUP_PHOTO_DETECTION_MODEL,
+        )
+
+    crop_prefix = os.path.splitext(group_photo.image.name)[0]
+    faces = []
+    for face_id, face_location in enumerate(face_locations):
+        crop = aligned_face_crop(image, face_location)
+        crop_name = default_storage.save(
+            f"{crop_prefix}_{face_id}.jpg",
+            ContentFile(jpeg_bytes(crop, settings.STUDENT_IMAGE_WORKING_QUALITY)),
+        )
+        faces.append({"id": face_id, "location": list(face_location), "crop": crop_name})
+
+    group_photo.faces = faces
+    group_photo.save(update_fields=['faces'])
+    return faces
+
+
+def assign_group_photo_faces(group_photo, assignments):
+    """
+    Enrolls the faces of a group photo an admin assigned to students.
+    Args:
+        group_photo: The GroupPhoto, already run through detect_group_photo.
+        assignments: Dict mapping face ids to student ids.
+    All assigned faces are embedded with one face_encodings call on the already known locations, then
+    appended to each student's gallery. The crops are also kept as (already encoded) StudentImage rows.
+    Returns {"students": int, "faces": int, "encodings_added": int}
+    """
+    faces_by_id = {face['id']: face for face in group_photo.faces}
+    unknown_faces = [face_id for face_id in assignments if face_id not in faces_by_id]
+    if unknown_faces:
+        raise GroupPhotoError(f"Unknown face id(s): {', '.join(str(face_id) for face_id in unknown_faces)}")
+
+    students = Student.objects.filter(
+        id__in=set(assignments.values()), section_promo=group_photo.section_promo
+    ).select_related('section_promo')
+    students_by_id = {student.id: student for student in students}
+    unknown_students = sorted(set(assignments.values()) - set(students_by_id))
+    if unknown_students:
+        raise GroupPhotoError(
+            f"Student(s) {', '.join(str(student_id) for student_id in unknown_students)} "
+            f"not found in class {group_photo.section_promo.name}"
+        )
+
+    face_ids = list(assignments)
+    image = _load_group_photo(group_photo)
+    with face_recognition_lock:
+        encodings = face_recognition.face_encodings(
+            np.asarray(image), [tuple(faces_by_id[face_id]['location']) for face_id in face_ids]
+        )
+
+    encodings_by_student = defaultdict(list)
+    student_images = []
+    for face_id, encoding in zip(face_ids, encodings):
+        student = students_by_id[assignments[face_id]]
+        encodings_by_student[student].append(encoding)
+
+        student_image = StudentImage(student=student, is_encoded=True, face_count=1)
+        with default_storage.open(faces_by_id[face_id]['crop']) as crop:
+            student_image.image.save('face.jpg', ContentFile(crop.read()), save=False)
+        student_images.append(student_image)
+
+    # The galleries are rewritten: wait for an encoding run of the class to finish first
+    lock = encoding_lock(group_photo.section_promo_id)
+    lock_token = str(uuid.uuid4())
+    if not lock.acquire(lock_token, blocking_timeout=settings.ENCODING_LOCK_WAIT):
+        raise GroupPhotoError(
+            f"The encodings of class {group_photo.section_promo.name} are being generated, try again later"
+        )
+    try:
+        face_handler = FaceRecognitionHandler()
+        encodings_added = 0
+        for student, student_encodings in encodings_by_student.items():
+            encodings_added += face_handler.append_encodings(student.section_promo_id, student.id, student_encodings)
+    finally:
+        lock.release(lock_token)
+
+    with transaction.atomic():
+        StudentImage.objects.bulk_create(student_images)
+
+    return {
+        "students": len(encodings_by_student),
+        "faces": len(student_images),
+        "encodings_added": encodings_added,
+    }
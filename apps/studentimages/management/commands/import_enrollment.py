@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.classes.models import Class
+from apps.studentimages.enrollment import EnrollmentImportError, import_enrollment_archive
+
+
+class Command(BaseCommand):
+    help = "Enrolls a class from a ZIP archive of labelled photos laid out as <student_id or email>/<photos>."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help="Path to the ZIP archive")
+        parser.add_argument('--class', dest='class_id', type=int, required=True, help="ID of the class to enroll")
+        parser.add_argument('--workers', type=int, default=None, help="Number of parallel writers")
+
+    def handle(self, *args, **options):
+        try:
+            section_promo = Class.objects.get(id=options['class_id'])
+        except Class.DoesNotExist:
+            raise CommandError(f"Class with id {options['class_id']} does not exist")
+
+        try:
+            with open(options['archive'], 'rb') as archive:
+                summary = import_enrollment_archive(archive, section_promo, workers=options['workers'])
+        except (OSError, EnrollmentImportError) as e:
+            raise CommandError(str(e))
+
+        for rejected in summary['rejected']:
+            self.stdout.write(self.style.WARNING(f"Skipped {rejected['name']}: {rejected['reason']}"))
+        for label in summary['unknown']:
+            self.stdout.write(self.style.WARNING(f"No student of {section_promo.name} matches folder '{label}'"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {summary['images']} image(s) for {summary['students']} student(s) of {section_promo.name}."
+            )
+        )
+        if summary['task_id']:
+            self.stdout.write(f"Encoding job enqueued: {summary['task_id']}")
@@ -0,0 +1,122 @@
+import os
+import pickle
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.classes.models import Class
+from apps.studentimages.models import StudentImage
+from apps.studentimages.storage import ENCODINGS_ROOT, class_encodings_dir, student_media_dir
+from apps.studentimages.tasks import encoding_lock
+
+IMAGE_FIELDS = ('image', 'working_image', 'face_image')
+
+
+def _remove_empty_dirs(root):
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        if not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves training images and encodings from the class-name layout to the class-id layout "
+        "(MEDIA_ROOT/<class_id>/<shard>/<student_id>/ and encoding/<class_id>/). "
+        "Every file is moved and recorded one at a time, so the command can simply be re-run after an interruption."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be moved")
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of images fetched per query")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        moved_images = self.migrate_images(options['batch_size'])
+        moved_encodings = self.migrate_encodings()
+
+        if not self.dry_run:
+            for section_promo in Class.objects.all():
+                old_media_dir = os.path.join(settings.MEDIA_ROOT, section_promo.name)
+                if section_promo.name != str(section_promo.id) and os.path.isdir(old_media_dir):
+                    _remove_empty_dirs(old_media_dir)
+
+        verb = "Would move" if self.dry_run else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {moved_images} image file(s) and {moved_encodings} encoding file(s).")
+        )
+
+    def move_file(self, old_path, new_path):
+        """
+        Moves a file, treating an already moved file (interrupted previous run) as done.
+        Returns False when the file is found at neither place.
+        """
+        if os.path.exists(old_path):
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.replace(old_path, new_path)
+            return True
+        return os.path.exists(new_path)
+
+    def migrate_images(self, batch_size):
+        moved = 0
+        student_images = StudentImage.objects.select_related('student').order_by('id')
+        for student_image in student_images.iterator(chunk_size=batch_size):
+            target_dir = student_media_dir(student_image.student.section_promo_id, student_image.student_id)
+            updated_fields = []
+            for field_name in IMAGE_FIELDS:
+                field = getattr(student_image, field_name)
+                if not field or os.path.dirname(field.name) == target_dir:
+                    continue
+                new_name = os.path.join(target_dir, os.path.basename(field.name))
+                if not self.dry_run and not self.move_file(
+                    os.path.join(settings.MEDIA_ROOT, field.name), os.path.join(settings.MEDIA_ROOT, new_name)
+                ):
+                    self.stdout.write(self.style.WARNING(f"Missing file {field.name} (image {student_image.id})"))
+                field.name = new_name
+                updated_fields.append(field_name)
+                moved += 1
+
+            if updated_fields and not self.dry_run:
+                student_image.save(update_fields=updated_fields)
+        return moved
+
+    def migrate_encodings(self):
+        # Imported here, loading the face models is only needed to merge galleries
+        from detector import FaceRecognitionHandler
+
+        face_handler = FaceRecognitionHandler()
+        moved = 0
+        for section_promo in Class.objects.all():
+            old_dir = Path(ENCODINGS_ROOT, section_promo.name)
+            new_dir = Path(class_encodings_dir(section_promo.id))
+            if old_dir == new_dir or not old_dir.is_dir():
+                continue
+
+            if self.dry_run:
+                moved += len(list(old_dir.glob('*_encodings.pkl')))
+                continue
+
+            # Wait for an encoding run of the class to finish, it writes the same galleries
+            lock = encoding_lock(section_promo.id)
+            lock_token = str(uuid.uuid4())
+            lock.acquire(lock_token)
+            try:
+                for encoding_file in old_dir.glob('*_encodings.pkl'):
+                    moved += 1
+                    new_file = new_dir / encoding_file.name
+                    if not new_file.exists():
+                        self.move_file(encoding_file, new_file)
+                        continue
+                    # The class was already encoded in the new layout: merge instead of overwriting
+                    with encoding_file.open(mode='rb') as f:
+                        old_encodings = pickle.load(f)
+                    student_id = encoding_file.stem.replace('_encodings', '')
+                    face_handler.append_encodings(section_promo.id, student_id, old_encodings['encodings'])
+                    encoding_file.unlink()
+
+                face_handler.bump_gallery_version(section_promo.id)
+            finally:
+                lock.release(lock_token)
+            _remove_empty_dirs(old_dir)
+        return moved
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentimages', '0002_studentimage_is_encoded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentimage',
+            name='blur_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentimage',
+            name='face_count',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentimage',
+            name='face_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentimage',
+            name='quality_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
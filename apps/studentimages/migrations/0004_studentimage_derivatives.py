@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:03
+
+import apps.studentimages.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentimages', '0003_studentimage_quality'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentimage',
+            name='face_image',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to=apps.studentimages.models.student_image_upload_path),
+        ),
+        migrations.AddField(
+            model_name='studentimage',
+            name='working_image',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to=apps.studentimages.models.student_image_upload_path),
+        ),
+    ]
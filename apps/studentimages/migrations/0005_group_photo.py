@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:07
+
+import apps.studentimages.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0002_remove_class_parent'),
+        ('studentimages', '0004_studentimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(max_length=255, upload_to=apps.studentimages.models.group_photo_upload_path)),
+                ('faces', models.JSONField(default=list)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('section_promo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_photos', to='classes.class')),
+            ],
+            options={
+                'verbose_name': 'Group Photo',
+                'verbose_name_plural': 'Group Photos',
+                'db_table': 'group_photo',
+            },
+        ),
+    ]
@@ -1,29 +1,48 @@
 from django.db import models
 from apps.students.models import Student
+from apps.classes.models import Class
 import os
 from django.conf import settings
 import uuid
+from .storage import student_media_dir
 
 
 def student_image_upload_path(instance, filename):
     """
     Generates a safe upload path for student images.
     - Prevents directory traversal attacks.
-    - Organizes images in `MEDIA_ROOT/training/{section_promo}/{student_id}/filename`.
+    - Organizes images in `MEDIA_ROOT/{class_id}/{shard}/{student_id}/filename` (see storage.student_media_dir).
     """
     ext = filename.split('.')[-1]  # Extract file extension
     new_filename = f"{uuid.uuid4().hex}.{ext}"  # Generate a unique filename
 
     if instance.student:
-        class_name = instance.student.section_promo.name  # Assuming section_promo is a related field
-        return os.path.join(class_name, str(instance.student.id), new_filename)
+        return os.path.join(
+            student_media_dir(instance.student.section_promo_id, instance.student.id), new_filename
+        )
+
+
+def group_photo_upload_path(instance, filename):
+    """
+    Organizes group photos in `MEDIA_ROOT/group_photos/{class_id}/filename`.
+    """
+    ext = filename.split('.')[-1]
+    return os.path.join('group_photos', str(instance.section_promo_id), f"{uuid.uuid4().hex}.{ext}")
 
 
 class StudentImage(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to=student_image_upload_path, max_length=255)
+    # Detection-optimized derivatives written at upload time (see derivatives.build_derivatives)
+    working_image = models.ImageField(upload_to=student_image_upload_path, max_length=255, null=True, blank=True)
+    face_image = models.ImageField(upload_to=student_image_upload_path, max_length=255, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_encoded = models.BooleanField(default=False)
+    # Quality metadata computed at upload time (see quality.assess_image)
+    face_count = models.PositiveSmallIntegerField(null=True, blank=True)
+    face_size = models.PositiveIntegerField(null=True, blank=True)
+    blur_score = models.FloatField(null=True, blank=True)
+    quality_score = models.FloatField(null=True, blank=True)
 
     class Meta:
         db_table = 'student_image'
@@ -33,9 +52,43 @@ class StudentImage(models.Model):
     def __str__(self):
         return f"Image for {self.student.user.email} in {self.student.section_promo.name}"
 
+    def delete_files(self):
+        """
+        Removes the original image and its derivatives from storage.
+        """
+        for image in [self.image, self.working_image, self.face_image]:
+            if image:
+                image_path = image.path
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+
     def delete(self, *args, **kwargs):
-        if self.image:
-            image_path = self.image.path
-            if os.path.exists(image_path):
-                os.remove(image_path)
+        self.delete_files()
         super().delete(*args, **kwargs)  # Call Django's delete method
+
+
+class GroupPhoto(models.Model):
+    """
+    A class group photo used to enroll many students at once. `faces` holds the result of the single
+    detection pass: [{"id": 0, "location": [top, right, bottom, left], "crop": "<crop file name>"}, ...]
+    """
+    section_promo = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='group_photos')
+    image = models.ImageField(upload_to=group_photo_upload_path, max_length=255)
+    faces = models.JSONField(default=list)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'group_photo'
+        verbose_name = 'Group Photo'
+        verbose_name_plural = 'Group Photos'
+
+    def __str__(self):
+        return f"Group photo of {self.section_promo.name} ({len(self.faces)} faces)"
+
+    def delete(self, *args, **kwargs):
+        paths = [self.image.path] if self.image else []
+        paths += [os.path.join(settings.MEDIA_ROOT, face['crop']) for face in self.faces]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        super().delete(*args, **kwargs)
@@ -0,0 +1,111 @@
+import threading
+
+import cv2
+import numpy as np
+import face_recognition
+from PIL import Image, ImageOps
+from django.conf import settings
+
+# dlib models (detector, landmarks, encoder) are not safe to call from several threads at once: every
+# face_recognition call of the process goes through this lock (quality check, derivatives, group photos and
+# detector.py, whose recognition paths run in threads too, e.g. the streaming check-in). Only the dlib calls
+# are serialized: decoding, resizing, blur scoring and writing files stay parallel in the bulk import.
+face_recognition_lock = threading.Lock()
+
+
+class ImageQuality:
+    """
+    Result of the upload-time quality check of a training image.
+    - usable: False when the image would be useless for encoding, `reason` then tells why.
+    - face_count: Number of faces found by the downsampled HOG detection.
+    - face_size: Smallest side of the face box, in pixels of the original image.
+    - blur_score: Variance of the Laplacian over the face, higher is sharper.
+    - quality_score: 0..1 score combining sharpness and face size, used to order the encoding sweep.
+    - face_location: (top, right, bottom, left) of the face in `image`.
+    - image: The decoded, orientation-corrected PIL image, reused to build the derivatives.
+    """
+
+    def __init__(self, usable, reason=None, face_count=0, face_size=None, blur_score=None, quality_score=None,
+                 face_location=None, image=None):
+        self.usable = usable
+        self.reason = reason
+        self.face_count = face_count
+        self.face_size = face_size
+        self.blur_score = blur_score
+        self.quality_score = quality_score
+        self.face_location = face_location
+        self.image = image
+
+    def model_fields(self):
+        """
+        Returns the quality metadata stored on StudentImage.
+        """
+        return {
+            'face_count': self.face_count,
+            'face_size': self.face_size,
+            'blur_score': self.blur_score,
+            'quality_score': self.quality_score,
+        }
+
+
+def assess_image(image_file):
+    """
+    Fast quality check run on upload: HOG face detection on a downsampled copy, a face size check
+    and a Laplacian blur score over the face. Rejects images with no face, several faces, a tiny face
+    or heavy blur before they reach the (CNN based) encoding sweep.
+    The file position is rewound so the file can be saved afterwards.
+    """
+    try:
+        image = ImageOps.exif_transpose(Image.open(image_file)).convert('RGB')
+    except Exception:
+        return ImageQuality(False, reason="File is not a readable image")
+    finally:
+        image_file.seek(0)
+
+    width, height = image.size
+    scale = min(1.0, settings.STUDENT_IMAGE_DETECTION_SIZE / float(max(width, height)))
+    small_image = image.resize((int(width * scale), int(height * scale))) if scale < 1.0 else image
+    small_array = np.asarray(small_image)
+
+    with face_recognition_lock:
+        face_locations = face_recognition.face_locations(small_array, model="hog")
+    face_count = len(face_locations)
+    if face_count == 0:
+        return ImageQuality(False, reason="No face detected", face_count=0)
+    if face_count > 1:
+        return ImageQuality(False, reason=f"Several faces detected ({face_count})", face_count=face_count)
+
+    top, right, bottom, left = face_locations[0]
+    face_size = int(min(bottom - top, right - left) / scale)
+
+    gray_face = cv2.cvtColor(small_array[max(0, top):bottom, max(0, left):right], cv2.COLOR_RGB2GRAY)
+    blur_score = float(cv2.Laplacian(gray_face, cv2.CV_64F).var())
+
+    quality_score = round(
+        min(1.0, blur_score / (3 * settings.STUDENT_IMAGE_MIN_BLUR_SCORE))
+        * min(1.0, face_size / (3.0 * settings.STUDENT_IMAGE_MIN_FACE_SIZE)),
+        4,
+    )
+    face_location = (
+        int(top / scale),
+        min(width, int(right / scale)),
+        min(height, int(bottom / scale)),
+        int(left / scale),
+    )
+    quality = ImageQuality(
+        True,
+        face_count=1,
+        face_size=face_size,
+        blur_score=round(blur_score, 2),
+        quality_score=quality_score,
+        face_location=face_location,
+        image=image,
+    )
+
+    if face_size < settings.STUDENT_IMAGE_MIN_FACE_SIZE:
+        quality.usable = False
+        quality.reason = f"Face is too small ({face_size}px, at least {settings.STUDENT_IMAGE_MIN_FACE_SIZE}px required)"
+    elif blur_score < settings.STUDENT_IMAGE_MIN_BLUR_SCORE:
+        quality.usable = False
+        quality.reason = "Image is too blurry"
+    return quality
@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+
+# Relative to the working directory, like the training images used to be
+ENCODINGS_ROOT = 'encoding'
+
+
+def student_shard(student_id):
+    """
+    Returns the shard directory of a student, so a class directory holds at most
+    STUDENT_IMAGE_STORAGE_SHARDS subdirectories instead of one per student.
+    """
+    return f"{int(student_id) % settings.STUDENT_IMAGE_STORAGE_SHARDS:02x}"
+
+
+def class_media_dir(class_id):
+    """
+    Directory of a class' training images, relative to MEDIA_ROOT: `{class_id}`.
+    """
+    return str(class_id)
+
+
+def student_media_dir(class_id, student_id):
+    """
+    Directory of a student's training images, relative to MEDIA_ROOT: `{class_id}/{shard}/{student_id}`.
+    Only ids are used so renaming a class never moves files.
+    """
+    return os.path.join(class_media_dir(class_id), student_shard(student_id), str(student_id))
+
+
+def class_encodings_dir(class_id):
+    """
+    Directory of a class' encoding pickles: `encoding/{class_id}`.
+    """
+    return os.path.join(ENCODINGS_ROOT, str(class_id))
@@ -2,6 +2,8 @@ from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 from pathlib import Path
+import uuid
+from classroom_absence_management.locks import get_lock
 from detector import FaceRecognitionHandler
 from apps.users.models import User
 from apps.studentimages.models import StudentImage
@@ -23,12 +25,162 @@ def send_notification_to_admins(subject, plain_message, html_message=None):
 
 
 @shared_task
-def encode_new_images_task():
+def notify_admins_task(subject, plain_message, html_message=None):
+    """
+    Sends the notification from the notifications queue, so a slow SMTP server never holds an encoding worker.
+    """
+    send_notification_to_admins(subject, plain_message, html_message)
+
+
+def encoding_lock(class_id):
+    """
+    Lock held while the encodings of a class are rewritten. Its token is the id of the task doing it.
+    """
+    return get_lock(f"encoding:class:{class_id}", settings.ENCODING_LOCK_TIMEOUT)
+
+
+def images_to_encode(section_promo_id=None, student_ids=None):
+    """
+    The images not encoded yet, of every class (or only `section_promo_id`) and every student (or only `student_ids`).
+    """
+    images = StudentImage.objects.filter(is_encoded=False)
+    if section_promo_id is not None:
+        images = images.filter(student__section_promo_id=section_promo_id)
+    if student_ids is not None:
+        images = images.filter(student_id__in=student_ids)
+    return images
+
+
+def follow_up_lock(class_id):
+    """
+    Lock held by the run queued behind the one in flight for a class, until it starts.
+    """
+    return get_lock(f"encoding:class:{class_id}:next", settings.ENCODING_LOCK_TIMEOUT)
+
+
+def _encoding_job(class_id, student_ids):
+    return {'class_id': class_id, 'student_ids': student_ids, 'done': 0, 'total': 0, 'faces': 0}
+
+
+def _run_covers(task_id, student_ids):
+    """
+    True when the run `task_id` is still QUEUED, so it has not read the images to encode yet, and
+    encodes at least the students of `student_ids`.
+    """
+    if task_id is None:
+        return False
+    result = encode_class_images_task.AsyncResult(task_id)
+    if result.state != 'QUEUED' or not isinstance(result.info, dict):
+        return False
+    run_student_ids = result.info.get('student_ids')
+    return run_student_ids is None or (student_ids is not None and set(student_ids) <= set(run_student_ids))
+
+
+def _enqueue_class_encoding(class_id, student_ids, task_id, lock=None):
+    """
+    Enqueues the run `task_id`, recorded as QUEUED with its scope so that other callers can attach to it
+    until it starts. `lock` is the lock taken for the run, given back if it cannot be enqueued.
+    """
+    try:
+        if not encode_class_images_task.app.conf.task_always_eager:
+            encode_class_images_task.backend.store_result(task_id, _encoding_job(class_id, student_ids), 'QUEUED')
+        return encode_class_images_task.apply_async(
+            args=[class_id, student_ids], task_id=task_id, priority=settings.ENCODING_PRIORITY
+        )
+    except Exception:
+        if lock is not None:
+            lock.release(task_id)
+        raise
+
+
+def start_class_encoding(class_id, student_ids=None):
+    """
+    Single-flight entry point to encode the new images of a class (or only of `student_ids`):
+    - without a run in flight for the class, enqueues encode_class_images_task,
+    - when the run in flight has not started yet and encodes at least `student_ids`, returns that run,
+    - otherwise that run may miss the new images: a follow-up run is queued behind it, shared the same
+      way by the callers arriving before it starts.
+    Returns the AsyncResult of the run.
+    """
+    lock = encoding_lock(class_id)
+    next_lock = follow_up_lock(class_id)
+    task_id = str(uuid.uuid4())
+    while True:
+        # Runs are enqueued holding their lock, so a concurrent caller always finds their task id
+        if lock.acquire(task_id, blocking_timeout=0):
+            return _enqueue_class_encoding(class_id, student_ids, task_id, lock)
+        in_flight_task_id = lock.owner()
+        if in_flight_task_id is None:
+            # The in-flight run finished in between, try again
+            continue
+        if _run_covers(in_flight_task_id, student_ids):
+            return encode_class_images_task.AsyncResult(in_flight_task_id)
+
+        if next_lock.acquire(task_id, blocking_timeout=0):
+            return _enqueue_class_encoding(class_id, student_ids, task_id, next_lock)
+        queued_task_id = next_lock.owner()
+        if _run_covers(queued_task_id, student_ids):
+            return encode_class_images_task.AsyncResult(queued_task_id)
+        if queued_task_id is not None:
+            # The queued follow-up encodes other students, queue this one behind it as well
+            return _enqueue_class_encoding(class_id, student_ids, task_id)
+        # The follow-up started in between, try again
+
+
+@shared_task(bind=True)
+def encode_new_images_task(self):
+    return encode_and_notify(lock_token=self.request.id)
+
+
+@shared_task(bind=True)
+def encode_class_images_task(self, class_id, student_ids=None):
+    """
+    Encodes the new images of a single class, or only of some of its students.
+    Enqueue it with start_class_encoding so concurrent requests share one run.
+    Until it starts, the task state is QUEUED with {"class_id", "student_ids", "done", "total", "faces"}
+    as meta, then PROGRESS with the same dict updated. The dict plus a "message" is returned at the end.
+    """
+    job = _encoding_job(class_id, student_ids)
+
+    def report_progress(done, total, faces):
+        job.update(done=done, total=total, faces=faces)
+        if not self.request.is_eager:
+            self.update_state(state='PROGRESS', meta=job)
+
+    lock = encoding_lock(class_id)
+    next_lock = follow_up_lock(class_id)
+    try:
+        # Follow-up runs wait for the run in flight, keeping their place meanwhile
+        while not lock.acquire(self.request.id, blocking_timeout=settings.ENCODING_LOCK_TIMEOUT // 2):
+            next_lock.extend(self.request.id)
+        # Leaving QUEUED before reading the images: callers adding images from now on queue a follow-up
+        report_progress(0, 0, 0)
+        next_lock.release(self.request.id)
+
+        message = encode_and_notify(
+            section_promo_id=class_id, lock_token=self.request.id, student_ids=student_ids, progress=report_progress
+        )
+    finally:
+        # start_class_encoding may have taken the lock for this task before enqueuing it: give it back however
+        # the run ends, including when there was nothing to encode
+        lock.release(self.request.id)
+    return {**job, 'message': message}
+
+
+def encode_and_notify(section_promo_id=None, lock_token=None, student_ids=None, progress=None):
+    """
+    Encodes the new images of every class (or only `section_promo_id`), one class at a time under its
+    encoding lock, renewed after each image. Classes already being encoded by another run are skipped, that
+    run writes their encodings.
+    `student_ids` and `progress` are passed on to FaceRecognitionHandler.encode_known_faces.
+    """
     face_handler = FaceRecognitionHandler()
+    lock_token = lock_token or str(uuid.uuid4())
 
-    images_to_process = StudentImage.objects.filter(is_encoded=False).count()
+    images_to_process = images_to_encode(section_promo_id, student_ids)
+    class_ids = sorted(set(images_to_process.values_list('student__section_promo_id', flat=True)))
 
-    if images_to_process == 0:
+    if not class_ids:
         subject = "Reencoding Skipped - No New Images"
         plain_message = "No new images were found to encode."
         html_message = """
@@ -39,11 +191,29 @@ def encode_new_images_task():
             </body>
         </html>
         """
-        send_notification_to_admins(subject, plain_message, html_message)
+        notify_admins_task.delay(subject, plain_message, html_message)
         return "No new images to encode."
 
     try:
-        encoded_image_ids = face_handler.encode_known_faces()
+        encoded_image_ids = []
+        for class_id in class_ids:
+            lock = encoding_lock(class_id)
+            if not lock.acquire(lock_token, blocking_timeout=0):
+                print(f"Encodings of class {class_id} are already being generated by {lock.owner()}, skipping it")
+                continue
+
+            def heartbeat(done, total, faces, lock=lock):
+                # Keep the lock while images are being encoded, it expires soon after a crashed run
+                lock.extend(lock_token)
+                if progress:
+                    progress(done, total, faces)
+
+            try:
+                encoded_image_ids += face_handler.encode_known_faces(
+                    section_promo_id=class_id, student_ids=student_ids, progress=heartbeat
+                )
+            finally:
+                lock.release(lock_token)
 
         encoded_ids_count = len(encoded_image_ids)
 
@@ -74,7 +244,7 @@ def encode_new_images_task():
 
         subject = "Reencoding Completed Successfully"
 
-        send_notification_to_admins(subject, plain_message, html_message)
+        notify_admins_task.delay(subject, plain_message, html_message)
 
         return "Reencoding completed successfully"
 
@@ -91,7 +261,7 @@ def encode_new_images_task():
         </html>
         """
 
-        send_notification_to_admins(subject, plain_message, html_message)
+        notify_admins_task.delay(subject, plain_message, html_message)
 
         # Re-raise the exception for Celery to handle
         raise
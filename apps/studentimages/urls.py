@@ -1,11 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UploadStudentImagesView
+from .views import AssignGroupPhotoFacesView, BulkEnrollmentView, GroupPhotoView, UploadStudentImagesView
 # Router
 router = DefaultRouter()
 router.register(r'', UploadStudentImagesView, basename="student-images")  # Fix images URL
 
 # URLs
 urlpatterns = [
+    path('bulk-enroll/', BulkEnrollmentView.as_view({'post': 'post'}), name='bulk-enroll'),
+    path('group-photos/', GroupPhotoView.as_view({'post': 'post'}), name='group-photos'),
+    path('group-photos/<int:id>/assign/', AssignGroupPhotoFacesView.as_view({'post': 'post'}), name='group-photo-assign'),
     path('', include(router.urls)),  
 ]
\ No newline at end of file
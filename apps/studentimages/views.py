@@ -1,11 +1,18 @@
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, ViewSet
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from .models import Student, StudentImage
+from apps.classes.models import Class
+from apps.users.permissions import IsAdmin
+from .models import GroupPhoto, Student, StudentImage
 from .serializer import StudentImageSerializer
+from .quality import assess_image
+from .derivatives import build_derivatives
+from .enrollment import EnrollmentImportError, import_enrollment_archive
+from .group_photos import GroupPhotoError, assign_group_photo_faces, detect_group_photo
 import os
 from django.conf import settings
+from django.core.files.storage import default_storage
 # from rest_framework.permissions import AllowAny
 
 
@@ -55,10 +62,33 @@ class UploadStudentImagesView(ModelViewSet):
             if not all([images]):
                 return Response({"error": "Missing required fields:  images"}, status=status.HTTP_400_BAD_REQUEST)
             
-        created_images = []
+        # Reject unusable images now instead of letting the encoding sweep find out hours later
+        qualities = []
+        rejected = []
         for image in images:
-            created_image = StudentImage.objects.create(student=student, image=image)
-            created_images.append(created_image)  
+            quality = assess_image(image)
+            if not quality.usable:
+                rejected.append({"name": image.name, "reason": quality.reason})
+            qualities.append(quality)
+
+        if rejected:
+            return Response(
+                {
+                    "error": f"{rejected[0]['name']}: {rejected[0]['reason']}",
+                    "rejected": rejected,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        created_images = []
+        for image, quality in zip(images, qualities):
+            created_image = StudentImage.objects.create(student=student, image=image, **quality.model_fields())
+            try:
+                build_derivatives(created_image, quality)
+            except Exception as e:
+                # The encoder falls back to the original image
+                print(f"Could not build derivatives for image {created_image.id}: {e}")
+            created_images.append(created_image)
         serializer = StudentImageSerializer(created_images, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -76,3 +106,111 @@ class UploadStudentImagesView(ModelViewSet):
             os.remove(image_path)
 
         return Response({"message": "Image deleted successfully"}, status=status.HTTP_200_OK)
+
+
+
+class BulkEnrollmentView(ViewSet):
+    def get_permissions(self):
+        return [IsAuthenticated(), IsAdmin()]
+
+    def post(self, request):
+        """
+        POST endpoint to enroll a whole class from a ZIP archive of labelled photos.
+        Expects 'archive' (a ZIP laid out as <student_id or email>/<photos>) and 'class_id' in the request body.
+        Unusable photos and unknown folders are skipped and reported, one encoding job is enqueued for the class.
+        """
+        archive = request.FILES.get('archive')
+        class_id = request.data.get('class_id')
+
+        if not all([archive, class_id]):
+            return Response({"error": "Missing required fields: archive, class_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            section_promo = Class.objects.get(id=int(class_id))
+        except (TypeError, ValueError):
+            return Response({"error": "class_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        except Class.DoesNotExist:
+            return Response({"error": "Class not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            summary = import_enrollment_archive(archive, section_promo)
+        except EnrollmentImportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+
+class GroupPhotoView(ViewSet):
+    def get_permissions(self):
+        return [IsAuthenticated(), IsAdmin()]
+
+    def post(self, request):
+        """
+        POST endpoint to upload a class group photo.
+        Expects 'image' and 'class_id' in the request body.
+        Runs a single detection pass and returns the detected faces with their ids and crop URLs,
+        to be assigned to students with the assign endpoint.
+        """
+        image = request.FILES.get('image')
+        class_id = request.data.get('class_id')
+
+        if not all([image, class_id]):
+            return Response({"error": "Missing required fields: image, class_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            section_promo = Class.objects.get(id=class_id)
+        except Class.DoesNotExist:
+            return Response({"error": "Class not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        group_photo = GroupPhoto.objects.create(section_promo=section_promo, image=image)
+        try:
+            faces = detect_group_photo(group_photo)
+        except Exception as e:
+            group_photo.delete()
+            return Response({"error": f"Could not process the group photo: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "id": group_photo.id,
+                "faces": [
+                    {"id": face['id'], "location": face['location'], "crop": default_storage.url(face['crop'])}
+                    for face in faces
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class AssignGroupPhotoFacesView(ViewSet):
+    def get_permissions(self):
+        return [IsAuthenticated(), IsAdmin()]
+
+    def post(self, request, id):
+        """
+        POST endpoint to enroll the faces of a group photo.
+        Expects 'assignments' in the request body: [{"face_id": 0, "student_id": 12}, ...]
+        The assigned faces are embedded in one batch and appended to each student's encodings.
+        """
+        assignments = request.data.get('assignments')
+        if not assignments or not isinstance(assignments, list):
+            return Response({"error": "Missing required field: assignments"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            assignments = {int(item['face_id']): int(item['student_id']) for item in assignments}
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": "Each assignment needs an integer face_id and student_id"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            group_photo = GroupPhoto.objects.select_related('section_promo').get(id=id)
+        except GroupPhoto.DoesNotExist:
+            return Response({"error": "Group photo not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            summary = assign_group_photo_faces(group_photo, assignments)
+        except GroupPhotoError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(summary, status=status.HTTP_201_CREATED)
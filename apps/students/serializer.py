@@ -27,7 +27,11 @@ class StudentSerializer(serializers.ModelSerializer):
         """
         Returns the most recently uploaded image for a student
         """
-        latest_image = obj.images.order_by('-uploaded_at').first()
+        # If the images are already prefetched with the queryset
+        if 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+            latest_image = max(obj.images.all(), key=lambda image: image.uploaded_at, default=None)
+        else:
+            latest_image = obj.images.order_by('-uploaded_at').first()
         if latest_image:
             return StudentImageSerializer(latest_image).data
         return None
@@ -2,7 +2,9 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated ,AllowAny
 from rest_framework import status
+from django.db import transaction
 from django.db.models import Q
+from classroom_absence_management.pagination import PaginationError, paginate_by_offset
 
 from apps.subjects.models import Subject
 from apps.subjects.serializer import SubjectReadSerializer, SubjectReadSerializerLight
@@ -17,9 +19,10 @@ from apps.users.models import User
 from apps.classes.models import Class
 from rest_framework import serializers
 import shutil
+from apps.studentimages.storage import student_media_dir
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from apps.attendance.serializer import AttendanceReadSerializer, AttendanceReadSerializerLight
+from apps.attendance.serializer import AttendanceReadSerializer, AttendanceReadSerializerLight, select_light_relations
 from rest_framework.decorators import action
 # Create your views here.
 class StudentViewSet(ModelViewSet):
@@ -38,6 +41,8 @@ class StudentViewSet(ModelViewSet):
             - limit: The number of items per page (default is 10).
             - search: A search term to filter the results (default is an empty string).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
             - class: The class to filter the results (default is an empty string).
         returns:
             - data: A list of students or a paginated response if paginated is True.
@@ -69,14 +74,11 @@ class StudentViewSet(ModelViewSet):
                 Q(user__email__icontains=search_term)
             )
         
-        # Get the total count AFTER applying filters
-        total_count = queryset.count()
-        
-        # Apply pagination
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = StudentSerializer(queryset, many=True)
         
@@ -85,8 +87,7 @@ class StudentViewSet(ModelViewSet):
             'metadata': {
                 'page': page,
                 'limit': limit,
-                'total': total_count,  # Use filtered count
-                'totalPages': (total_count + limit - 1) // limit,  # Calculate based on filtered count
+                **count_metadata,
                 'class': class_id if class_id else None
             }
         }, status=status.HTTP_200_OK)
@@ -109,8 +110,8 @@ class StudentViewSet(ModelViewSet):
         except Class.DoesNotExist:
             return Response({"error": "Class not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Create folder with user ID inside the section_promo directory
-        folder_path = os.path.join(settings.MEDIA_ROOT, class_instance.name, str(student.id))
+        # Create folder with the student ID inside the section_promo directory
+        folder_path = os.path.join(settings.MEDIA_ROOT, student_media_dir(class_instance.id, student.id))
         os.makedirs(folder_path, exist_ok=True)
         
         return Response(StudentSerializer(student).data, status=status.HTTP_201_CREATED)
@@ -147,13 +148,12 @@ class StudentViewSet(ModelViewSet):
         class_instance = student.section_promo  # Get section_promo (class)
 
         # ✅ Construct folder path
-        folder_path = os.path.join(settings.MEDIA_ROOT, class_instance.name, str(student.id))
+        folder_path = os.path.join(settings.MEDIA_ROOT, student_media_dir(class_instance.id, student.id))
 
-        # ✅ Delete student record
-        student.delete()
-
-        # ✅ Delete user account
-        user.delete()
+        # ✅ Delete the student and the user account together, the attendance rollup is refreshed with them
+        with transaction.atomic():
+            student.delete()
+            user.delete()
 
         # ✅ Remove the student's folder if it exists
         if os.path.exists(folder_path):
@@ -183,6 +183,8 @@ def get_student_attendance(request, id):
         - page: The page number to retrieve (default is 0).
         - limit: The number of items per page (default is 10).
         - paginated: A boolean to indicate whether to paginate the results (default is True).
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists.
     Returns:
         A paginated list of attendance records for the student.
         - data: array of Attendance objects
@@ -203,7 +205,7 @@ def get_student_attendance(request, id):
     except Student.DoesNotExist:
         return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    attendances = student.attendance_records.all().order_by('-date')  # Get all attendance records for the student
+    attendances = select_light_relations(student.attendance_records.all()).order_by('-date')  # Get all attendance records for the student
     
     # Add filters based on query parameters
     subject_id = request.query_params.get('subject_id')
@@ -222,13 +224,11 @@ def get_student_attendance(request, id):
     if status_param:
         attendances = attendances.filter(status=status_param)
     
-    # Get total count after applying filters
-    total_count = attendances.count()
-    
-    if paginated:
-        start = page * limit
-        end = start + limit
-        attendances = attendances[start:end]
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        attendances, count_metadata = paginate_by_offset(request, attendances, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     serializer = AttendanceReadSerializerLight(attendances, many=True)
     return Response({
@@ -236,8 +236,7 @@ def get_student_attendance(request, id):
         "metadata": {
             "page": page,
             "limit": limit,
-            "total": total_count,
-            "totalPages": (total_count + limit - 1) // limit
+            **count_metadata,
         }
     }, status=status.HTTP_200_OK)
 
@@ -253,6 +252,8 @@ def get_student_subjects(request, id):
         - limit: The number of items per page (default is 10).
         - search: A search term to filter the results (default is an empty string).
         - paginated: A boolean to indicate whether to paginate the results (default is True).
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists.
     Returns:
        A paginated list of subjects for the student's class.
        - data: array of Subject objects
@@ -279,12 +280,11 @@ def get_student_subjects(request, id):
     if search:
         queryset = queryset.filter(name__icontains=search)
 
-    total_count = queryset.count()
-    
-    if paginated:
-        start = page * limit
-        end = start + limit
-        queryset = queryset[start:end]
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = SubjectReadSerializerLight(queryset, many=True)
     
@@ -293,7 +293,6 @@ def get_student_subjects(request, id):
         "metadata": {
             "page": page,
             "limit": limit,
-            "total": total_count,
-            "totalPages": (total_count + limit - 1) // limit
+            **count_metadata,
         }
     }, status=status.HTTP_200_OK)
\ No newline at end of file
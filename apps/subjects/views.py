@@ -8,10 +8,58 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 import datetime
-from apps.attendance.models import Attendance
-from apps.attendance.serializer import AttendanceReadSerializer, AttendanceReadSerializerLight
+from apps.attendance.models import Attendance, AttendanceSession
+from apps.attendance.rollup import refresh_subject_owners
+from apps.attendance.serializer import AttendanceReadSerializerLight, select_light_relations
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Q
+from django.db.models import Prefetch, Q
+from apps.classes.models import Class
+from apps.classes.serializer import with_student_count
+from apps.students.models import Student
+from apps.students.serializer import StudentSerializer
+from rest_framework import serializers
+from classroom_absence_management.pagination import (
+    PaginationError,
+    cursor_paginated_response,
+    is_cursor_pagination,
+    paginate_by_offset,
+)
+
+
+def sessions_attendance(sessions):
+    """
+    Formats attendance sessions according to the ClassAttendance interface: the subject details, date,
+    count of present students and list of absent students of each session.
+    The absent students of every session are fetched with one query.
+    """
+    sessions = list(
+        sessions.select_related('subject__teacher__user')
+        .prefetch_related(
+            'subject__teacher__user__groups',
+            'subject__teacher__user__user_permissions',
+            Prefetch('subject__section_promo', queryset=with_student_count(Class.objects.all())),
+        )
+        .order_by('start', 'id')
+    )
+    absent_ids = {student_id for session in sessions for student_id in session.absent_students}
+    students = {
+        student.id: student
+        for student in Student.objects.filter(id__in=absent_ids)
+        .select_related('user')
+        .prefetch_related('user__groups', 'user__user_permissions', 'images')
+    }
+    date_field = serializers.DateTimeField()
+    return [
+        {
+            'subject': SubjectReadSerializer(session.subject).data,
+            'date': date_field.to_representation(session.start),
+            'presentStudents': session.present_count,
+            'absentStudents': StudentSerializer(
+                [students[student_id] for student_id in session.absent_students if student_id in students], many=True
+            ).data,
+        }
+        for session in sessions
+    ]
 
 
 # Create your views here.
@@ -28,6 +76,8 @@ class SubjectViewSet(viewsets.ModelViewSet):
             - teacher_id: Filter by teacher ID.
             - class_id: Filter by class ID.
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
         Returns:
              - data: array of Subject objects
              - metadata: {
@@ -56,12 +106,11 @@ class SubjectViewSet(viewsets.ModelViewSet):
         if class_id:
             queryset = queryset.filter(section_promo__id=class_id)
 
-        total_count = queryset.count()
-
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = SubjectReadSerializerLight(queryset, many=True)
 
@@ -70,9 +119,8 @@ class SubjectViewSet(viewsets.ModelViewSet):
                 'data': serializer.data,
                 'metadata': {
                     'page': page if paginated else 0,
-                    'limit': limit if paginated else total_count,
-                    'total': total_count,
-                    'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                    'limit': limit if paginated else count_metadata['total'],
+                    **count_metadata,
                 },
             },
             status=status.HTTP_200_OK,
@@ -93,6 +141,11 @@ class SubjectViewSet(viewsets.ModelViewSet):
         # For  update, and delete actions, require either admin or teacher permissions
         return [IsAuthenticated(), TeacherObjectOwnerOrAdmin()]  # ✅ Fixed instantiation
 
+    def perform_update(self, serializer):
+        subject = serializer.save()
+        # The attendance rollup stores the class and teacher of the subject
+        refresh_subject_owners([subject.id])
+
     @action(detail=False, methods=['GET'], url_path='attendance-today')
     def get_classes_attendance_today(self, request):
         """
@@ -101,27 +154,9 @@ class SubjectViewSet(viewsets.ModelViewSet):
         """
         today = datetime.date.today()
 
-        # Get all attendance records for today
-        attendance_records = Attendance.objects.filter(date__date=today)
-
-        # Call the serializer to format the records
-        serializer = AttendanceReadSerializer(attendance_records, many=True)
-        # Group by subject
-        attendance_by_subject = {}
-        for record in serializer.data:
-            subject_name = record['subject']['name']
-            if subject_name not in attendance_by_subject:
-                attendance_by_subject[subject_name] = {
-                    'subject': record['subject'],
-                    'date': record['date'],
-                    'presentStudents': 0,
-                    'absentStudents': [],
-                }
-            if record['status'] == 'present':
-                attendance_by_subject[subject_name]['presentStudents'] += 1
-            else:
-                attendance_by_subject[subject_name]['absentStudents'].append(record['student'])
-        results = list(attendance_by_subject.values())
+        # One row per session of today, instead of every attendance record
+        sessions = AttendanceSession.objects.filter(start__date=today)
+        results = sessions_attendance(sessions)
         return Response(results, status=status.HTTP_200_OK)
 
 
@@ -138,26 +173,8 @@ def get_teacher_subjects_attendance_today(request, id):
 
     today = datetime.date.today()
 
-    attendance_records = Attendance.objects.filter(date__date=today, subject__teacher__id=id)
-
-    # Call the serializer to format the records
-    serializer = AttendanceReadSerializer(attendance_records, many=True)
-    # Group by subject
-    attendance_by_subject = {}
-    for record in serializer.data:
-        subject_name = record['subject']['name']
-        if subject_name not in attendance_by_subject:
-            attendance_by_subject[subject_name] = {
-                'subject': record['subject'],
-                'date': record['date'],
-                'presentStudents': 0,
-                'absentStudents': [],
-            }
-        if record['status'] == 'present':
-            attendance_by_subject[subject_name]['presentStudents'] += 1
-        else:
-            attendance_by_subject[subject_name]['absentStudents'].append(record['student'])
-    results = list(attendance_by_subject.values())
+    sessions = AttendanceSession.objects.filter(start__date=today, subject__teacher__id=id)
+    results = sessions_attendance(sessions)
     return Response(results, status=status.HTTP_200_OK)
 
 
@@ -174,6 +191,11 @@ def get_subject_attendance(request, id):
         - date_to: Filter by end date (YYYY-MM-DD HH:mm:ss, time is optional)
         - status: Filter by attendance status (present/absent)
         - paginated: Boolean to indicate whether to paginate results (default is True)
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists
+        - pagination: "cursor" for keyset pagination, newest first, from the `cursor` parameter
+          (metadata: limit and next / previous cursors instead of page, total and totalPages)
+        - cursor: Cursor of the page to retrieve, from the metadata of another page
     Returns:
         - data: array of Attendance objects
         - metadata: {
@@ -197,7 +219,7 @@ def get_subject_attendance(request, id):
     paginated = request.query_params.get('paginated', 'true').lower() == 'true'
 
     # Build base queryset
-    attendance = Attendance.objects.filter(subject=subject)
+    attendance = select_light_relations(Attendance.objects.filter(subject=subject))
 
     # Apply filters
     student_id = request.query_params.get('student_id')
@@ -216,14 +238,17 @@ def get_subject_attendance(request, id):
     if status_filter:
         attendance = attendance.filter(status__iexact=status_filter)
 
-    # Get total count before pagination
-    total_count = attendance.count()
+    if is_cursor_pagination(request):
+        return cursor_paginated_response(request, attendance, AttendanceReadSerializerLight, limit)
 
-    # Apply pagination
-    if paginated:
-        start = page * limit
-        end = start + limit
-        attendance = attendance[start:end]
+    # Stable order for the page slices
+    attendance = attendance.order_by('-date', '-id')
+
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        attendance, count_metadata = paginate_by_offset(request, attendance, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = AttendanceReadSerializerLight(attendance, many=True)
 
@@ -232,9 +257,8 @@ def get_subject_attendance(request, id):
             'data': serializer.data,
             'metadata': {
                 'page': page if paginated else 0,
-                'limit': limit if paginated else total_count,
-                'total': total_count,
-                'totalPages': (total_count + limit - 1) // limit if paginated else 1,
+                'limit': limit if paginated else count_metadata['total'],
+                **count_metadata,
             },
         },
         status=status.HTTP_200_OK,
@@ -14,9 +14,16 @@ from apps.users.models import User
 from rest_framework import serializers
 from apps.subjects.models import Subject
 from apps.attendance.models import Attendance
-from apps.attendance.serializer import  AttendanceReadSerializerLight
+from apps.attendance.rollup import refresh_subject_owners
+from apps.attendance.serializer import  AttendanceReadSerializerLight, select_light_relations
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
+from classroom_absence_management.pagination import (
+    PaginationError,
+    cursor_paginated_response,
+    is_cursor_pagination,
+    paginate_by_offset,
+)
 
 
 # Create your views here.
@@ -37,6 +44,8 @@ class TeacherViewSet(viewsets.ModelViewSet):
             - limit: The number of items per page (default is 10).
             - search: A search term to filter the results (default is an empty string).
             - paginated: A boolean to indicate whether to paginate the results (default is True).
+            - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+              (null total and totalPages); metadata.hasNext tells whether a next page exists.
             - department: The department to filter the results (default is an empty string).
         Returns:
              - data: array of Teacher objects
@@ -67,23 +76,19 @@ class TeacherViewSet(viewsets.ModelViewSet):
                 Q(user__email__icontains=search_term)
             )
         
-        # ✅ Get the total count AFTER applying filters
-        total_count = queryset.count()
-        
-        # Apply pagination
-        if paginated:
-            start = page * limit
-            end = start + limit
-            queryset = queryset[start:end]
+        # metadata.total according to the `count` parameter (exact, estimate or none)
+        try:
+            queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = TeacherSerializer(queryset, many=True)
         
         return Response({
             'data': serializer.data,
             'metadata': {
                 'page': page if paginated else 0,  # If paginated is false, page should be 0
-                'limit': limit if paginated else total_count,  # If paginated is false, limit should be total count
-                'total': total_count,  # ✅ Use filtered count
-                'totalPages': (total_count + limit - 1) // limit if paginated else 1,  # Calculate total pages
+                'limit': limit if paginated else count_metadata['total'],  # If paginated is false, limit should be total count
+                **count_metadata,
                 'department': department if department else None
             }
         }, status=status.HTTP_200_OK)
@@ -118,14 +123,18 @@ class TeacherViewSet(viewsets.ModelViewSet):
         teacher_serializer = self.get_serializer(teacher_instance, data=request.data, partial=True)
         teacher_serializer.is_valid(raise_exception=True)
         teacher = teacher_serializer.save()
+        # The attendance rollup stores the department of the teacher of each subject
+        refresh_subject_owners(teacher.subjects.values_list('id', flat=True))
 
         return Response(TeacherSerializer(teacher).data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         teacher_instance = self.get_object()
         user = teacher_instance.user  # Get the associated user
+        subject_ids = list(teacher_instance.subjects.values_list('id', flat=True))
 
         self.perform_destroy(teacher_instance)  # Delete teacher
+        refresh_subject_owners(subject_ids)
         user.delete()  # Delete the associated user
 
         return Response({"message": "Teacher deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
@@ -193,6 +202,8 @@ def get_teacher_subjects(request ,id):
         - limit: The number of items per page (default is 10).
         - search: A search term to filter the results (default is an empty string).
         - paginated: A boolean to indicate whether to paginate the results (default is True).
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists.
     Returns:
        A paginated list of subjects taught by the teacher.
        - data: array of Subject objects
@@ -219,14 +230,11 @@ def get_teacher_subjects(request ,id):
     if search:
         queryset = queryset.filter(name__icontains=search)
 
-    total_count = queryset.count()
-    if paginated:
-        start = page * limit
-        end = start + limit
-        queryset = queryset[start:end]
-    else:
-        start = 0
-        end = total_count
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     # Here
     serializer = SubjectReadSerializerLight(queryset, many=True)
     return Response({
@@ -234,8 +242,7 @@ def get_teacher_subjects(request ,id):
         "metadata": {
             "page": page,
             "limit": limit,
-            "total": total_count,
-            "totalPages": (total_count + limit - 1) // limit
+            **count_metadata,
         }
     })
 
@@ -256,6 +263,11 @@ def get_teacher_attendance(request , id):
         - page: The page number to retrieve (default is 0).
         - limit: The number of items per page (default is 10).
         - paginated: A boolean to indicate whether to paginate the results (default is True).
+        - count: How metadata.total is computed: exact (default), estimate (planner estimate) or none
+          (null total and totalPages); metadata.hasNext tells whether a next page exists.
+        - pagination: "cursor" for keyset pagination, newest first, from the `cursor` parameter
+          (metadata: limit and next / previous cursors instead of page, total and totalPages).
+        - cursor: Cursor of the page to retrieve, from the metadata of another page.
     Returns:
         A paginated list of attendance records for the teacher.
         - data: array of Attendance objects
@@ -280,7 +292,7 @@ def get_teacher_attendance(request , id):
     except Teacher.DoesNotExist:
         return Response({"error": "User is not a teacher"}, status=status.HTTP_403_FORBIDDEN)
     
-    queryset = Attendance.objects.filter(subject__teacher__id=id).order_by('-date')  # Get all attendance records for the teacher
+    queryset = select_light_relations(Attendance.objects.filter(subject__teacher__id=id)).order_by('-date', '-id')  # Get all attendance records for the teacher
     # Apply filters based on query parameters
     student_id = request.query_params.get('student_id')
     if student_id:
@@ -299,15 +311,14 @@ def get_teacher_attendance(request , id):
     if date_to:
         queryset = queryset.filter(date__lte=date_to)
 
-    # Get total count after applying filters
-    total_count = queryset.count()
-    if paginated:
-        start = page * limit
-        end = start + limit
-        queryset = queryset[start:end]
-    else:
-        start = 0
-        end = total_count
+    if is_cursor_pagination(request):
+        return cursor_paginated_response(request, queryset, AttendanceReadSerializerLight, limit)
+
+    # metadata.total according to the `count` parameter (exact, estimate or none)
+    try:
+        queryset, count_metadata = paginate_by_offset(request, queryset, page, limit, paginated)
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # Serialize the attendance records
     serializer = AttendanceReadSerializerLight(queryset, many=True)
@@ -316,8 +327,7 @@ def get_teacher_attendance(request , id):
         "metadata": {
             "page": page,
             "limit": limit,
-            "total": total_count,
-            "totalPages": (total_count + limit - 1) // limit
+            **count_metadata,
         }
     })
 
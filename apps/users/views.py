@@ -20,6 +20,7 @@ from apps.students.serializer import StudentSerializer
 from apps.classes.models import Class
 from django.conf import settings
 import os
+from apps.studentimages.storage import student_media_dir
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -81,8 +82,8 @@ class SignupView(generics.CreateAPIView):
         except Class.DoesNotExist:
             return Response({"error": "Class not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Create folder with user ID inside the section_promo directory
-        folder_path = os.path.join(settings.MEDIA_ROOT, class_instance.name, str(student.id))
+        # Create folder with the student ID inside the section_promo directory
+        folder_path = os.path.join(settings.MEDIA_ROOT, student_media_dir(class_instance.id, student.id))
         os.makedirs(folder_path, exist_ok=True)
         if user is not None:
             login(request, user)
@@ -2,6 +2,8 @@
 ASGI config for classroom_absence_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are handled by Django, WebSocket connections are routed to the
+consumers listed in ``websocket_routes``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +11,31 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'classroom_absence_management.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+if settings.DEBUG:
+    # Served by runserver before the app ran under uvicorn
+    django_application = ASGIStaticFilesHandler(django_application)
+
+# Imported after Django is set up since consumers use the ORM
+from apps.attendance.streaming import StreamCheckInConsumer  # noqa: E402
+
+websocket_routes = {
+    '/ws/attendances/check-in/': StreamCheckInConsumer,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        consumer_class = websocket_routes.get(scope['path'])
+        if consumer_class is None:
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        return await consumer_class(scope, receive, send).run()
+    return await django_application(scope, receive, send)
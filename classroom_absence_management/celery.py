@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'classroom_absence_management.settings')
@@ -15,3 +16,9 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
+
+# Queue wait times, see classroom_absence_management/metrics.py
+from .metrics import record_queue_wait, stamp_enqueue_time  # noqa: E402
+
+before_task_publish.connect(stamp_enqueue_time)
+task_prerun.connect(record_queue_wait)
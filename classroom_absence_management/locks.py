@@ -0,0 +1,156 @@
+"""
+Named locks shared between the web processes and the Celery workers.
+
+Both implementations identify the holder by a token (e.g. the id of the Celery task doing the work),
+which lets another process find out who holds a lock and attach to that run instead of starting a new one.
+- RedisLock: used in production (LOCK_BACKEND = 'redis').
+- FileLock: for local runs without Redis (LOCK_BACKEND = 'file'), only works between processes of one host.
+Locks expire after `timeout` seconds so a crashed worker cannot hold one forever, a long run keeps its
+lock by calling extend() regularly.
+"""
+import fcntl
+import json
+import os
+import time
+
+import redis
+from django.conf import settings
+
+
+class BaseLock:
+    poll_interval = 0.1
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+
+    def try_acquire(self, token):
+        raise NotImplementedError
+
+    def release(self, token):
+        raise NotImplementedError
+
+    def extend(self, token):
+        """
+        Restarts the `timeout` of the lock if it is still held by `token`. Returns True when it is.
+        """
+        raise NotImplementedError
+
+    def owner(self):
+        raise NotImplementedError
+
+    def acquire(self, token, blocking_timeout=None):
+        """
+        Acquires the lock for `token`, waiting at most `blocking_timeout` seconds (forever when None,
+        not at all when 0). Acquiring a lock already held by the same token succeeds.
+        Returns True when the lock is held by `token`.
+        """
+        deadline = None if blocking_timeout is None else time.monotonic() + blocking_timeout
+        while not self.try_acquire(token):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+
+class RedisLock(BaseLock):
+    # Only delete the key if it still belongs to the caller
+    release_script = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+    # Only restart the expiry if the key still belongs to the caller
+    extend_script = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('expire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    _client = None
+
+    def __init__(self, name, timeout):
+        super().__init__(name, timeout)
+        self.key = f"lock:{name}"
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            cls._client = redis.Redis.from_url(settings.LOCK_REDIS_URL, decode_responses=True)
+        return cls._client
+
+    def try_acquire(self, token):
+        client = self.client()
+        if client.set(self.key, token, nx=True, ex=self.timeout):
+            return True
+        return client.get(self.key) == token
+
+    def release(self, token):
+        self.client().eval(self.release_script, 1, self.key, token)
+
+    def extend(self, token):
+        return bool(self.client().eval(self.extend_script, 1, self.key, token, self.timeout))
+
+    def owner(self):
+        return self.client().get(self.key)
+
+
+class FileLock(BaseLock):
+    """
+    Stores {"token": ..., "expires": ...} in LOCK_FILE_DIR/<name>.lock, read and written under flock.
+    """
+
+    def __init__(self, name, timeout):
+        super().__init__(name, timeout)
+        os.makedirs(settings.LOCK_FILE_DIR, exist_ok=True)
+        self.path = os.path.join(settings.LOCK_FILE_DIR, f"{name.replace(':', '_')}.lock")
+
+    def _update(self, change, refresh_token=None):
+        """
+        Calls change(current_owner) under the file lock and stores the owner it returns. The expiry is
+        only restarted when the owner changes, or when it stays `refresh_token`.
+        """
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                current = state.get('token') if state.get('expires', 0) > time.time() else None
+                new = change(current)
+                if new != current or (new is not None and new == refresh_token):
+                    f.seek(0)
+                    f.truncate()
+                    if new is not None:
+                        json.dump({'token': new, 'expires': time.time() + self.timeout}, f)
+                    f.flush()
+                return new
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self, token):
+        return self._update(lambda current: token if current in (None, token) else current) == token
+
+    def release(self, token):
+        self._update(lambda current: None if current == token else current)
+
+    def extend(self, token):
+        return self._update(lambda current: current, refresh_token=token) == token
+
+    def owner(self):
+        return self._update(lambda current: current)
+
+
+LOCK_BACKENDS = {
+    'redis': RedisLock,
+    'file': FileLock,
+}
+
+
+def get_lock(name, timeout):
+    """
+    Returns the lock called `name` of the configured LOCK_BACKEND.
+    """
+    return LOCK_BACKENDS[settings.LOCK_BACKEND](name, timeout)
@@ -0,0 +1,247 @@
+"""
+Operational metrics kept in Redis, so the web processes and every Celery worker report to the same place.
+- Samples (e.g. queue wait times) are kept as capped lists of the most recent values.
+- Histograms, counters and gauges are exported in the Prometheus text format (see render_prometheus).
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import redis
+from celery import current_app
+from django.conf import settings
+
+_client = None
+_broker_client = None
+
+
+def client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.METRICS_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def broker_client():
+    global _broker_client
+    if _broker_client is None:
+        # Celery lets CELERY_BROKER_URL in the environment override the setting
+        _broker_client = redis.Redis.from_url(current_app.conf.broker_url)
+    return _broker_client
+
+
+def record_sample(name, value):
+    """
+    Records one sample of metric `name`, keeping the METRICS_MAX_SAMPLES most recent ones.
+    """
+    key = f"metrics:samples:{name}"
+    pipeline = client().pipeline()
+    pipeline.lpush(key, value)
+    pipeline.ltrim(key, 0, settings.METRICS_MAX_SAMPLES - 1)
+    pipeline.execute()
+
+
+def _series(name, labels):
+    """
+    Prometheus series identifier: name{label="value",...}
+    """
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+def observe(name, value, labels=None, pipeline=None):
+    """
+    Adds one observation to the histogram `name` (buckets from METRICS_HISTOGRAM_BUCKETS).
+    """
+    series = _series(name, labels)
+    run = pipeline is None
+    pipeline = pipeline or client().pipeline()
+    key = f"metrics:histogram:{series}"
+    for bound in settings.METRICS_HISTOGRAM_BUCKETS:
+        if value <= bound:
+            pipeline.hincrby(key, str(bound), 1)
+    pipeline.hincrby(key, 'count', 1)
+    pipeline.hincrbyfloat(key, 'sum', value)
+    pipeline.sadd('metrics:histograms', series)
+    if run:
+        pipeline.execute()
+
+
+def increment(name, value=1, labels=None, pipeline=None):
+    (pipeline or client()).hincrbyfloat('metrics:counters', _series(name, labels), value)
+
+
+def set_gauge(name, value, labels=None, pipeline=None):
+    (pipeline or client()).hset('metrics:gauges', _series(name, labels), value)
+
+
+def render_prometheus():
+    """
+    Returns every histogram, counter and gauge in the Prometheus text exposition format.
+    """
+    redis_client = client()
+    lines = []
+    typed = set()
+
+    def declare(series, metric_type):
+        name = series.split('{')[0]
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    def with_suffix(series, suffix, le=None):
+        name, _, labels = series.partition('{')
+        labels = labels.rstrip('}')
+        if le is not None:
+            labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+        return f"{name}{suffix}{{{labels}}}" if labels else f"{name}{suffix}"
+
+    for series in sorted(redis_client.smembers('metrics:histograms')):
+        histogram = redis_client.hgetall(f"metrics:histogram:{series}")
+        declare(series, 'histogram')
+        for bound in settings.METRICS_HISTOGRAM_BUCKETS:
+            lines.append(f"{with_suffix(series, '_bucket', bound)} {histogram.get(str(bound), 0)}")
+        lines.append(f"{with_suffix(series, '_bucket', '+Inf')} {histogram.get('count', 0)}")
+        lines.append(f"{with_suffix(series, '_sum')} {histogram.get('sum', 0)}")
+        lines.append(f"{with_suffix(series, '_count')} {histogram.get('count', 0)}")
+
+    for metric_type, key in (('counter', 'metrics:counters'), ('gauge', 'metrics:gauges')):
+        for series, value in sorted(redis_client.hgetall(key).items()):
+            declare(series, metric_type)
+            lines.append(f"{series} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Collects the duration of each stage of a recognition (decode, detect, encode, gallery_load, match, ...)
+    along with counters (faces, matches) and gauges (gallery size).
+    - durations / counters hold the totals since the timer was created, e.g. for a Server-Timing header.
+    - publish() exports what was collected since the previous publish() to the shared metrics, unless the
+      timer was created with export=False (e.g. benchmarks, which must not pollute the production metrics).
+    """
+
+    def __init__(self, export=True):
+        self.export = export
+        self.durations = defaultdict(float)
+        self.counters = Counter()
+        self.gauges = {}
+        self._pending_durations = []
+        self._pending_counters = Counter()
+
+    @contextmanager
+    def stage(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self.durations[name] += elapsed
+            self._pending_durations.append((name, elapsed))
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+        self._pending_counters[name] += value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def server_timing(self):
+        """
+        Value of a Server-Timing header with the total duration of each stage, in milliseconds.
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items())
+
+    def publish(self, operation):
+        """
+        Exports the pending stage durations as the recognition_stage_seconds histogram, the counters as
+        recognition_<name>_total and the gauges as recognition_<name>, all labelled with `operation`.
+        """
+        pending_durations, self._pending_durations = self._pending_durations, []
+        pending_counters, self._pending_counters = self._pending_counters, Counter()
+        if not self.export:
+            return
+        try:
+            pipeline = client().pipeline()
+            for name, seconds in pending_durations:
+                observe('recognition_stage_seconds', seconds, {'operation': operation, 'stage': name}, pipeline)
+            for name, value in pending_counters.items():
+                increment(f"recognition_{name}_total", value, {'operation': operation}, pipeline)
+            for name, value in self.gauges.items():
+                set_gauge(f"recognition_{name}", value, {'operation': operation}, pipeline)
+            pipeline.execute()
+        except redis.RedisError as e:
+            print(f"Could not publish the {operation} timings: {e}")
+
+
+def get_samples(name):
+    return [float(value) for value in client().lrange(f"metrics:samples:{name}", 0, -1)]
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of values, None when empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values))) - 1))
+    return values[rank]
+
+
+def summarize(values):
+    return {
+        "samples": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else None,
+    }
+
+
+def queue_depth(queue):
+    """
+    Number of messages waiting in a Celery queue of the Redis broker. With priorities enabled kombu
+    keeps one list per priority step, named `<queue><sep><priority>` (plain `<queue>` for priority 0).
+    """
+    transport_options = settings.CELERY_BROKER_TRANSPORT_OPTIONS
+    sep = transport_options.get('sep', '\x06\x16')
+    keys = [queue] + [f"{queue}{sep}{step}" for step in transport_options.get('priority_steps', []) if step]
+    pipeline = broker_client().pipeline()
+    for key in keys:
+        pipeline.llen(key)
+    return sum(pipeline.execute())
+
+
+def queue_stats():
+    """
+    Depth and recent wait times (seconds between publish and start) of every Celery queue.
+    """
+    return {
+        queue.name: {"depth": queue_depth(queue.name), "wait": summarize(get_samples(f"queue_wait:{queue.name}"))}
+        for queue in settings.CELERY_TASK_QUEUES
+    }
+
+
+def stamp_enqueue_time(headers=None, **kwargs):
+    """
+    before_task_publish handler: stores the publish time in the message headers.
+    """
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+
+
+def record_queue_wait(task=None, **kwargs):
+    """
+    task_prerun handler: records how long the task waited in its queue.
+    """
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    delivery_info = task.request.delivery_info or {}
+    queue = delivery_info.get('routing_key')
+    if enqueued_at is None or not queue:
+        return
+    try:
+        record_sample(f"queue_wait:{queue}", round(time.time() - enqueued_at, 3))
+    except redis.RedisError as e:
+        print(f"Could not record the queue wait of {task.name}: {e}")
@@ -0,0 +1,214 @@
+"""
+Pagination helpers of the list endpoints.
+
+Page / limit (offset) pagination takes a `count` parameter choosing how `metadata.total` is computed:
+- exact (default): COUNT(*), cached LIST_COUNT_CACHE_TIMEOUT seconds per query signature,
+- estimate: the row estimate of the database planner (EXPLAIN), exact when the last page is reached,
+  falling back to exact on databases without estimates (SQLite),
+- none: no total, only whether a next page exists.
+The last two read limit + 1 rows to know whether a next page exists.
+
+Keyset (cursor) pagination is opt-in with `?pagination=cursor`. Pages are ordered by (date, id), newest
+first, and each page is fetched with a WHERE on the last (date, id) seen instead of an OFFSET, so it costs
+the same whatever its depth as long as an index starts with the filtered columns followed by date. No
+COUNT(*) is run: the client follows the opaque `next` / `previous` cursors of the metadata until they are
+null.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.response import Response
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+class PaginationError(ValueError):
+    pass
+
+
+class CursorError(PaginationError):
+    pass
+
+
+def _sql(queryset):
+    return queryset.query.get_compiler(using=queryset.db).as_sql()
+
+
+def exact_count(queryset):
+    """
+    COUNT(*) of the queryset, cached briefly per SQL and parameters.
+    """
+    try:
+        sql, params = _sql(queryset)
+    except EmptyResultSet:
+        return 0
+    key = 'list-count:' + hashlib.sha1(repr((queryset.db, sql, params)).encode()).hexdigest()
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, timeout=settings.LIST_COUNT_CACHE_TIMEOUT)
+    return total
+
+
+def estimate_count(queryset):
+    """
+    Number of rows of the queryset estimated by the planner, or None when the database does not
+    provide estimates.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor not in ('postgresql', 'mysql'):
+        return None
+    try:
+        sql, params = _sql(queryset.order_by())
+    except EmptyResultSet:
+        return 0
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+        # MySQL: rows produced by the nested loop join, one EXPLAIN row per table
+        cursor.execute(f"EXPLAIN {sql}", params)
+        columns = [column[0] for column in cursor.description]
+        estimate = 1.0
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            estimate *= (row.get('rows') or 0) * float(row.get('filtered') or 100) / 100
+        return int(estimate)
+
+
+def paginate_by_offset(request, queryset, page, limit, paginated):
+    """
+    Returns the records of the page (all of them when not paginated) and the count metadata of the
+    response, according to the `count` parameter:
+        - total: number (estimated with count=estimate, null with count=none),
+        - totalPages: number or null,
+        - hasNext: boolean,
+        - count: the count mode used.
+    Raises PaginationError for an unknown count mode.
+    """
+    mode = request.query_params.get('count', 'exact')
+    if mode not in COUNT_MODES:
+        raise PaginationError(f"count must be one of {', '.join(COUNT_MODES)}")
+
+    if not paginated:
+        records = list(queryset)
+        return records, {'total': len(records), 'totalPages': 1, 'hasNext': False, 'count': 'exact'}
+
+    start = page * limit
+    if mode == 'exact':
+        total = exact_count(queryset)
+        records = list(queryset[start : start + limit])
+        has_next = start + limit < total
+    else:
+        records = list(queryset[start : start + limit + 1])
+        has_next = len(records) > limit
+        records = records[:limit]
+        total = None
+        if mode == 'estimate' and not has_next and (records or page == 0):
+            # Last page: the total is known
+            total, mode = start + len(records), 'exact'
+        elif mode == 'estimate':
+            total = estimate_count(queryset)
+            if total is None:
+                total, mode = exact_count(queryset), 'exact'
+            else:
+                # The estimate cannot be below the records already seen
+                total = max(total, start + len(records) + int(has_next))
+
+    return records, {
+        'total': total,
+        'totalPages': (total + limit - 1) // limit if total is not None else None,
+        'hasNext': has_next,
+        'count': mode,
+    }
+
+
+def is_cursor_pagination(request):
+    return request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params
+
+
+def encode_cursor(record, reverse):
+    """
+    Opaque cursor pointing after `record`, towards older records (or newer ones when reverse).
+    """
+    position = {'d': record.date.isoformat(), 'i': record.id, 'r': reverse}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (date, id, reverse) position of a cursor made by encode_cursor.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.datetime.fromisoformat(position['d']), int(position['i']), bool(position['r'])
+    except (ValueError, TypeError, KeyError):
+        raise CursorError("Invalid cursor")
+
+
+def paginate_by_cursor(queryset, cursor, limit):
+    """
+    Returns the page of `queryset` following `cursor` (the first page when None), newest first, with the
+    cursors of the next and previous pages (None on the last / first page).
+    Reads limit + 1 rows to know whether another page follows.
+    """
+    if limit < 1:
+        raise CursorError("limit must be a positive integer")
+
+    reverse = False
+    if cursor:
+        date, record_id, reverse = decode_cursor(cursor)
+        if reverse:
+            queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=record_id))
+        else:
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=record_id))
+    ordering = ('date', 'id') if reverse else ('-date', '-id')
+
+    records = list(queryset.order_by(*ordering)[: limit + 1])
+    has_more = len(records) > limit
+    records = records[:limit]
+    if reverse:
+        records.reverse()
+
+    # Coming from a page means there is one in that direction
+    has_next = bool(cursor) if reverse else has_more
+    has_previous = has_more if reverse else bool(cursor)
+    next_cursor = encode_cursor(records[-1], reverse=False) if has_next and records else None
+    previous_cursor = encode_cursor(records[0], reverse=True) if has_previous and records else None
+    return records, next_cursor, previous_cursor
+
+
+def cursor_paginated_response(request, queryset, serializer_class, limit):
+    """
+    Response of a cursor paginated list endpoint:
+        - data: array of serialized records
+        - metadata: {limit: number, next: cursor or null, previous: cursor or null}
+    """
+    try:
+        records, next_cursor, previous_cursor = paginate_by_cursor(
+            queryset, request.query_params.get('cursor'), limit
+        )
+    except CursorError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = serializer_class(records, many=True)
+    return Response(
+        {
+            'data': serializer.data,
+            'metadata': {'limit': limit, 'next': next_cursor, 'previous': previous_cursor},
+        },
+        status=status.HTTP_200_OK,
+    )
@@ -13,8 +13,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import environ
 import os
+import tempfile
 from datetime import timedelta
 from celery.schedules import crontab
+from kombu import Queue
 
 # Load environment variables from .env file
 env = environ.Env()
@@ -35,14 +37,112 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Queues: admin emails must never wait behind a batch encoding sweep. Recognition runs in the web
+# process, so it has no queue. Tasks that are not routed go to the default 'notifications' queue.
+CELERY_TASK_QUEUES = (Queue('encoding'), Queue('notifications'))
+CELERY_TASK_DEFAULT_QUEUE = 'notifications'
+CELERY_TASK_ROUTES = {
+    'apps.studentimages.tasks.encode_*': {'queue': 'encoding'},
+    'apps.studentimages.tasks.notify_*': {'queue': 'notifications'},
+}
+# Lower is more urgent with the Redis broker
+CELERY_BROKER_TRANSPORT_OPTIONS = {'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+# Workers only reserve the task they are about to run, so a queued urgent task is never stuck behind prefetched ones
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Celery Beat Configuration
 CELERY_BEAT_SCHEDULE = {
     'encode-missing-faces-every-saturday': {
         'task': 'apps.studentimages.tasks.encode_new_images_task',
         'schedule': crontab(hour=23, minute=59, day_of_week=6),  # Every Saturday at 11:59 PM
+        'options': {'priority': 9},  # Behind any encoding requested by an admin
     },
 }
 
+# Locks shared by the web processes and the workers (see classroom_absence_management/locks.py)
+LOCK_BACKEND = env.str('LOCK_BACKEND', default='redis')  # 'redis', or 'file' for local runs without Redis
+LOCK_REDIS_URL = env.str('LOCK_REDIS_URL', default=CELERY_BROKER_URL)
+LOCK_FILE_DIR = env.str('LOCK_FILE_DIR', default=os.path.join(tempfile.gettempdir(), 'classroom_absence_management_locks'))
+ENCODING_PRIORITY = env.int('ENCODING_PRIORITY', default=3)  # Broker priority of the encodings requested by admins
+ENCODING_LOCK_TIMEOUT = env.int('ENCODING_LOCK_TIMEOUT', default=10 * 60)  # Seconds, renewed after each encoded image
+ENCODING_LOCK_WAIT = env.int('ENCODING_LOCK_WAIT', default=30)  # Seconds a request waits for a running encoding before giving up
+
+# Metrics (see classroom_absence_management/metrics.py)
+METRICS_REDIS_URL = env.str('METRICS_REDIS_URL', default=CELERY_BROKER_URL)
+METRICS_MAX_SAMPLES = env.int('METRICS_MAX_SAMPLES', default=1000)  # Most recent samples kept per metric
+METRICS_HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')  # /api/metrics/ requires 'Authorization: Bearer <token>', or an admin session when empty
+
+# Cache, used for the attendance dashboards (see apps/attendance/dashboard_cache.py) and the list counts
+CACHE_REDIS_URL = env.str('CACHE_REDIS_URL', default='')  # Local memory cache when empty (tests, local runs)
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_REDIS_URL}
+        if CACHE_REDIS_URL
+        else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    ),
+}
+DASHBOARD_CACHE_TIMEOUT = env.int('DASHBOARD_CACHE_TIMEOUT', default=300)  # Seconds an entry is kept at most
+DASHBOARD_CACHE_MAX_DAYS = env.int('DASHBOARD_CACHE_MAX_DAYS', default=62)  # Longer windows are invalidated by any write of their scope
+DASHBOARD_CACHE_WAIT = env.float('DASHBOARD_CACHE_WAIT', default=5.0)  # Seconds a viewer waits for a concurrent computation
+LIST_COUNT_CACHE_TIMEOUT = env.int('LIST_COUNT_CACHE_TIMEOUT', default=30)  # Seconds an exact list total (?count=exact) is reused
+
+# Upload-time quality gate for student images
+STUDENT_IMAGE_DETECTION_SIZE = env.int('STUDENT_IMAGE_DETECTION_SIZE', default=480)  # Longest side used for the HOG detection
+STUDENT_IMAGE_MIN_FACE_SIZE = env.int('STUDENT_IMAGE_MIN_FACE_SIZE', default=80)  # Pixels, in the original image
+STUDENT_IMAGE_MIN_BLUR_SCORE = env.float('STUDENT_IMAGE_MIN_BLUR_SCORE', default=40.0)  # Variance of the Laplacian
+
+# Derivatives written at upload time and read by the encoder
+STUDENT_IMAGE_WORKING_SIZE = env.int('STUDENT_IMAGE_WORKING_SIZE', default=1024)  # Longest side of the working copy
+STUDENT_IMAGE_WORKING_QUALITY = env.int('STUDENT_IMAGE_WORKING_QUALITY', default=85)  # JPEG quality of the derivatives
+STUDENT_IMAGE_FACE_CROP_SIZE = env.int('STUDENT_IMAGE_FACE_CROP_SIZE', default=300)
+STUDENT_IMAGE_FACE_CROP_MARGIN = env.float('STUDENT_IMAGE_FACE_CROP_MARGIN', default=1.8)  # Crop side / face box side
+
+# Training images are stored under MEDIA_ROOT/<class_id>/<shard>/<student_id>/
+STUDENT_IMAGE_STORAGE_SHARDS = env.int('STUDENT_IMAGE_STORAGE_SHARDS', default=256)  # Changing it requires migrate_storage_layout
+
+# Bulk enrollment import
+STUDENT_IMAGE_IMPORT_WORKERS = env.int('STUDENT_IMAGE_IMPORT_WORKERS', default=4)
+STUDENT_IMAGE_IMPORT_MAX_FILE_SIZE = env.int('STUDENT_IMAGE_IMPORT_MAX_FILE_SIZE', default=20 * 1024 * 1024)  # Bytes per photo
+
+# Group photo enrollment
+GROUP_PHOTO_DETECTION_MODEL = env.str('GROUP_PHOTO_DETECTION_MODEL', default='hog')  # 'hog' or 'cnn'
+GROUP_PHOTO_UPSAMPLE = env.int('GROUP_PHOTO_UPSAMPLE', default=1)  # Upsampling passes, to find the smaller faces at the back
+
+# Recognition concurrency limit, per node (see apps/attendance/limiter.py)
+RECOGNITION_SLOTS = env.int('RECOGNITION_SLOTS', default=2)  # Recognitions running at once
+RECOGNITION_QUEUE_SIZE = env.int('RECOGNITION_QUEUE_SIZE', default=8)  # Requests allowed to wait for a slot
+RECOGNITION_MAX_WAIT = env.float('RECOGNITION_MAX_WAIT', default=10.0)  # Seconds before a waiting request gets a 429
+RECOGNITION_DEFAULT_SECONDS = env.float('RECOGNITION_DEFAULT_SECONDS', default=5.0)  # Used for wait estimates until latencies are recorded
+
+# Video attendance ingestion
+FACE_VIDEO_MAX_DURATION = env.int('FACE_VIDEO_MAX_DURATION', default=60)  # Seconds
+FACE_VIDEO_SAMPLE_FPS = env.float('FACE_VIDEO_SAMPLE_FPS', default=5.0)  # Upper bound on sampled frames per second
+FACE_VIDEO_CPU_BUDGET = env.float('FACE_VIDEO_CPU_BUDGET', default=1.0)  # CPU seconds allowed per second of video
+FACE_VIDEO_DETECTION_WIDTH = env.int('FACE_VIDEO_DETECTION_WIDTH', default=640)  # Frames are downscaled to this width for detection
+FACE_VIDEO_MAX_EMBEDDINGS_PER_TRACK = env.int('FACE_VIDEO_MAX_EMBEDDINGS_PER_TRACK', default=2)
+FACE_VIDEO_MIN_VOTES = env.int('FACE_VIDEO_MIN_VOTES', default=1)
+
+# Kiosk check-in
+FACE_KIOSK_MAX_SIZE = env.int('FACE_KIOSK_MAX_SIZE', default=400)  # Face crops are decoded/downscaled to this size
+
+# Streaming (WebSocket) check-in
+FACE_STREAM_MAX_MISSED_FRAMES = env.int('FACE_STREAM_MAX_MISSED_FRAMES', default=5)
+FACE_STREAM_MAX_EMBEDDINGS_PER_TRACK = env.int('FACE_STREAM_MAX_EMBEDDINGS_PER_TRACK', default=4)
+FACE_STREAM_QUALITY_GROWTH = env.float('FACE_STREAM_QUALITY_GROWTH', default=1.25)  # Re-embed a track when its face grows by this factor
+FACE_STREAM_ALLOWED_ORIGINS = env.list('FACE_STREAM_ALLOWED_ORIGINS', default=[])  # e.g. https://app.example.com, besides the ALLOWED_HOSTS origins
+
+# Attendance dashboards: hour ranges of the weekly heatmap, [start, end) hours in TIME_ZONE
+ATTENDANCE_HEATMAP_HOUR_RANGES = [
+    {"start": 8, "end": 10, "label": "8:00 - 10:00"},
+    {"start": 10, "end": 12, "label": "10:00 - 12:00"},
+    {"start": 12, "end": 14, "label": "12:00 - 14:00 (Break)"},
+    {"start": 14, "end": 16, "label": "14:00 - 16:00"},
+    {"start": 16, "end": 18, "label": "16:00 - 18:00"},
+]
+ANALYTICS_MAX_ROWS = env.int('ANALYTICS_MAX_ROWS', default=5000)  # Rows returned by /api/attendances/analytics/
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  # Use SMTP for real emails
 EMAIL_HOST = 'smtp.gmail.com'  # Example: Gmail SMTP server
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path , include
 from django.conf import settings
 from django.conf.urls.static import static
+from .views import get_queue_metrics, prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +30,8 @@ urlpatterns = [
     path('api/classes/', include('apps.classes.urls')),
     path('api/departments/', include('apps.departments.urls')),
     path('api/images/', include('apps.studentimages.urls')),
+    path('api/metrics/', prometheus_metrics, name='prometheus-metrics'),
+    path('api/metrics/queues/', get_queue_metrics, name='queue-metrics'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
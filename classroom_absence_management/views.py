@@ -0,0 +1,44 @@
+import hmac
+
+import redis
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from apps.users.permissions import IsAdmin
+from .metrics import queue_stats, render_prometheus
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def get_queue_metrics(request):
+    """
+    Returns the depth and the recent wait times (p50 / p95 / max, in seconds) of every Celery queue.
+    """
+    try:
+        return Response(queue_stats(), status=status.HTTP_200_OK)
+    except redis.RedisError as e:
+        return Response({"error": f"Metrics are unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint: recognition stage histograms, counters and gauges.
+    When METRICS_TOKEN is set, the scraper must send it as a bearer token. Without a token, only a
+    logged-in admin can read it: the metrics are never served openly.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse("Unauthorized\n", status=401, content_type='text/plain')
+    elif not (request.user.is_authenticated and request.user.role == 'admin'):
+        return HttpResponse(
+            "Unauthorized: set METRICS_TOKEN to scrape this endpoint\n", status=401, content_type='text/plain'
+        )
+    try:
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except redis.RedisError as e:
+        return HttpResponse(f"Metrics are unavailable: {e}\n", status=503, content_type='text/plain')
@@ -1,13 +1,27 @@
 from pathlib import Path
 import os
+import math
 import pickle
+import tempfile
+import threading
+import time
 from collections import Counter
 from scipy.spatial.distance import euclidean
+import cv2
+import numpy as np
 import face_recognition
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.db.models import F
+from tracker import IoUTracker
+from classroom_absence_management.metrics import StageTimer
+from apps.classes.models import Class
 from apps.students.models import Student
 from apps.studentimages.models import StudentImage
+from apps.studentimages.quality import face_recognition_lock
+from apps.studentimages.storage import ENCODINGS_ROOT
 
-DEFAULT_ENCODINGS_PATH = Path("encoding")
+DEFAULT_ENCODINGS_PATH = Path(ENCODINGS_ROOT)
 DEFAULT_TRAINING_PATH = Path('training')
 DEFAULT_VALIDATION_PATH = Path('validation')
 
@@ -15,6 +29,11 @@ DEFAULT_TRAINING_PATH.mkdir(exist_ok=True)
 DEFAULT_ENCODINGS_PATH.mkdir(exist_ok=True)
 DEFAULT_VALIDATION_PATH.mkdir(exist_ok=True)
 
+# Per-process cache of class galleries: encodings directory -> (gallery version, labels, matrix).
+# Kept warm between requests so a check-in does not reload every pickle of the class.
+_class_galleries = {}
+_class_galleries_lock = threading.Lock()
+
 
 class imageException(Exception):
     def __init__(self, errorImage) -> None:
@@ -25,6 +44,9 @@ class FaceRecognitionHandler:
     def __init__(self, encodings_location=DEFAULT_ENCODINGS_PATH):
         self.encodings_location = encodings_location
         self.model = "CNN"
+        self.tolerance = 0.6
+        # Per-stage durations and counters of the recognitions run by this handler
+        self.timer = StageTimer()
 
     def __recognize_face(self, unknown_encoding, reference_encoding):
         boolean_matches = face_recognition.compare_faces(reference_encoding['encodings'], unknown_encoding)
@@ -35,10 +57,36 @@ class FaceRecognitionHandler:
             return name[:ele_len]
 
     def __save_encodings(self, relative_path, filename, name_encodings):
+        """
+        Writes the pickle to a temporary file of the same directory, fsyncs it and renames it over the
+        old one, so a concurrent reader sees either the previous or the new gallery, never a partial file.
+        """
         if not filename:
             return
-        with Path(relative_path).joinpath(f"{filename}.pkl").open(mode="wb") as f:
-            pickle.dump(name_encodings, f)
+        fd, temp_path = tempfile.mkstemp(dir=relative_path, prefix=f".{filename}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as f:
+                pickle.dump(name_encodings, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, Path(relative_path).joinpath(f"{filename}.pkl"))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def gallery_version(self, the_classe):
+        """
+        Returns the gallery version of a class, or None if the class does not exist.
+        """
+        return Class.objects.filter(id=the_classe).values_list('gallery_version', flat=True).first()
+
+    def bump_gallery_version(self, the_classe):
+        """
+        Increments the gallery version of a class once its encoding files were rewritten,
+        so every process drops its cached copy on the next request.
+        """
+        Class.objects.filter(id=the_classe).update(gallery_version=F('gallery_version') + 1)
 
     def __handle_encodings(self, relative_path, filename, show_file_error=True):
         old_encodings = self.__load_encoded_faces(relative_path, filename, show_file_error == True)
@@ -56,28 +104,148 @@ class FaceRecognitionHandler:
             return {'names': [], 'encodings': []}
         return loaded_encodings
 
+    def __load_class_gallery(self, the_classe):
+        """
+        Loads every student encoding of a class into a single matrix so one face can be matched
+        against the whole class with one vectorized distance computation.
+        Returns (labels, matrix) where labels[i] is the student id owning matrix[i].
+        """
+        relative_path = os.path.join(self.encodings_location, str(the_classe))
+        labels, encodings = [], []
+        for encoding_file in Path(relative_path).glob('*_encodings.pkl'):
+            student_id = encoding_file.stem.replace('_encodings', '')
+            loaded_encodings = self.__load_encoded_faces(relative_path, encoding_file.stem)
+            for encoding in loaded_encodings['encodings']:
+                labels.append(student_id)
+                encodings.append(encoding)
+        matrix = np.asarray(encodings, dtype=np.float64).reshape(len(encodings), 128)
+        return labels, matrix
+
+    def get_class_gallery(self, the_classe):
+        """
+        Returns the (labels, matrix) gallery of a class from the process cache.
+        The cache entry is reused as long as the gallery version of the class did not change, which
+        costs one small query per request instead of one unpickle per student. Galleries of unknown
+        classes are not cached.
+        """
+        relative_path = Path(self.encodings_location, str(the_classe))
+        cache_key = str(relative_path)
+        # Read the version before the files: a gallery rewritten while loading is reloaded next time
+        version = self.gallery_version(the_classe)
+
+        cached = _class_galleries.get(cache_key)
+        if cached and version is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        with _class_galleries_lock:
+            labels, matrix = self.__load_class_gallery(the_classe)
+            if version is not None:
+                _class_galleries[cache_key] = (version, labels, matrix)
+        return labels, matrix
+
+    def __match_encoding(self, unknown_encoding, labels, matrix):
+        """
+        Returns (student id, distance) of the closest encoding, with a None student id when it is not
+        within the tolerance, or (None, None) for an empty gallery.
+        """
+        if not labels:
+            return None, None
+        distances = np.linalg.norm(matrix - unknown_encoding, axis=1)
+        best = int(np.argmin(distances))
+        distance = float(distances[best])
+        if distance <= self.tolerance:
+            return labels[best], distance
+        return None, distance
+
     def __is_new_encoding(self, unique_encodings, new_encoding, threshold=0.5):
         for old_encoding in unique_encodings:
             if euclidean(old_encoding, new_encoding) < threshold:
                 return False
         return True
 
-    def encode_known_faces(self):
+    def __encode_student_image(self, student_image):
+        """
+        Returns the face encodings of a training image, reading the smallest file available:
+        - the aligned face crop: a HOG detection on a 300px image is enough, and if it misses the whole
+          crop is used as the face location,
+        - the working copy: full detection on a size-capped image,
+        - the original upload (images uploaded before derivatives existed).
+        """
+        if student_image.face_image and os.path.exists(student_image.face_image.path):
+            image = face_recognition.load_image_file(student_image.face_image.path)
+            with face_recognition_lock:
+                face_locations = face_recognition.face_locations(image, model="hog")
+                if not face_locations:
+                    height, width = image.shape[:2]
+                    face_locations = [(0, width, height, 0)]
+                return face_recognition.face_encodings(image, face_locations[:1])
+
+        if student_image.working_image and os.path.exists(student_image.working_image.path):
+            image_path = student_image.working_image.path
+        else:
+            image_path = student_image.image.path
+        image = face_recognition.load_image_file(image_path)
+
+        # Detect face locations and generate encodings
+        with face_recognition_lock:
+            face_locations = face_recognition.face_locations(image, model=self.model)
+            return face_recognition.face_encodings(image, face_locations)
+
+    def append_encodings(self, the_classe, student_id, encodings):
+        """
+        Appends already computed encodings to a student's gallery, skipping near duplicates.
+        Returns the number of encodings added.
+        """
+        relative_path = os.path.join(self.encodings_location, str(the_classe))
+        os.makedirs(relative_path, exist_ok=True)
+        filename = f"{student_id}_encodings"
+
+        face_encodings_old = self.__handle_encodings(relative_path, filename, show_file_error=False)
+        added = 0
+        for encoding in encodings:
+            if self.__is_new_encoding(face_encodings_old['encodings'], encoding):
+                face_encodings_old['encodings'].append(encoding)
+                added += 1
+
+        if added:
+            name_encodings = {"names": [filename], "encodings": face_encodings_old['encodings']}
+            self.__save_encodings(relative_path, filename, name_encodings)
+            self.bump_gallery_version(the_classe)
+        return added
+
+    def encode_known_faces(self, section_promo_id=None, student_ids=None, progress=None):
         """
         Encodes faces from new images (is_encoded=False) in the StudentImage model and saves them in the structure:
-        encoding/class_name/student_id_encodings.pkl. Uses the Django StudentImage model to track processed images.
+        encoding/class_id/student_id_encodings.pkl. Uses the Django StudentImage model to track processed images.
+        Args:
+            section_promo_id: Only encode the students of this class (all classes when None).
+            student_ids: Only encode these students (all students when None).
+            progress: Optional callable, called as progress(images_done, images_total, faces_found)
+                before the first image and after each image.
         """
         # Find students with at least one unencoded image
-        students_with_new_images = Student.objects.filter(images__is_encoded=False).distinct()
+        students_with_new_images = Student.objects.filter(images__is_encoded=False)
+        if section_promo_id is not None:
+            students_with_new_images = students_with_new_images.filter(section_promo_id=section_promo_id)
+        if student_ids is not None:
+            students_with_new_images = students_with_new_images.filter(id__in=student_ids)
+        students_with_new_images = students_with_new_images.distinct()
 
         encoded_image_ids = []
+        updated_classes = set()
+        faces_found = 0
+        if progress:
+            images_total = StudentImage.objects.filter(
+                is_encoded=False, student__in=students_with_new_images
+            ).count()
+            progress(0, images_total, faces_found)
         for student in students_with_new_images:
-            # Get class name from student's section_promo
-            the_classe = student.section_promo.name
+            # Encodings are stored by class id, so renaming a class does not touch them
+            the_classe = student.section_promo_id
             student_id = str(student.id)
 
-            # Construct the encoding path: encoding/class_name/
-            relative_path = os.path.join(self.encodings_location, the_classe)
+            # Construct the encoding path: encoding/class_id/
+            relative_path = os.path.join(self.encodings_location, str(the_classe))
 
             # Create directory if it doesn’t exist
             if not os.path.exists(relative_path):
@@ -89,17 +257,13 @@ class FaceRecognitionHandler:
             # Load existing encodings for this student (empty if none exist)
             face_encodings_old = self.__handle_encodings(relative_path, filename, show_file_error=False)
 
-            # Get all unencoded images for this student
-            new_images = student.images.filter(is_encoded=False)
+            # Get all unencoded images for this student, best quality first
+            new_images = student.images.filter(is_encoded=False).order_by(
+                F('quality_score').desc(nulls_last=True), 'uploaded_at'
+            )
 
             for student_image in new_images:
-                # Load the image from its full path
-                image_path = student_image.image.path
-                image = face_recognition.load_image_file(image_path)
-
-                # Detect face locations and generate encodings
-                face_locations = face_recognition.face_locations(image, model=self.model)
-                face_encodings = face_recognition.face_encodings(image, face_locations)
+                face_encodings = self.__encode_student_image(student_image)
 
                 # Add new encodings to the existing list
                 for encoding in face_encodings:
@@ -112,11 +276,18 @@ class FaceRecognitionHandler:
                 
                 # Add the image ID to the list
                 encoded_image_ids.append(student_image.id)
+                faces_found += len(face_encodings)
+                if progress:
+                    progress(len(encoded_image_ids), images_total, faces_found)
 
             # Save the updated encodings for the student
             name_encodings = {"names": [filename], "encodings": face_encodings_old['encodings']}
             self.__save_encodings(relative_path, filename, name_encodings)
-            
+            updated_classes.add(the_classe)
+
+        for the_classe in updated_classes:
+            self.bump_gallery_version(the_classe)
+
         return encoded_image_ids
 
     def recognize_faces(self, image_location, the_classe):
@@ -124,37 +295,249 @@ class FaceRecognitionHandler:
         Recognizes faces in the given image by comparing against encodings for the specified class.
         Args:
             image_location: Path to the image to recognize faces in.
-            the_classe: The class directory (e.g., "class_2024_b").
+            the_classe: The class id, which names its encodings directory.
         Returns:
             List of recognized people (student IDs).
         """
-        present_people = []
-        input_image = face_recognition.load_image_file(image_location)
-        input_face_locations = face_recognition.face_locations(input_image, model=self.model)
-        input_face_encodings = face_recognition.face_encodings(input_image, input_face_locations)
-
-        if not input_face_encodings:
-            print('The image entered is not clear, enter a clear image to recognize face')
-            raise imageException('Image not Clear')
-
-        # Construct the relative path: encoding/the_classe/
-        relative_path = os.path.join(DEFAULT_ENCODINGS_PATH, the_classe)
-
-        # Iterate over all encoding files in the class directory
-        for encoding_file in Path(relative_path).glob('*_encodings.pkl'):
-            student_id = encoding_file.stem.replace('_encodings', '')  # Extract student_id from filename
-            loaded_encodings = self.__load_encoded_faces(relative_path, encoding_file.stem)
-            if not loaded_encodings['encodings']:
-                print(f"No encodings found for {student_id} in {relative_path}")
-                continue
-
-            for unknown_encoding in input_face_encodings:
-                searched_name = self.__recognize_face(unknown_encoding, loaded_encodings)
-                if searched_name:
-                    present_people.append(searched_name)
-                    break
-
-        return present_people
+        try:
+            present_people = []
+            with self.timer.stage('decode'):
+                input_image = face_recognition.load_image_file(image_location)
+            with self.timer.stage('detect'), face_recognition_lock:
+                input_face_locations = face_recognition.face_locations(input_image, model=self.model)
+            with self.timer.stage('encode'), face_recognition_lock:
+                input_face_encodings = face_recognition.face_encodings(input_image, input_face_locations)
+            self.timer.count('faces', len(input_face_encodings))
+
+            if not input_face_encodings:
+                print('The image entered is not clear, enter a clear image to recognize face')
+                raise imageException('Image not Clear')
+
+            # Construct the relative path: encoding/the_classe/
+            relative_path = os.path.join(self.encodings_location, str(the_classe))
+
+            # Iterate over all encoding files in the class directory
+            gallery_size = 0
+            for encoding_file in Path(relative_path).glob('*_encodings.pkl'):
+                student_id = encoding_file.stem.replace('_encodings', '')  # Extract student_id from filename
+                with self.timer.stage('gallery_load'):
+                    loaded_encodings = self.__load_encoded_faces(relative_path, encoding_file.stem)
+                if not loaded_encodings['encodings']:
+                    print(f"No encodings found for {student_id} in {relative_path}")
+                    continue
+                gallery_size += len(loaded_encodings['encodings'])
+
+                with self.timer.stage('match'):
+                    for unknown_encoding in input_face_encodings:
+                        searched_name = self.__recognize_face(unknown_encoding, loaded_encodings)
+                        if searched_name:
+                            present_people.append(searched_name)
+                            break
+
+            self.timer.gauge('gallery_encodings', gallery_size)
+            self.timer.count('matches', len(present_people))
+            return present_people
+        finally:
+            self.timer.publish('process')
+
+    def recognize_single_face(self, image_file, the_classe, detect=False):
+        """
+        Fast path for kiosk check-ins: the image is expected to be a tight crop of a single face.
+        Args:
+            image_file: Path or file object of the face image.
+            the_classe: The class id, which names its encodings directory.
+            detect: When True, runs a HOG detection on a downscaled copy and keeps the largest face
+                instead of assuming the whole image is the face.
+        Returns:
+            (student_id, distance) of the best match within tolerance, or (None, distance).
+        """
+        try:
+            with self.timer.stage('decode'):
+                image = Image.open(image_file)
+                # Let the JPEG decoder scale down while decoding, the encoder works on a 150x150 chip anyway
+                image.draft('RGB', (settings.FACE_KIOSK_MAX_SIZE, settings.FACE_KIOSK_MAX_SIZE))
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                image.thumbnail((settings.FACE_KIOSK_MAX_SIZE, settings.FACE_KIOSK_MAX_SIZE))
+                face_image = np.asarray(image)
+            height, width = face_image.shape[:2]
+
+            if detect:
+                with self.timer.stage('detect'), face_recognition_lock:
+                    face_locations = face_recognition.face_locations(face_image, model="hog")
+                if not face_locations:
+                    raise imageException('No face found in the image')
+                face_location = max(face_locations, key=lambda location: (location[2] - location[0]) * (location[1] - location[3]))
+            else:
+                face_location = (0, width, height, 0)
+
+            with self.timer.stage('encode'), face_recognition_lock:
+                encodings = face_recognition.face_encodings(face_image, [face_location])
+            if not encodings:
+                raise imageException('No face found in the image')
+            self.timer.count('faces')
+
+            with self.timer.stage('gallery_load'):
+                labels, matrix = self.get_class_gallery(the_classe)
+            self.timer.gauge('gallery_encodings', len(labels))
+            if not labels:
+                return None, None
+
+            with self.timer.stage('match'):
+                student_id, distance = self.__match_encoding(encodings[0], labels, matrix)
+            if student_id is not None:
+                self.timer.count('matches')
+            return student_id, distance
+        finally:
+            self.timer.publish('kiosk')
+
+    def recognize_video(self, video_location, the_classe):
+        """
+        Recognizes the students appearing in a short video (e.g. a phone panned across the room).
+        Frames are sampled adaptively so the whole clip is processed within a fixed CPU budget
+        (FACE_VIDEO_CPU_BUDGET CPU seconds per second of video, counted on the calling thread only so
+        concurrent requests of the process do not eat it). Faces are followed between sampled frames with
+        an IoU tracker and each track is embedded once, or twice if a better view shows up, instead of on
+        every frame.
+        Args:
+            video_location: Path to the video file.
+            the_classe: The class id, which names its encodings directory.
+        Returns:
+            Dict mapping each recognized student id to the number of votes it received.
+        """
+        try:
+            capture = cv2.VideoCapture(str(video_location))
+            if not capture.isOpened():
+                raise imageException('Video could not be read')
+
+            try:
+                fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+                frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+                duration = frame_count / fps
+                if frame_count <= 0:
+                    raise imageException('Video could not be read')
+                if duration > settings.FACE_VIDEO_MAX_DURATION:
+                    raise imageException(f'Video is longer than {settings.FACE_VIDEO_MAX_DURATION} seconds')
+
+                with self.timer.stage('gallery_load'):
+                    labels, matrix = self.get_class_gallery(the_classe)
+                self.timer.gauge('gallery_encodings', len(labels))
+
+                # Never sample more often than FACE_VIDEO_SAMPLE_FPS, and never skip more than one second.
+                min_stride = max(1, round(fps / settings.FACE_VIDEO_SAMPLE_FPS))
+                max_stride = max(min_stride, round(fps))
+                stride = min_stride
+                budget = duration * settings.FACE_VIDEO_CPU_BUDGET
+
+                tracker = IoUTracker()
+                started = time.thread_time()
+                frame_index = 0
+                next_sample = 0
+                sampled = 0
+                while True:
+                    with self.timer.stage('decode'):
+                        grabbed = capture.grab()
+                        if grabbed and frame_index >= next_sample:
+                            grabbed, frame = capture.retrieve()
+                        else:
+                            frame = None
+                    if not grabbed:
+                        break
+                    if frame is None:
+                        frame_index += 1
+                        continue
+
+                    self.process_frame(
+                        frame,
+                        sampled,
+                        tracker,
+                        labels,
+                        matrix,
+                        max_embeddings=settings.FACE_VIDEO_MAX_EMBEDDINGS_PER_TRACK,
+                    )
+                    sampled += 1
+
+                    # Spread the remaining budget over the remaining frames.
+                    spent = time.thread_time() - started
+                    remaining_budget = budget - spent
+                    if remaining_budget <= 0:
+                        break
+                    remaining_frames = frame_count - frame_index
+                    affordable_samples = remaining_budget / (spent / sampled) if spent > 0 else remaining_frames
+                    stride = min(max_stride, max(min_stride, math.ceil(remaining_frames / max(affordable_samples, 1))))
+                    next_sample = frame_index + stride
+                    frame_index += 1
+            finally:
+                capture.release()
+
+            votes = Counter()
+            for track in tracker.tracks:
+                if track.identity is not None:
+                    votes[track.identity] += track.votes[track.identity]
+            self.timer.count('matches', len(votes))
+            return {
+                student_id: count
+                for student_id, count in votes.items()
+                if count >= settings.FACE_VIDEO_MIN_VOTES
+            }
+        finally:
+            # Failed runs are recorded too
+            self.timer.publish('video')
+
+    def process_frame(
+        self, frame, frame_index, tracker, labels, matrix, max_embeddings=2, growth=1.5, skip_identified=False
+    ):
+        """
+        Detects faces on a downscaled copy of a BGR frame, updates the tracker and embeds only the
+        tracks that need it, all in a single face_encodings call.
+        Args:
+            frame: The decoded BGR frame (as returned by OpenCV).
+            frame_index: Index of the frame among the processed ones, used by the tracker.
+            tracker: The IoUTracker following the faces of this video or stream.
+            labels, matrix: The class gallery (see get_class_gallery).
+            max_embeddings: Maximum number of embeddings computed for a single track.
+            growth: How much bigger a face must get before a track is embedded again.
+            skip_identified: When True, tracks that already matched a student are never embedded again.
+        Returns:
+            The list of tracks embedded on this frame.
+        """
+        with self.timer.stage('decode'):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            height, width = rgb_frame.shape[:2]
+            scale = min(1.0, settings.FACE_VIDEO_DETECTION_WIDTH / float(width))
+            small_frame = cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale) if scale < 1.0 else rgb_frame
+
+        # CNN detection on every sampled frame would blow the budget, HOG on a small frame is enough
+        # since the tracker bridges the frames it misses.
+        with self.timer.stage('detect'), face_recognition_lock:
+            small_locations = face_recognition.face_locations(small_frame, model="hog")
+        self.timer.count('faces', len(small_locations))
+        locations = [
+            (
+                int(top / scale),
+                min(width, int(right / scale)),
+                min(height, int(bottom / scale)),
+                int(left / scale),
+            )
+            for top, right, bottom, left in small_locations
+        ]
+
+        to_embed = [
+            track
+            for track, _ in tracker.update(locations, frame_index)
+            if not (skip_identified and track.identity is not None) and track.needs_embedding(max_embeddings, growth)
+        ]
+        if not to_embed:
+            return []
+
+        with self.timer.stage('encode'), face_recognition_lock:
+            encodings = face_recognition.face_encodings(rgb_frame, [track.location for track in to_embed])
+        with self.timer.stage('match'):
+            for track, encoding in zip(to_embed, encodings):
+                track.mark_embedded()
+                student_id, _ = self.__match_encoding(encoding, labels, matrix)
+                if student_id:
+                    track.votes[student_id] += 1
+        return to_embed
 
 
 # Example usage
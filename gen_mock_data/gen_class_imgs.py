@@ -2,11 +2,17 @@ import os
 import json
 from PIL import Image
 import random
-from tqdm import tqdm
 
 
 def create_classroom_picture(
-    class_path, background_path, output_path, base_image_size=(100, 100), presence_prob=0.8, scale_factor=0.8
+    class_path,
+    background_path,
+    output_path,
+    base_image_size=(100, 100),
+    presence_prob=0.8,
+    scale_factor=0.8,
+    output_scale=1.0,
+    student_data=None,
 ):
     """
     Create a classroom picture by placing student face images at desk positions on a background.
@@ -19,6 +25,8 @@ def create_classroom_picture(
         base_image_size (tuple): Size of face images in the front row (width, height).
         presence_prob (float): Probability (0 to 1) of including a student's image.
         scale_factor (float): Scaling factor per row to simulate farness (e.g., 0.8 = 80% of previous row's size).
+        output_scale (float): Resizes the finished picture (e.g., 2.0 for a 1760x1046 picture).
+        student_data (list): Optional [{'id': ..., 'path': ...}] images to place instead of walking class_path.
 
     Returns:
         list: List of student IDs included in the picture.
@@ -74,17 +82,20 @@ def create_classroom_picture(
         print(f"Error loading background image {background_path}: {e}")
         return []
 
-    # List to store image paths and student IDs
-    student_data = []
-
-    # Walk through class folder to find student images
-    for student_folder in os.listdir(class_path):
-        student_path = os.path.join(class_path, student_folder)
-        if os.path.isdir(student_path):
-            # Look for image files in student folder
-            for file in os.listdir(student_path):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    student_data.append({'id': student_folder, 'path': os.path.join(student_path, file)})
+    if student_data is None:
+        # List to store image paths and student IDs
+        student_data = []
+
+        # Walk through class folder to find student images
+        for student_folder in os.listdir(class_path):
+            student_path = os.path.join(class_path, student_folder)
+            if os.path.isdir(student_path):
+                # Look for image files in student folder
+                for file in os.listdir(student_path):
+                    if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                        student_data.append({'id': student_folder, 'path': os.path.join(student_path, file)})
+    else:
+        student_data = list(student_data)
 
     if not student_data:
         print(f"No images found in {class_path}")
@@ -131,11 +142,16 @@ def create_classroom_picture(
             print(f"Error processing {img_path}: {e}")
 
     # Save the output image
+    if output_scale != 1.0:
+        width, height = background.size
+        background = background.resize((int(width * output_scale), int(height * output_scale)), Image.LANCZOS)
     background.save(output_path)
     return included_students
 
 
 if __name__ == "__main__":
+    from tqdm import tqdm
+
     classes_path = "training"
     output_base_path = "gen_mock_data/classroom_pictures"
     background_path = "gen_mock_data/classroom_bg.jpeg"
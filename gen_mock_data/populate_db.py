@@ -5,9 +5,11 @@ python manage.py shell
 """
 
 from apps.attendance.models import Attendance
+from apps.attendance.rollup import rebuild_daily_stats, rebuild_sessions
 from apps.classes.models import Class
 from apps.departments.models import Department
 from apps.studentimages.models import StudentImage
+from apps.studentimages.storage import student_media_dir
 from apps.students.models import Student
 from apps.subjects.models import Subject
 from apps.teachers.models import Teacher
@@ -148,13 +150,12 @@ for cls, num_students in tqdm(
 print("Fetching and creating student images (AI-generated faces)...")
 students = Student.objects.all()
 for student in tqdm(students, desc="Student Images"):
-    class_name = student.section_promo.name
     unique_filename = f"{uuid.uuid4().hex}.jpg"
     # Fetch AI-generated face image from ThisPersonDoesNotExist
     response = requests.get("https://thispersondoesnotexist.com")
     if response.status_code == 200:
         # Define the image path relative to MEDIA_ROOT
-        image_path = os.path.join(class_name, str(student.id), unique_filename)
+        image_path = os.path.join(student_media_dir(student.section_promo_id, student.id), unique_filename)
         # Create a StudentImage instance
         student_image, created = StudentImage.objects.get_or_create(
             student=student, image=image_path, defaults={'is_encoded': False}
@@ -246,3 +247,7 @@ for cls in tqdm(classes, desc="Classes"):
                         date=make_aware(current_date),
                         defaults={'status': status},
                     )
+
+# Attendance was written row by row without touching the rollup and sessions: recompute them once
+rebuild_daily_stats()
+rebuild_sessions()
@@ -0,0 +1,129 @@
+from collections import Counter
+from itertools import count
+
+
+def box_area(location):
+    """
+    Area in pixels of a face_recognition location tuple (top, right, bottom, left).
+    """
+    top, right, bottom, left = location
+    return max(0, bottom - top) * max(0, right - left)
+
+
+def box_iou(first, second):
+    """
+    Intersection over union of two (top, right, bottom, left) boxes.
+    """
+    top = max(first[0], second[0])
+    right = min(first[1], second[1])
+    bottom = min(first[2], second[2])
+    left = max(first[3], second[3])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    if intersection == 0:
+        return 0.0
+    return intersection / float(box_area(first) + box_area(second) - intersection)
+
+
+class FaceTrack:
+    """
+    A face followed across consecutive frames. Keeps the votes cast by each of its embeddings
+    so the caller can decide who the track belongs to without embedding it on every frame.
+    """
+
+    def __init__(self, track_id, location, frame_index):
+        self.id = track_id
+        self.location = location
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+        self.hits = 1
+        self.embeddings = 0
+        self.embedded_area = 0
+        self.votes = Counter()
+
+    @property
+    def area(self):
+        return box_area(self.location)
+
+    @property
+    def identity(self):
+        if self.votes:
+            return self.votes.most_common(1)[0][0]
+        return None
+
+    def needs_embedding(self, max_embeddings=2, growth=1.5):
+        """
+        A track is embedded when it first appears, then at most once more if the face got
+        noticeably bigger (closer to the camera), which usually gives a better encoding.
+        """
+        if self.embeddings == 0:
+            return True
+        if self.embeddings >= max_embeddings:
+            return False
+        return self.area >= self.embedded_area * growth
+
+    def mark_embedded(self):
+        self.embeddings += 1
+        self.embedded_area = self.area
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker: every new detection is attached to the live track it overlaps the most,
+    otherwise it opens a new track. Tracks not seen for `max_missed` frames are retired.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.active = []
+        self.finished = []
+        self._ids = count(1)
+
+    def update(self, locations, frame_index):
+        """
+        Feeds the detections of one frame and returns the list of (track, is_new) pairs they map to.
+        `frame_index` is the index of the sampled frame, not of the decoded one.
+        """
+        candidates = sorted(
+            (
+                (box_iou(track.location, location), track_idx, location_idx)
+                for track_idx, track in enumerate(self.active)
+                for location_idx, location in enumerate(locations)
+            ),
+            reverse=True,
+        )
+
+        matched_tracks, matched_locations = set(), set()
+        results = []
+        for iou, track_idx, location_idx in candidates:
+            if iou < self.iou_threshold:
+                break
+            if track_idx in matched_tracks or location_idx in matched_locations:
+                continue
+            track = self.active[track_idx]
+            track.location = locations[location_idx]
+            track.last_seen = frame_index
+            track.hits += 1
+            matched_tracks.add(track_idx)
+            matched_locations.add(location_idx)
+            results.append((track, False))
+
+        for location_idx, location in enumerate(locations):
+            if location_idx not in matched_locations:
+                track = FaceTrack(next(self._ids), location, frame_index)
+                self.active.append(track)
+                results.append((track, True))
+
+        still_active = []
+        for track in self.active:
+            if frame_index - track.last_seen > self.max_missed:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+        return results
+
+    @property
+    def tracks(self):
+        return self.finished + self.active